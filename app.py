@@ -1,18 +1,31 @@
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for, flash, g
+from flask import Flask, Response, jsonify, request, render_template, session, redirect, url_for, flash, g, has_request_context, stream_with_context
 from plaid_link import PlaidLinkSetup
 from plaid_transactions import PlaidClient
 import os
 from datetime import timedelta, date, datetime
-from pymongo import MongoClient
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
-import google.generativeai as genai
-import json
-import certifi
+import atexit
 from gamification import GamificationSystem, CharacterClass, CharacterLevel
+from gamification_journal import CharacterJournal
+from gamification_mongo import MongoCharacterStore
+from gamification_shards import ShardedStateStore
+from gamification_sqlite import SQLiteStateStore
+from quest_jobs import QuestJobs
+from quest_refresh import REFRESH_PROJECTION, quest_refresh_fields
+from services import (analyze_transactions, build_transaction_summary, db, default_insights, gemini,
+                      generate_ai_insights, generate_fallback_insights, has_spending_data, insight_cache,
+                      insight_history, prompt_builder, quest_refresh_inputs, transaction_rollups, transaction_store,
+                      user_data, users)
+from transaction_export import EXPORT_FORMATS, export_transactions
+from transaction_import import IMPORT_FORMATS, import_statement
+from transaction_store import validate_manual_transaction
+from user_data_store import UserDataStore
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)  # Required for session management
+# Required for session management. Set SECRET_KEY when running several worker
+# processes so a session cookie signed by one worker is accepted by the others
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
 
 # Add abs filter to Jinja2 environment
 app.jinja_env.filters['abs'] = abs
@@ -20,17 +33,75 @@ app.jinja_env.filters['abs'] = abs
 # Initialize services
 plaid_link = PlaidLinkSetup()
 plaid_client = PlaidClient()
-gamification = GamificationSystem()
-gamification.load_state("gamification_state.json")
+# The MongoDB connection, transaction stores, Gemini model and insight cache are
+# set up in services.py, which the batch jobs import without the rest of the app
+
+def user_data_memo():
+    """The current request's userData read cache, kept on flask.g"""
+    if not has_request_context():
+        return None
+    if 'user_data_memo' not in g:
+        g.user_data_memo = {}
+    return g.user_data_memo
+
+# Routes read userData through named queries that fetch only the fields they use.
+# Repeat reads within a request are memoized; USER_DATA_CACHE_TTL (seconds) also
+# caches them across requests in this process, which can hide writes made by
+# other worker processes for up to that long
+user_data_store = UserDataStore(
+    user_data,
+    ttl=float(os.getenv('USER_DATA_CACHE_TTL', '0')),
+    request_memo=user_data_memo
+)
+
+def create_gamification_store():
+    """Pick the gamification storage backend from GAMIFICATION_STORE (journal, sqlite, mongo,
+    sharded or snapshot) and the journal snapshot format from GAMIFICATION_SNAPSHOT_FORMAT (json or binary).
+    snapshot keeps no store and writes the whole state file from a background thread.
+    sharded splits characters across GAMIFICATION_SHARD_COUNT files in GAMIFICATION_SHARD_DIR."""
+    backend = os.getenv('GAMIFICATION_STORE', 'journal')
+    if backend == 'snapshot':
+        return None
+    if backend == 'mongo':
+        return MongoCharacterStore(db['characters'])
+    if backend == 'sqlite':
+        return SQLiteStateStore(os.getenv('GAMIFICATION_DB', 'gamification.db'))
+    if backend == 'sharded':
+        return ShardedStateStore(
+            os.getenv('GAMIFICATION_SHARD_DIR', 'gamification_shards'),
+            shard_count=int(os.getenv('GAMIFICATION_SHARD_COUNT', '64'))
+        )
+    if os.getenv('GAMIFICATION_SNAPSHOT_FORMAT', 'json') == 'binary':
+        # Convert an existing file first: python gamification_codec.py to-binary ...
+        journal = CharacterJournal("gamification_state.bin", snapshot_format='binary')
+    else:
+        journal = CharacterJournal("gamification_state.json")
+    journal.start_compactor()
+    return journal
 
-# MongoDB Atlas connection
-client = MongoClient(os.getenv('MONGODB_URI'), 
-                    tls=True,
-                    tlsAllowInvalidCertificates=False,
-                    tlsCAFile=certifi.where())
-db = client['finance_app']
-users = db['users']  # Store user authentication data
-user_data = db['userData']  # Store user financial data
+# GAMIFICATION_CACHE_SIZE > 0 loads characters on demand (sqlite or sharded backend)
+# and keeps at most that many resident; load_state is then a no-op.
+# GAMIFICATION_SHARED=1 is for running several worker processes against one
+# sqlite store: character updates are versioned and retried on conflict.
+# The mongo store always runs shared, since its atomic purchase and quest
+# updates change characters behind the in-memory cache
+gamification_store = create_gamification_store()
+gamification_shared = os.getenv('GAMIFICATION_SHARED') == '1' or isinstance(gamification_store, MongoCharacterStore)
+gamification = GamificationSystem(
+    store=gamification_store,
+    cache_size=int(os.getenv('GAMIFICATION_CACHE_SIZE', 0)) or None,
+    shared=gamification_shared
+)
+gamification.load_state("gamification_state.json")
+if gamification.store is None:
+    gamification.enable_snapshots("gamification_state.json")
+if not gamification_shared:
+    # Saves from request handlers are coalesced and written by a background flusher
+    gamification.enable_write_behind(
+        flush_interval_ms=int(os.getenv('GAMIFICATION_FLUSH_MS', 200)),
+        max_pending=int(os.getenv('GAMIFICATION_FLUSH_MAX_PENDING', 100))
+    )
+    atexit.register(gamification.flush)
 
 # Shop items
 shop_items = {
@@ -56,176 +127,69 @@ shop_items = {
     ]
 }
 
-def analyze_transactions(transactions, savings_goal):
-    """Analyze transactions and generate personalized daily quests using Gemini"""
-    try:
-        # Convert transactions to a format suitable for Gemini
-        transaction_summary = {
-            'total_spent': 0,
-            'total_income': 0,
-            'category_spending': {},
-            'transactions': []
+def quests_to_missions(quests, source):
+    """Convert insight quests to the mission dicts stored on a character; source is 'ai', 'fallback' or 'default'"""
+    missions_list = []
+    for quest in quests:
+        mission = {
+            'id': str(ObjectId()),
+            'title': quest['title'],
+            'description': quest['description'],
+            'progress': quest.get('progress', 0),
+            'is_completed': quest.get('completed', False),
+            'mission_type': {'name': 'Daily Quest'},
+            'reward_exp': 5,
+            'reward_coins': 5,
+            'source': source
         }
-        
-        # Only consider last 30 days of transactions for monthly average
-        for transaction in transactions:
-            amount = float(transaction['amount'])
-            if amount < 0:  # Expenses
-                transaction_summary['total_spent'] += abs(amount)
-                category = transaction.get('category', ['Uncategorized'])[0]
-                transaction_summary['category_spending'][category] = transaction_summary['category_spending'].get(category, 0) + abs(amount)
-            else:  # Income
-                transaction_summary['total_income'] += amount
-            
-            transaction_summary['transactions'].append({
-                'date': transaction['date'],
-                'amount': amount,
-                'category': transaction.get('category', ['Uncategorized'])[0],
-                'name': transaction.get('name', '')
-            })
-        
-        # If we have no transactions or spending data, return early with default values
-        if not transactions or (transaction_summary['total_spent'] == 0 and transaction_summary['total_income'] == 0):
-            return {
-                "time_estimate": "Unable to calculate time estimate. Please add some transactions first.",
-                "quests": [
-                    {
-                        "title": "Add Your Transactions",
-                        "progress": 0,
-                        "description": "Start by adding your daily transactions to get personalized savings goals"
-                    },
-                    {
-                        "title": "Set a Savings Goal",
-                        "progress": 0,
-                        "description": f"You've set a goal to save ${savings_goal}. Let's work towards it!"
-                    },
-                    {
-                        "title": "Track Your Spending",
-                        "progress": 0,
-                        "description": "Record your expenses for better financial insights"
-                    }
-                ]
-            }
-        
-        # Prepare prompt for Gemini
-        prompt = f"""
-        Analyze the following financial data and provide personalized savings recommendations:
-        
-        Monthly Income: ${transaction_summary['total_income']:.2f}
-        Monthly Expenses: ${transaction_summary['total_spent']:.2f}
-        Savings Goal: ${savings_goal:.2f}
-        
-        Top Spending Categories:
-        {json.dumps(transaction_summary['category_spending'], indent=2)}
-        
-        Recent Transactions:
-        {json.dumps(transaction_summary['transactions'][-5:], indent=2)}
-        
-        Please provide:
-        1. A time estimate to reach the savings goal
-        2. Three personalized daily quests to help achieve the goal
-        3. Specific recommendations for reducing expenses in the top spending categories
-        
-        Format the response as a JSON object with 'time_estimate' and 'quests' fields.
-        Each quest should have 'title', 'progress', and 'description' fields.
-        """
-        
-        # Get AI-generated insights
-        response = model.generate_content(prompt)
-        try:
-            insights = json.loads(response.text)
-            return insights
-        except json.JSONDecodeError:
-            # Fallback to traditional analysis if AI response is invalid
-            return generate_fallback_insights(transaction_summary, savings_goal)
-        
-    except Exception as e:
-        print(f"Error in analyze_transactions: {str(e)}")
-        return generate_fallback_insights(transaction_summary, savings_goal)
+        missions_list.append(mission)
+    return missions_list
 
-def generate_fallback_insights(transaction_summary, savings_goal):
-    """Generate insights using traditional analysis when AI is unavailable"""
-    monthly_expenses = transaction_summary['total_spent']
-    monthly_income = transaction_summary['total_income']
-    
-    # Calculate potential savings (20% from income and 20% from expense reduction)
-    income_savings = monthly_income * 0.20
-    expense_savings = monthly_expenses * 0.20
-    total_potential_savings = income_savings + expense_savings
-    
-    # Split savings between goal and emergency fund
-    goal_savings = total_potential_savings * 0.5
-    emergency_savings = total_potential_savings * 0.5
-    
-    # Calculate time to reach goal
-    if goal_savings > 0:
-        months_to_goal = savings_goal / goal_savings
-        years = int(months_to_goal / 12)
-        remaining_months = int(months_to_goal % 12)
-        
-        time_parts = []
-        if years > 0:
-            time_parts.append(f"{years} year{'s' if years > 1 else ''}")
-        if remaining_months > 0:
-            time_parts.append(f"{remaining_months} month{'s' if remaining_months > 1 else ''}")
-        
-        time_str = " and ".join(time_parts)
-        time_estimate = (
-            f"Based on your current income of ${monthly_income:.2f}/month and expenses of ${monthly_expenses:.2f}/month, "
-            f"saving 20% of income (${income_savings:.2f}/month) and reducing expenses by 20% (${expense_savings:.2f}/month) "
-            f"would take {time_str} to reach your goal of ${savings_goal:.2f}. "
-            f"You'll also build an emergency fund of ${emergency_savings:.2f}/month."
-        )
-    else:
-        time_estimate = "Unable to calculate time estimate. Please add your regular income and expenses."
-    
-    # Sort categories by spending
-    sorted_categories = sorted(transaction_summary['category_spending'].items(), key=lambda x: x[1], reverse=True)
-    
-    # Create quests based on top spending categories
-    quests = []
-    
-    # Add income-based quest
-    daily_income_savings = income_savings / 30
-    quests.append({
-        "title": "Income Savings",
-        "progress": 0,
-        "description": f"Save ${daily_income_savings:.2f} from today's income (20% of income)"
-    })
-    
-    # Add expense reduction quests
-    for category, amount in sorted_categories[:2]:
-        daily_category_savings = (amount * 0.2) / 30
-        quests.append({
-            "title": f"Save on {category}",
-            "progress": 0,
-            "description": f"Target saving ${daily_category_savings:.2f} today on {category}"
-        })
-    
-    # Add generic quest if needed
-    while len(quests) < 3:
-        quests.append({
-            "title": "Track Your Spending",
-            "progress": 0,
-            "description": "Record all your expenses today for better insights"
-        })
+def mission_ids(character):
+    return [mission.get('id') if isinstance(mission, dict) else str(mission.id) for mission in character.active_missions]
+
+def has_untouched_fallback_missions(character):
+    """Whether the character's quests are all rule-based fallbacks and none has been completed"""
+    return bool(character.active_missions) and all(
+        isinstance(mission, dict) and mission.get('source') == 'fallback' and not mission.get('is_completed')
+        for mission in character.active_missions
+    )
+
+def save_character(user_id):
+    """Save a character changed by update_character or create_character; in shared mode those already wrote it"""
+    if not gamification.shared:
+        gamification.save_state("gamification_state.json", user_id)
+
+def replace_fallback_missions(user_id, transaction_summary, savings_goal, fallback_ids):
+    """Background quest job: swap untouched fallback quests for AI-generated ones"""
+    insights = generate_ai_insights(transaction_summary, savings_goal)
+    if insights is None:
+        return 'kept_fallback'
+    missions_list = quests_to_missions(insights['quests'][:3], 'ai')
+    
+    def swap(character):
+        # Leave the quests alone if the user completed one or they were replaced meanwhile
+        if mission_ids(character) != fallback_ids or not has_untouched_fallback_missions(character):
+            return False
+        character.active_missions = missions_list
+        return True
     
-    return {
-        "time_estimate": time_estimate,
-        "quests": quests[:3]
-    }
+    if not gamification.update_character(user_id, swap):
+        return 'kept_fallback'
+    save_character(user_id)
+    return 'replaced'
+
+# AI quest generation runs here, off the request thread; one job per user at a time
+quest_jobs = QuestJobs(replace_fallback_missions, workers=int(os.getenv('QUEST_JOB_WORKERS', '4')))
 
 def store_user_financial_data(user_id, access_token):
     # Check if user already has financial data
-    existing_data = user_data.find_one({'user_id': user_id})
+    existing_data = user_data_store.get_link_status(user_id)
     
-    if existing_data and 'transactions' in existing_data and existing_data['transactions']:
+    if existing_data is not None and transaction_store.has_transactions(user_id):
         # If user has existing transactions, only update the access token if needed
         if existing_data.get('access_token') != access_token:
-            user_data.update_one(
-                {'user_id': user_id},
-                {'$set': {'access_token': access_token}}
-            )
+            user_data_store.set_access_token(user_id, access_token)
         return
     
     # Get transactions and balances for new accounts
@@ -234,36 +198,16 @@ def store_user_financial_data(user_id, access_token):
     transactions = plaid_client.get_transactions(access_token, start_date, end_date)
     balances = plaid_client.get_balances(access_token)
     
-    # Convert date objects to strings in transactions
-    processed_transactions = []
-    for transaction in transactions:
-        processed_transaction = transaction.copy()
-        if 'date' in processed_transaction:
-            processed_transaction['date'] = str(processed_transaction['date'])
-        processed_transactions.append(processed_transaction)
-    
-    # Store the data
-    user_data.update_one(
-        {'user_id': user_id},
-        {
-            '$set': {
-                'access_token': access_token,
-                'last_updated': str(date.today()),
-                'transactions': processed_transactions,
-                'balances': balances,
-                'completed_quests': [],
-                'current_quests': [],
-                'savings_goal': 1000,  # Default savings goal
-                'current_savings': 0,
-                'emergency_fund': 0
-            }
-        },
-        upsert=True
-    )
+    # Store the data; transactions keep their dates as native datetimes
+    transaction_store.insert_many(user_id, transactions)
+    user_data_store.store_link_data(user_id, access_token, balances)
 
 def check_and_refresh_quests(user_id):
-    """Check if quests need to be refreshed and update them if necessary"""
-    user = users.find_one({'_id': ObjectId(user_id)})
+    """Check if quests need to be refreshed and update them if necessary.
+
+    `python quest_refresh.py` does the same for every user in a nightly batch.
+    """
+    user = users.find_one({'_id': ObjectId(user_id)}, REFRESH_PROJECTION)
     if not user:
         return None
     
@@ -277,26 +221,16 @@ def check_and_refresh_quests(user_id):
         if last_refresh_date == today:
             return None  # Quests already refreshed today
     
-    # Get user's financial data
-    user_financial_data = user_data.find_one({'user_id': user_id})
-    if not user_financial_data or 'transactions' not in user_financial_data:
+    # Get user's financial data and generate new quests
+    inputs = quest_refresh_inputs(user)
+    if inputs is None:
         return None
-    
-    # Get transactions and generate new quests
-    transactions = user_financial_data['transactions']
-    savings_goal = user.get('savings_goal', 1000)
-    goals = analyze_transactions(transactions, savings_goal)
+    goals = analyze_transactions(*inputs)
     
     # Update user with new quests and refresh date
     users.update_one(
         {'_id': ObjectId(user_id)},
-        {
-            '$set': {
-                'last_quest_refresh': str(today),
-                'completed_quests': [],  # Reset completed quests
-                'current_quests': goals['quests']  # Store current quests
-            }
-        }
+        {'$set': quest_refresh_fields(goals['quests'], today)}
     )
     
     return goals['quests']
@@ -307,12 +241,16 @@ def before_request():
         g.character = gamification.get_character(session['user_id'])
         if not g.character:
             # Create a character if one doesn't exist
-            g.character = gamification.create_character(
-                user_id=session['user_id'],
-                name=session['user_id'],
-                character_class=CharacterClass.SAVER
-            )
-            gamification.save_state("gamification_state.json")
+            try:
+                g.character = gamification.create_character(
+                    user_id=session['user_id'],
+                    name=session['user_id'],
+                    character_class=CharacterClass.SAVER
+                )
+                save_character(session['user_id'])
+            except ValueError:
+                # Another worker created it first
+                g.character = gamification.get_character(session['user_id'])
     else:
         g.character = None
 
@@ -322,7 +260,7 @@ def index():
         return redirect(url_for('login'))
     
     # Check if user already has a bank connected
-    user_financial_data = user_data.find_one({'user_id': session['user_id']})
+    user_financial_data = user_data_store.get_link_status(session['user_id'])
     has_bank = user_financial_data and 'access_token' in user_financial_data
     
     # Get character data
@@ -330,13 +268,17 @@ def index():
     
     # Update login streak
     if character:
-        now = datetime.now()
-        if (now - character.last_login).days >= 1:
-            character.streak += 1
-        else:
-            character.streak = 1
-        character.last_login = now
-        gamification.save_state("gamification_state.json")
+        def update_streak(character):
+            now = datetime.now()
+            if (now - character.last_login).days >= 1:
+                character.streak += 1
+            else:
+                character.streak = 1
+            character.last_login = now
+            return character
+        
+        character = gamification.update_character(session['user_id'], update_streak)
+        save_character(session['user_id'])
     
     # Create a new link token for Plaid
     link_token = plaid_link.create_link_token(session['user_id'])
@@ -361,7 +303,7 @@ def login():
             session['user_id'] = user_id
             
             # Check if user has existing financial data
-            user_financial_data = user_data.find_one({'user_id': user_id})
+            user_financial_data = user_data_store.get_link_status(user_id)
             
             if user_financial_data and 'access_token' in user_financial_data:
                 # Update the user's financial data
@@ -400,16 +342,7 @@ def create_account():
         
         # Create initial financial data record
         user_id = str(result.inserted_id)
-        user_data.insert_one({
-            'user_id': user_id,
-            'savings_goal': 1000,
-            'current_savings': 0,
-            'emergency_fund': 0,
-            'transactions': [],
-            'balances': {},
-            'completed_quests': [],
-            'current_quests': []
-        })
+        user_data_store.create(user_id)
         
         # Create character for the new user
         try:
@@ -420,7 +353,7 @@ def create_account():
             )
             gamification.assign_missions(user_id)
             gamification.assign_challenge(user_id)
-            gamification.save_state("gamification_state.json")
+            gamification.save_state("gamification_state.json", user_id)
         except Exception as e:
             print(f"Error creating character: {e}")
         
@@ -446,46 +379,83 @@ def missions():
     if not character:
         return redirect(url_for('index'))
     
-    # Get user's financial data
-    user_financial_data = user_data.find_one({'user_id': user_id})
-    if not user_financial_data:
+    # Get the savings goal and quest state the page shows
+    user_financial_data = user_data_store.get_quest_state(user_id)
+    if user_financial_data is None:
         return redirect(url_for('index'))
     
     # Only generate new quests if there are no active missions
+    savings_goal = user_financial_data.get('savings_goal', 1000)
+    transaction_summary = None
     if not character.active_missions:
         # Get transactions and generate quests
-        transactions = user_financial_data.get('transactions', [])
-        savings_goal = user_financial_data.get('savings_goal', 1000)
-        goals = analyze_transactions(transactions, savings_goal)
+        recent_transactions = list(transaction_store.find(user_id, limit=5))[::-1]
+        transaction_summary = build_transaction_summary(
+            recent_transactions, totals=transaction_rollups.summary(user_id), history=insight_history(user_id)
+        )
+        if has_spending_data(transaction_summary):
+            # Rule-based quests render straight away; a background job swaps in the AI ones
+            missions_list = quests_to_missions(
+                generate_fallback_insights(transaction_summary, savings_goal)['quests'], 'fallback'
+            )
+        else:
+            missions_list = quests_to_missions(default_insights(savings_goal)['quests'], 'default')
         
-        # Convert quests to missions format
-        missions_list = []
-        for quest in goals['quests']:
-            mission = {
-                'id': str(ObjectId()),
-                'title': quest['title'],
-                'description': quest['description'],
-                'progress': quest['progress'],
-                'is_completed': quest.get('completed', False),
-                'mission_type': {'name': 'Daily Quest'},
-                'reward_exp': 5,
-                'reward_coins': 5
-            }
-            missions_list.append(mission)
+        # Update character's active missions unless another request got there first
+        def set_missions(character):
+            if not character.active_missions:
+                character.active_missions = missions_list
+            return character
         
-        # Update character's active missions
-        character.active_missions = missions_list
+        if hasattr(gamification.store, 'push_missions'):
+            gamification.store.push_missions(user_id, missions_list, only_if_empty=True)
+            gamification.invalidate(user_id)
+            character = gamification.get_character(user_id)
+        else:
+            character = gamification.update_character(user_id, set_missions)
+    
+    # Fallback quests nobody has started on are upgraded to AI ones in the background
+    # (again on later visits if an earlier job could not reach the model)
+    quests_pending = False
+    if has_untouched_fallback_missions(character):
+        if transaction_summary is None:
+            transaction_summary = build_transaction_summary(
+                list(transaction_store.find(user_id, limit=5))[::-1], totals=transaction_rollups.summary(user_id),
+                history=insight_history(user_id)
+            )
+        quest_jobs.submit(user_id, transaction_summary, savings_goal, mission_ids(character))
+        quests_pending = True
     
     # Ensure character has coins attribute
     if not hasattr(character, 'coins'):
         character.coins = 0
     
     # Save character state
-    gamification.save_state("gamification_state.json")
+    save_character(user_id)
     
     return render_template('missions.html', 
                          character=character,
-                         financial_data=user_financial_data)
+                         financial_data=user_financial_data,
+                         quests_pending=quests_pending)
+
+@app.route('/missions/status')
+def missions_status():
+    """Poll target for /missions while AI quests are being generated in the background"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    user_id = session['user_id']
+    status, outcome = quest_jobs.status(user_id)
+    character = gamification.get_character(user_id)
+    ai_ready = bool(character) and any(
+        isinstance(mission, dict) and mission.get('source') == 'ai' for mission in character.active_missions
+    )
+    return jsonify({
+        'pending': status == 'pending',
+        'ai_ready': ai_ready,
+        # 'kept_fallback' or 'failed' once a job has given up
+        'outcome': outcome if status == 'done' else status
+    })
 
 @app.route('/shop')
 def shop():
@@ -498,23 +468,19 @@ def shop():
     if not character:
         return redirect(url_for('index'))
     
-    # Get user's financial data
-    user_financial_data = user_data.find_one({'user_id': user_id})
-    
     # Ensure character has coins attribute
     if not hasattr(character, 'coins'):
         character.coins = 0
-        gamification.save_state("gamification_state.json")
+        gamification.save_state("gamification_state.json", user_id)
     
     # Ensure character has inventory attribute
     if not hasattr(character, 'inventory'):
         character.inventory = []
-        gamification.save_state("gamification_state.json")
+        gamification.save_state("gamification_state.json", user_id)
     
     return render_template('shop.html', 
                          character=character, 
-                         shop_items=shop_items,
-                         financial_data=user_financial_data)
+                         shop_items=shop_items)
 
 @app.route('/purchase/<item_id>', methods=['POST'])
 def purchase(item_id):
@@ -540,24 +506,36 @@ def purchase(item_id):
     if not item:
         return jsonify({'status': 'error', 'message': 'Item not found'}), 404
     
-    # Check if already owned
-    if item_id in character.inventory:
+    # Check ownership and balance and purchase the item in one update
+    def buy(character):
+        if item_id in character.inventory:
+            return 'owned', character.coins
+        if character.coins < item['cost']:
+            return 'insufficient', character.coins
+        character.coins -= item['cost']
+        character.inventory.append(item_id)
+        return 'purchased', character.coins
+    
+    if hasattr(gamification.store, 'purchase'):
+        # The store checks and spends in one atomic update, so concurrent purchases cannot overdraw
+        outcome, coins = gamification.store.purchase(user_id, item_id, item['cost'])
+        gamification.invalidate(user_id)
+    else:
+        outcome, coins = gamification.update_character(user_id, buy)
+    if outcome == 'missing':
+        return jsonify({'status': 'error', 'message': 'Character not found'}), 404
+    if outcome == 'owned':
         return jsonify({'status': 'error', 'message': 'Item already owned'}), 400
-    
-    if character.coins < item['cost']:
+    if outcome == 'insufficient':
         return jsonify({'status': 'error', 'message': 'Not enough coins'}), 400
     
-    # Purchase the item
-    character.coins -= item['cost']
-    character.inventory.append(item_id)
-    
     # Save the updated character state
-    gamification.save_state("gamification_state.json")
+    save_character(user_id)
     
     return jsonify({
         'status': 'success',
         'message': f'Successfully purchased {item["name"]}!',
-        'coins': character.coins,
+        'coins': coins,
         'item_id': item_id
     })
 
@@ -576,13 +554,13 @@ def update_progress():
     user_data_request = request.json
     
     # Get current financial data
-    user_financial_data = user_data.find_one({'user_id': user_id})
+    user_financial_data = user_data_store.get_quest_state(user_id)
     if user_financial_data:
         # Combine financial data with request data
         financial_data = {
             'savings': user_financial_data.get('current_savings', 0),
             'emergency_fund': user_financial_data.get('emergency_fund', 0),
-            'transactions': len(user_financial_data.get('transactions', [])),
+            'transactions': transaction_store.count(user_id),
             'completed_quests': len(user_financial_data.get('completed_quests', [])),
             **user_data_request  # Add any additional data from the request
         }
@@ -590,10 +568,12 @@ def update_progress():
         financial_data = user_data_request
     
     # Update progress
-    results = gamification.update_user_progress(user_id, financial_data)
+    results = gamification.update_character(
+        user_id, lambda character: gamification.update_user_progress(user_id, financial_data)
+    )
     
     # Save state
-    gamification.save_state("gamification_state.json")
+    save_character(user_id)
     
     return jsonify(results)
 
@@ -607,8 +587,8 @@ def exchange_public_token():
     
     if access_token:
         # Check if this bank account is already linked to another user
-        existing_user = user_data.find_one({'access_token': access_token})
-        if existing_user and existing_user['user_id'] != session['user_id']:
+        owner = user_data_store.get_access_token_owner(access_token)
+        if owner is not None and owner != session['user_id']:
             return jsonify({
                 'status': 'error',
                 'message': 'This bank account is already linked to another user'
@@ -630,25 +610,22 @@ def show_transactions():
         return redirect(url_for('login'))
     
     # Get stored transactions from database
-    user_financial_data = user_data.find_one({'user_id': session['user_id']})
+    user_financial_data = user_data_store.get_savings_state(session['user_id'])
     
-    if not user_financial_data:
+    if user_financial_data is None:
         return render_template('error.html', message='No financial data available')
     
-    # Process and sort transactions
-    processed_transactions = []
-    for t in user_financial_data.get('transactions', []):
-        processed_t = t.copy()
-        processed_t['amount'] = float(t['amount'])
-        processed_t['abs_amount'] = abs(float(t['amount']))
-        processed_transactions.append(processed_t)
-    
-    # Sort transactions by date in descending order
-    transactions = sorted(
-        processed_transactions,
-        key=lambda x: x['date'],
-        reverse=True
-    )
+    # One page of transactions, newest first, straight from the (user_id, date) index
+    try:
+        transactions, next_cursor = transaction_store.page(
+            session['user_id'], limit=50, cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        # A malformed cursor just starts again from the newest page
+        transactions, next_cursor = transaction_store.page(session['user_id'], limit=50)
+    for t in transactions:
+        t['amount'] = float(t['amount'])
+        t['abs_amount'] = abs(float(t['amount']))
     
     # Get financial data
     savings_goal = user_financial_data.get('savings_goal', 1000)
@@ -659,28 +636,23 @@ def show_transactions():
     # Update savings goal if POST request
     if request.method == 'POST':
         savings_goal = float(request.form.get('savings_goal', savings_goal))
-        user_data.update_one(
-            {'user_id': session['user_id']},
-            {'$set': {'savings_goal': savings_goal}}
-        )
+        user_data_store.set_savings_goal(session['user_id'], savings_goal)
     
     # Calculate progress percentages
     savings_percentage = min(100, (current_savings / savings_goal * 100) if savings_goal > 0 else 0)
     emergency_percentage = min(100, (emergency_fund / (savings_goal * 0.5) * 100) if savings_goal > 0 else 0)
     
-    # Calculate financial analysis
-    total_income = 0
-    total_expenses = 0
-    category_spending = {}
-    
-    for transaction in transactions:
-        amount = float(transaction['amount'])
-        if amount > 0:
-            total_income += amount
-        else:
-            total_expenses += abs(amount)
-            category = transaction.get('category', ['Uncategorized'])[0]
-            category_spending[category] = category_spending.get(category, 0) + abs(amount)
+    # Calculate financial analysis from the per-month (or, for a date window, per-day)
+    # rollups. ?start=YYYY-MM-DD&end=YYYY-MM-DD limits it to a date window
+    try:
+        summary = transaction_rollups.summary(
+            session['user_id'], start=request.args.get('start') or None, end=request.args.get('end') or None
+        )
+    except ValueError:
+        summary = transaction_rollups.summary(session['user_id'])
+    total_income = summary['total_income']
+    total_expenses = summary['total_expenses']
+    category_spending = summary['category_spending']
     
     # Calculate monthly averages
     monthly_income = total_income / 30 if total_income > 0 else 0
@@ -705,6 +677,7 @@ def show_transactions():
     
     return render_template('transactions.html',
                          transactions=transactions, 
+                         next_cursor=next_cursor,
                          savings_goal=savings_goal,
                          current_savings=current_savings,
                          emergency_fund=emergency_fund,
@@ -716,6 +689,40 @@ def show_transactions():
                              'financial_summary': financial_summary
                          })
 
+@app.route('/export_transactions')
+def export_transactions_download():
+    """Stream the user's transaction history as CSV or NDJSON.
+
+    Query parameters: format (csv or ndjson), start and end (YYYY-MM-DD,
+    end exclusive) and category. Rows go from the Mongo cursor to the
+    response in small chunks, so memory stays flat however long the
+    history is.
+    """
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'start and end must be YYYY-MM-DD'}), 400
+    
+    transactions = transaction_store.find(
+        session['user_id'],
+        since=start,
+        until=end,
+        category=request.args.get('category') or None,
+        projection={'user_id': 0}
+    )
+    return Response(
+        stream_with_context(export_transactions(transactions, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename=transactions.{export_format}'}
+    )
+
 @app.route('/complete_quest', methods=['POST'])
 def complete_quest():
     if 'user_id' not in session:
@@ -724,45 +731,62 @@ def complete_quest():
     try:
         data = request.get_json()
         if not data:
-            print("Error: No JSON data received")
             return jsonify({"error": "Invalid request format"}), 400
             
         quest_id = data.get('quest_id')
-        print(f"Received quest_id: {quest_id}")
         
         if not quest_id:
-            print("Error: No quest_id provided")
             return jsonify({"error": "Quest ID is required"}), 400
         
         user_id = session['user_id']
         character = gamification.get_character(user_id)
         
         if not character:
-            print(f"Error: Character not found for user_id: {user_id}")
             return jsonify({"error": "Character not found"}), 404
         
-        # Find the quest in active missions
-        quest = None
-        for mission in character.active_missions:
+        def complete(character):
+            # Find the quest in active missions
+            quest = None
+            for mission in character.active_missions:
+                # Handle both dictionary and Mission object cases
+                mission_id = mission.get('id') if isinstance(mission, dict) else str(mission.id)
+                if mission_id == quest_id:
+                    quest = mission
+                    break
+            
+            if not quest:
+                return 'missing', None
+            
             # Handle both dictionary and Mission object cases
-            mission_id = mission.get('id') if isinstance(mission, dict) else str(mission.id)
-            print(f"Checking mission_id: {mission_id} against quest_id: {quest_id}")
-            if mission_id == quest_id:
-                quest = mission
-                break
+            is_completed = quest.get('is_completed', False) if isinstance(quest, dict) else quest.is_completed
+            if is_completed:
+                return 'already_completed', None
+            
+            # Mark quest as completed
+            if isinstance(quest, dict):
+                quest['is_completed'] = True
+                quest['progress'] = 100
+                reward_coins = quest.get('reward_coins', 5)
+            else:
+                quest.is_completed = True
+                reward_coins = quest.reward_coins
+            
+            # Award coins
+            character.coins += reward_coins
+            return 'ok', quest.get('description') if isinstance(quest, dict) else quest.description
         
-        if not quest:
-            print(f"Error: Quest not found with id: {quest_id}")
+        # Check and complete the quest in one update so a retry cannot pay out twice
+        if hasattr(gamification.store, 'complete_mission'):
+            outcome, quest, _ = gamification.store.complete_mission(user_id, quest_id)
+            description = quest.get('description', '') if quest else None
+            gamification.invalidate(user_id)
+        else:
+            outcome, description = gamification.update_character(user_id, complete)
+        if outcome == 'missing':
             return jsonify({"error": "Quest not found"}), 404
-        
-        # Handle both dictionary and Mission object cases
-        is_completed = quest.get('is_completed', False) if isinstance(quest, dict) else quest.is_completed
-        if is_completed:
-            print(f"Error: Quest already completed: {quest_id}")
+        if outcome == 'already_completed':
             return jsonify({"error": "Quest already completed"}), 400
-        
-        # Get the quest description
-        description = quest.get('description') if isinstance(quest, dict) else quest.description
+        character = gamification.get_character(user_id)
         
         # Extract the savings amount from the description
         import re
@@ -773,39 +797,17 @@ def complete_quest():
             # If no dollar amount found, use a default value
             savings_amount = 5.0
         
-        # Mark quest as completed
-        if isinstance(quest, dict):
-            quest['is_completed'] = True
-            quest['progress'] = 100
-            reward_coins = quest.get('reward_coins', 5)
-        else:
-            quest.is_completed = True
-            quest.progress = 100
-            reward_coins = quest.reward_coins
-        
-        # Award coins
-        character.coins += reward_coins
-        
         # Update user's financial data with the savings
-        user_financial_data = user_data.find_one({'user_id': user_id})
-        if user_financial_data:
-            # Split the savings between savings and emergency fund (70% savings, 30% emergency)
-            savings_portion = savings_amount * 0.5
-            emergency_portion = savings_amount * 0.5
-            
-            # Update the financial data
-            user_data.update_one(
-                {'user_id': user_id},
-                {
-                    '$inc': {
-                        'current_savings': savings_portion,
-                        'emergency_fund': emergency_portion
-                    }
-                }
-            )
+        # Split the savings between savings and emergency fund (70% savings, 30% emergency)
+        savings_portion = savings_amount * 0.5
+        emergency_portion = savings_amount * 0.5
+        
+        # A single $inc; users without financial data have nothing to add to
+        if not user_data_store.add_savings(user_id, savings_portion, emergency_portion):
+            savings_portion = emergency_portion = 0
         
         # Save character state
-        gamification.save_state("gamification_state.json")
+        save_character(user_id)
         
         return jsonify({
             "status": "success",
@@ -828,37 +830,128 @@ def add_transaction():
         data = request.json
         user_id = session['user_id']
         
-        # Get the user's financial data
-        user_financial_data = user_data.find_one({'user_id': user_id})
-        if not user_financial_data:
+        # Make sure the user has financial data
+        if not user_data_store.exists(user_id):
             return jsonify({'status': 'error', 'message': 'No financial data found'}), 404
         
         # Create new transaction with proper formatting
-        new_transaction = {
-            'date': data['date'],
-            'name': data['name'],
-            'amount': float(data['amount']),
-            'category': data['category'],
-            'transaction_id': str(ObjectId()),  # Generate a unique ID
-            'pending': False,
-            'manual': True  # Flag to indicate this is a manually added transaction
-        }
-        
-        # Add the new transaction to the transactions list
-        transactions = user_financial_data.get('transactions', [])
-        transactions.append(new_transaction)
+        new_transaction, errors = validate_manual_transaction(data)
+        if errors:
+            return jsonify({'status': 'error', 'message': '; '.join(errors)}), 400
         
-        # Update the user's data in the database
-        user_data.update_one(
-            {'user_id': user_id},
-            {'$set': {'transactions': transactions}}
-        )
+        # A single insert of its own document: nothing is read back or rewritten
+        if transaction_store.insert(user_id, new_transaction, repeat=bool(data.get('repeat'))) is None:
+            return jsonify({
+                'status': 'duplicate',
+                'message': 'This transaction is already recorded; send "repeat": true to add it as another purchase'
+            }), 409
         
         return jsonify({'status': 'success'})
     except Exception as e:
         print(f"Error adding transaction: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+MAX_BULK_TRANSACTIONS = 1000
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+@app.route('/add_transactions', methods=['POST'])
+def add_transactions():
+    """Add many manual transactions in one request.
+
+    Accepts a JSON list of transactions (or {"transactions": [...]}). Valid
+    ones are written in one batched insert; invalid ones are reported by
+    index and do not stop the rest.
+    """
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('transactions')
+        if not isinstance(data, list):
+            return jsonify({'status': 'error', 'message': 'Expected a list of transactions'}), 400
+        if len(data) > MAX_BULK_TRANSACTIONS:
+            return jsonify({
+                'status': 'error',
+                'message': f'At most {MAX_BULK_TRANSACTIONS} transactions per request'
+            }), 413
+        
+        user_id = session['user_id']
+        if not user_data_store.exists(user_id):
+            return jsonify({'status': 'error', 'message': 'No financial data found'}), 404
+        
+        valid = []
+        errors = []
+        for index, item in enumerate(data):
+            transaction, item_errors = validate_manual_transaction(item)
+            if item_errors:
+                errors.append({'index': index, 'errors': item_errors})
+            else:
+                valid.append(transaction)
+        
+        inserted = transaction_store.insert_many(user_id, valid)
+        
+        return jsonify({
+            'status': 'success' if not errors else 'partial' if inserted else 'error',
+            'inserted': inserted,
+            'duplicates': len(valid) - inserted,
+            'rejected': len(errors),
+            'errors': errors
+        }), 200 if inserted or not errors else 400
+    except Exception as e:
+        print(f"Error adding transactions: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/import_transactions', methods=['POST'])
+def import_transactions():
+    """Import a CSV or OFX/QFX bank statement uploaded as `statement`.
+
+    The upload is spooled to disk by Werkzeug and parsed incrementally, so
+    memory use does not grow with the file; rows are stored in batches of
+    IMPORT_BATCH_SIZE. For very large files `python transaction_import.py`
+    does the same from the command line with live progress.
+    """
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    statement = request.files.get('statement')
+    if statement is None or not statement.filename:
+        return jsonify({'status': 'error', 'message': 'No statement file uploaded'}), 400
+    import_format = request.form.get('format') or os.path.splitext(statement.filename)[1].lstrip('.').lower()
+    if import_format == 'qfx':
+        import_format = 'ofx'
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'Statement must be a CSV or OFX/QFX file'}), 400
+    
+    user_id = session['user_id']
+    if not user_data_store.exists(user_id):
+        return jsonify({'status': 'error', 'message': 'No financial data found'}), 404
+    
+    def log_progress(report):
+        if report['batches'] % 50 == 0:
+            print(f"Importing for {user_id}: {report['inserted']} rows, "
+                  f"{report['bytes_read'] / 1e6:.1f} MB, {report['rows_per_second']:.0f} rows/s")
+    
+    try:
+        report = import_statement(
+            statement.stream,
+            import_format,
+            lambda batch: transaction_store.insert_many(user_id, batch),
+            batch_size=IMPORT_BATCH_SIZE,
+            progress=log_progress
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error importing statement: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    print(f"Imported {report['inserted']} transactions for {user_id} in {report['seconds']:.1f}s "
+          f"({report['rows_per_second']:.0f} rows/s, {report['rejected']} rejected)")
+    duplicates = report['rows'] - report['rejected'] - report['inserted']
+    return jsonify(dict(report, duplicates=duplicates, status='success' if not report['rejected'] else 'partial'))
+
 @app.route('/character')
 def character():
     if 'user_id' not in session:
@@ -884,8 +977,8 @@ def change_character_name():
     try:
         character = gamification.get_character(session['user_id'])
         if character:
-            character.name = new_name
-            gamification.save_state("gamification_state.json")
+            gamification.update_character(session['user_id'], lambda character: setattr(character, 'name', new_name))
+            save_character(session['user_id'])
             return jsonify({'status': 'success'})
         else:
             return jsonify({'status': 'error', 'message': 'Character not found'}), 404
@@ -914,16 +1007,33 @@ def change_background():
         return jsonify({'status': 'error', 'message': 'Background not owned'}), 400
     
     # Update the character's current background
-    character.current_background = background_id
+    gamification.update_character(
+        user_id, lambda character: setattr(character, 'current_background', background_id)
+    )
     
     # Save the updated character state
-    gamification.save_state("gamification_state.json")
+    save_character(user_id)
     
     return jsonify({
         'status': 'success',
         'message': 'Background changed successfully'
     })
 
+@app.route('/metrics')
+def metrics():
+    """Expose internal counters for tuning"""
+    return jsonify({
+        'gamification_write_behind': gamification.write_behind.stats() if gamification.write_behind else None,
+        'gamification_stale_writes': gamification.stale_writes,
+        'gamification_snapshots': gamification.snapshots.stats() if gamification.snapshots else None,
+        'user_data_queries': user_data_store.stats(),
+        'transaction_dedup': transaction_store.stats(),
+        'insight_cache': insight_cache.stats(),
+        'quest_jobs': quest_jobs.stats(),
+        'gemini': gemini.stats(),
+        'insight_prompt': prompt_builder.stats()
+    })
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('error.html', 
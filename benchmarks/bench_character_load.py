@@ -0,0 +1,105 @@
+"""Per-character memory and load time when restoring gamification state.
+
+Usage: python benchmarks/bench_character_load.py [count] [--compare-to REV]
+
+Builds `count` character records (default 100000), each with two missions,
+and measures how long GamificationSystem._load_characters takes to turn
+them into characters and how much memory tracemalloc sees the resident
+characters holding. --compare-to runs the same measurement against
+gamification.py as of a git revision, e.g. the commit before the
+__slots__/bulk loading change.
+"""
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import gamification
+
+ROUNDS = 3
+
+
+def build_records(count):
+    missions = [
+        {
+            'title': 'Daily Login', 'description': 'Log in to the app', 'mission_type': 'Daily',
+            'reward_coins': 10, 'reward_exp': 5, 'is_completed': False,
+            'start_date': '2024-01-01T08:00:00.123456',
+        },
+        {
+            'title': 'Save $10', 'description': 'Save $10 today', 'mission_type': 'Weekly',
+            'reward_coins': 20, 'reward_exp': 10, 'is_completed': True,
+            'start_date': '2024-01-02T08:00:00.123456',
+        },
+    ]
+    records = {}
+    for i in range(count):
+        user_id = f"user{i}"
+        records[user_id] = {
+            'user_id': user_id, 'name': f"Piggy{i}", 'character_class': 'Saver', 'level': 1 + i % 6,
+            'experience': i % 100, 'experience_to_next_level': 100, 'coins': i % 1000, 'streak': i % 30,
+            'last_login': '2024-01-03T09:30:00.654321', 'inventory': [], 'active_missions': missions,
+        }
+    # Missions are also given in the legacy per-user map so they stay attached after loading
+    return {'characters': records, 'active_missions': {user_id: missions for user_id in records}}
+
+
+def load_module_at(rev):
+    source = subprocess.check_output(['git', 'show', f'{rev}:gamification.py'], cwd=ROOT)
+    module = types.ModuleType(f'gamification_{rev}')
+    exec(compile(source, f'gamification.py@{rev}', 'exec'), module.__dict__)
+    return module
+
+
+def measure(module, state):
+    count = len(state['characters'])
+
+    best = float('inf')
+    for _ in range(ROUNDS):
+        system = module.GamificationSystem()
+        start = time.perf_counter()
+        system._load_characters(state)
+        best = min(best, time.perf_counter() - start)
+        del system
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    system = module.GamificationSystem()
+    system._load_characters(state)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return best / count, (after - before) / count
+
+
+def main(argv):
+    compare_to = None
+    if '--compare-to' in argv:
+        index = argv.index('--compare-to')
+        compare_to = argv[index + 1]
+        del argv[index:index + 2]
+    count = int(argv[0]) if argv else 100000
+
+    state = build_records(count)
+    rows = [('working tree', gamification)]
+    if compare_to:
+        rows.insert(0, (compare_to, load_module_at(compare_to)))
+
+    print(f"{count} characters, 2 missions each")
+    print(f"{'version':>14} {'load/character':>16} {'bytes/character':>16}")
+    results = []
+    for label, module in rows:
+        load_time, size = measure(module, state)
+        results.append((load_time, size))
+        print(f"{label:>14} {load_time * 1e6:>13.2f} us {size:>16.0f}")
+    if len(results) == 2:
+        (old_time, old_size), (new_time, new_size) = results
+        print(f"{'improvement':>14} {old_time / new_time:>15.2f}x {old_size / new_size:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
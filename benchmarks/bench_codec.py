@@ -0,0 +1,58 @@
+"""Binary snapshot codec against the JSON state file.
+
+Usage: python benchmarks/bench_codec.py [characters]
+
+Builds the given number of characters (default 100000), each with three
+missions, and reports save time, load time (decode plus building Character
+objects) and file size for both formats.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gamification import GamificationSystem, Character, CharacterClass
+from gamification_codec import iter_characters, iter_snapshot, write_snapshot
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def load_binary(path):
+    return {user_id: Character.from_dict(char_data) for user_id, char_data in iter_snapshot(path)}
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 100000
+    gamification = GamificationSystem()
+    for i in range(count):
+        user_id = f"user{i}"
+        gamification.create_character(user_id, f"Piggy{i}", CharacterClass.SAVER)
+        gamification.assign_missions(user_id)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, 'gamification_state.json')
+        binary_path = os.path.join(workdir, 'gamification_state.bin')
+
+        json_save, _ = timed(lambda: gamification.save_state(json_path))
+        json_load, _ = timed(lambda: GamificationSystem().load_state(json_path))
+        binary_save, _ = timed(lambda: write_snapshot(binary_path, iter_characters(gamification)))
+        binary_load, loaded = timed(lambda: load_binary(binary_path))
+        assert len(loaded) == count
+
+        json_size = os.path.getsize(json_path)
+        binary_size = os.path.getsize(binary_path)
+
+    print(f"{count} characters")
+    print(f"{'format':<8} {'save s':>8} {'load s':>8} {'size MB':>9}")
+    print(f"{'json':<8} {json_save:>8.2f} {json_load:>8.2f} {json_size / 1e6:>9.1f}")
+    print(f"{'binary':<8} {binary_save:>8.2f} {binary_load:>8.2f} {binary_size / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,106 @@
+"""Insight prompt size: the raw JSON prompt versus PromptBuilder's feature summary.
+
+Usage: python benchmarks/bench_insight_prompt.py [budget]
+
+For histories of growing length (more months, and more distinct categories
+as imported and manual transactions add their own), builds the prompt
+generate_ai_insights used to send (every category as indented JSON plus the
+last five transactions) and the PromptBuilder one, and reports the
+estimated tokens of each and the time to build the new one.
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from insight_prompt import PromptBuilder, estimate_tokens, monthly_periods, recurring_merchants
+
+MERCHANTS = ['Corner Grocer', 'Netflix', 'Spotify', 'City Gym', 'Shell', 'Uber', 'Amazon', 'Starbucks']
+HISTORIES = [(3, 5), (12, 40), (36, 150), (120, 600)]  # (months, distinct categories)
+
+
+def build_transactions(months, categories):
+    start = date(2015, 1, 1)
+    names = [f"Category {i}" for i in range(categories)]
+    transactions = []
+    for i in range(months * 100):
+        day = start + timedelta(days=i * 30 // 100)
+        if i % 100 == 0:
+            transactions.append({'date': day.isoformat(), 'name': "Payroll", 'amount': 4200.0, 'category': ['Transfer']})
+            continue
+        transactions.append({
+            'date': day.isoformat(),
+            'name': random.choice(MERCHANTS) if i % 3 else f"Shop {''.join(random.choices('abcdefgh', k=6))}",
+            'amount': -round(random.uniform(2, 180), 2),
+            'category': [random.choice(names)],
+        })
+    return transactions
+
+
+def summarize(transactions):
+    periods = monthly_periods(transactions)
+    summary = {'total_income': 0.0, 'total_spent': 0.0, 'category_spending': {}, 'transactions': []}
+    for period in periods.values():
+        summary['total_income'] += period['income']
+        summary['total_spent'] += period['expense']
+        for category, spent in period['categories'].items():
+            summary['category_spending'][category] = summary['category_spending'].get(category, 0.0) + spent
+    for transaction in transactions[-5:]:
+        summary['transactions'].append({
+            'date': transaction['date'], 'amount': transaction['amount'],
+            'category': transaction['category'][0], 'name': transaction['name']
+        })
+    summary['months'] = dict(list(periods.items())[-6:])
+    summary['recurring'] = recurring_merchants(t for t in transactions if t['date'] >= list(summary['months'])[0])
+    return summary
+
+
+def raw_prompt(summary, savings_goal):
+    # The prompt generate_ai_insights built before PromptBuilder
+    return f"""
+    Analyze the following financial data and provide personalized savings recommendations:
+
+    Monthly Income: ${summary['total_income']:.2f}
+    Monthly Expenses: ${summary['total_spent']:.2f}
+    Savings Goal: ${savings_goal:.2f}
+
+    Top Spending Categories:
+    {json.dumps(summary['category_spending'], indent=2)}
+
+    Recent Transactions:
+    {json.dumps(summary['transactions'][-5:], indent=2)}
+
+    Please provide:
+    1. A time estimate to reach the savings goal
+    2. Three personalized daily quests to help achieve the goal
+    3. Specific recommendations for reducing expenses in the top spending categories
+
+    Format the response as a JSON object with 'time_estimate' and 'quests' fields.
+    Each quest should have 'title', 'progress', and 'description' fields.
+    """
+
+
+def main(argv):
+    budget = int(argv[0]) if argv else 400
+    random.seed(7)
+    builder = PromptBuilder(budget=budget)
+    print(f"{'months':>6} {'categories':>10} {'raw tokens':>11} {'built tokens':>13} {'saved':>7} {'build ms':>9}")
+    for months, categories in HISTORIES:
+        summary = summarize(build_transactions(months, categories))
+        raw_tokens = estimate_tokens(raw_prompt(summary, 5000))
+        started = time.perf_counter()
+        prompt, tokens = builder.build(summary, 5000)
+        build_ms = (time.perf_counter() - started) * 1000
+        assert tokens <= budget
+        print(f"{months:>6} {len(summary['category_spending']):>10} {raw_tokens:>11} {tokens:>13} "
+              f"{1 - tokens / raw_tokens:>7.0%} {build_ms:>9.2f}")
+    stats = builder.stats()
+    print(f"budget {budget}: mean {stats['avg_tokens']:.0f} tokens, max {stats['max_tokens']}, trimmed {stats['trimmed']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
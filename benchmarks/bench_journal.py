@@ -0,0 +1,77 @@
+"""Per-request write cost of the journaled store versus a full state rewrite.
+
+Usage: python benchmarks/bench_journal.py [sizes...] [--full-max N]
+
+Each size builds that many characters, then times the save a single request
+does after touching one character. The full JSON rewrite is only timed up to
+--full-max characters (default 100000) since it grows linearly.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gamification import GamificationSystem, Character, CharacterClass
+from gamification_journal import CharacterJournal
+
+REQUESTS = 200
+
+
+def build_characters(count):
+    characters = {}
+    for i in range(count):
+        user_id = f"user{i}"
+        characters[user_id] = Character(user_id, f"Piggy{i}", CharacterClass.SAVER)
+    return characters
+
+
+def time_journal(characters, workdir):
+    snapshot = os.path.join(workdir, 'journal_state.json')
+    gamification = GamificationSystem(store=CharacterJournal(snapshot, compact_threshold=float('inf')))
+    gamification.characters = characters
+    user_ids = random.sample(list(characters), min(REQUESTS, len(characters)))
+
+    start = time.perf_counter()
+    for user_id in user_ids:
+        characters[user_id].coins += 1
+        gamification.save_state(snapshot, user_id)
+    elapsed = time.perf_counter() - start
+    gamification.store.close()
+    return elapsed / len(user_ids)
+
+
+def time_full_rewrite(characters, workdir):
+    filename = os.path.join(workdir, 'full_state.json')
+    gamification = GamificationSystem()
+    gamification.characters = characters
+    rounds = 3
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        gamification.save_state(filename)
+    return (time.perf_counter() - start) / rounds
+
+
+def main(argv):
+    full_max = 100000
+    if '--full-max' in argv:
+        index = argv.index('--full-max')
+        full_max = int(argv[index + 1])
+        del argv[index:index + 2]
+    sizes = [int(arg) for arg in argv] or [1000, 10000, 100000, 1000000]
+
+    print(f"{'characters':>12} {'journal/request':>18} {'full rewrite/request':>22}")
+    for size in sizes:
+        characters = build_characters(size)
+        with tempfile.TemporaryDirectory() as workdir:
+            journal_cost = time_journal(characters, workdir)
+            full_cost = time_full_rewrite(characters, workdir) if size <= full_max else None
+        full_text = f"{full_cost * 1000:.2f} ms" if full_cost is not None else "skipped"
+        print(f"{size:>12} {journal_cost * 1e6:>15.1f} us {full_text:>22}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""Request stall of the blocking state rewrite versus background copy-on-write snapshots.
+
+Usage: python benchmarks/bench_snapshot.py [sizes...] [--format json|binary]
+
+For each size, a request thread keeps updating random characters through
+update_character while the main thread saves the state a few times, once
+with the legacy full rewrite (done on the saving request's thread) and
+once with enable_snapshots. Reported per mode: how long save_state blocked
+its caller, the snapshot duration and capture stall, and the worst
+update_character latency seen by the concurrent request thread.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gamification import GamificationSystem, Character, CharacterClass
+
+SAVES = 5
+
+
+def build_system(count):
+    gamification = GamificationSystem()
+    for character in Character.from_dicts(
+        Character(f"user{i}", f"Piggy{i}", CharacterClass.SAVER).to_dict() for i in range(count)
+    ):
+        gamification.characters[character.user_id] = character
+        gamification._track(character.user_id, character)
+    return gamification
+
+
+def run(gamification, path, snapshots):
+    if snapshots:
+        gamification.enable_snapshots(path, snapshots)
+    user_ids = list(gamification.characters)
+    latencies = []
+    stop = threading.Event()
+
+    def requests():
+        while not stop.is_set():
+            user_id = random.choice(user_ids)
+            start = time.perf_counter()
+            gamification.update_character(user_id, lambda character: setattr(character, 'coins', character.coins + 1))
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.0005)
+
+    worker = threading.Thread(target=requests)
+    worker.start()
+    save_calls = []
+    for _ in range(SAVES):
+        start = time.perf_counter()
+        gamification.save_state(path)
+        save_calls.append(time.perf_counter() - start)
+        gamification.flush()
+    stop.set()
+    worker.join()
+
+    latencies.sort()
+    result = {
+        'save_call_ms': max(save_calls) * 1000,
+        'p99_request_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        'max_request_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+    if snapshots:
+        stats = gamification.snapshots.stats()
+        gamification.snapshots.close()
+        result['duration_ms'] = stats['max_duration_ms']
+        result['stall_ms'] = stats['max_stall_ms']
+    return result
+
+
+def main(argv):
+    snapshot_format = 'json'
+    if '--format' in argv:
+        index = argv.index('--format')
+        snapshot_format = argv[index + 1]
+        del argv[index:index + 2]
+    sizes = [int(arg) for arg in argv] or [10000, 100000]
+
+    print(f"{'characters':>10} {'mode':>9} {'save call':>11} {'snapshot':>11} {'stall':>9} "
+          f"{'p99 req':>9} {'max req':>9}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            for mode, snapshots in (('rewrite', None), ('snapshot', snapshot_format)):
+                path = os.path.join(workdir, f"{mode}_state.{'bin' if snapshots == 'binary' else 'json'}")
+                result = run(build_system(size), path, snapshots)
+                duration = f"{result['duration_ms']:.1f} ms" if 'duration_ms' in result else '-'
+                stall = f"{result['stall_ms']:.1f} ms" if 'stall_ms' in result else '-'
+                print(f"{size:>10} {mode:>9} {result['save_call_ms']:>8.1f} ms {duration:>11} {stall:>9} "
+                      f"{result['p99_request_ms']:>6.2f} ms {result['max_request_ms']:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
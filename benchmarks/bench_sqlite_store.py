@@ -0,0 +1,85 @@
+"""Throughput of the SQLite store against the JSON file backend.
+
+Usage: python benchmarks/bench_sqlite_store.py [characters]
+
+Builds the given number of characters (default 10000), then measures
+single-character saves per second and single-character reads per second
+for each backend: the plain JSON file that save_state rewrites in full,
+and SQLiteStateStore's per-row upserts and primary-key lookups.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_sqlite import SQLiteStateStore
+
+OPERATIONS = 500
+
+
+def populate(gamification, count):
+    for i in range(count):
+        user_id = f"user{i}"
+        gamification.create_character(user_id, f"Piggy{i}", CharacterClass.SAVER)
+        gamification.assign_missions(user_id)
+
+
+def bench_saves(gamification, filename, operations):
+    user_ids = random.sample(list(gamification.characters), operations)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        gamification.get_character(user_id).coins += 1
+        gamification.save_state(filename, user_id)
+    return operations / (time.perf_counter() - start)
+
+
+def bench_json_reads(filename, user_ids):
+    # The JSON backend has no per-user access path: every read parses the file
+    start = time.perf_counter()
+    for user_id in user_ids:
+        with open(filename, 'r') as f:
+            json.load(f)['characters'][user_id]
+    return len(user_ids) / (time.perf_counter() - start)
+
+
+def bench_sqlite_reads(store, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        store.load(user_id)
+    return len(user_ids) / (time.perf_counter() - start)
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 10000
+    # Full rewrites are slow, so the JSON backend gets fewer operations
+    json_operations = max(5, min(OPERATIONS, 200000 // count))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        json_file = os.path.join(workdir, 'gamification_state.json')
+        json_system = GamificationSystem()
+        populate(json_system, count)
+        json_system.save_state(json_file)
+        json_saves = bench_saves(json_system, json_file, json_operations)
+        json_reads = bench_json_reads(json_file, random.sample(list(json_system.characters), json_operations))
+
+        store = SQLiteStateStore(os.path.join(workdir, 'gamification.db'))
+        sqlite_system = GamificationSystem(store=store)
+        populate(sqlite_system, count)
+        sqlite_system.save_state(json_file)
+        sqlite_saves = bench_saves(sqlite_system, json_file, OPERATIONS)
+        sqlite_reads = bench_sqlite_reads(store, random.sample(list(sqlite_system.characters), OPERATIONS))
+        store.close()
+
+    print(f"{count} characters")
+    print(f"{'backend':<8} {'saves/s':>12} {'reads/s':>12}")
+    print(f"{'json':<8} {json_saves:>12.1f} {json_reads:>12.1f}")
+    print(f"{'sqlite':<8} {sqlite_saves:>12.1f} {sqlite_reads:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+"""Transaction analytics: per-dict loops versus TransactionFrame reductions.
+
+Usage: python benchmarks/bench_transaction_frame.py [count]
+
+Builds `count` synthetic transactions (default 1000000) in the dict shape
+the app stores and times:
+  - the per-dict totals loop analyze_transactions used to run
+  - TransactionFrame.from_transactions (the one-off columnar build)
+  - TransactionFrame.summary over the whole history and over a 30-day window
+Totals from both paths are checked against each other.
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from transaction_frame import TransactionFrame
+
+CATEGORIES = ['Food', 'Travel', 'Shops', 'Recreation', 'Transfer', 'Payment', 'Service', 'Healthcare']
+ROUNDS = 3
+
+
+def build_transactions(count):
+    start = date(2020, 1, 1)
+    return [
+        {
+            'date': (start + timedelta(days=i % 1500)).isoformat(),
+            'name': f"Merchant {i % 300}",
+            'amount': round(random.uniform(-200, 60), 2),
+            'category': [random.choice(CATEGORIES)],
+            'transaction_id': f"t{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def dict_loop(transactions, start=None, end=None):
+    # The totals loop from analyze_transactions, with the window check /transactions would need
+    summary = {'total_spent': 0, 'total_income': 0, 'category_spending': {}}
+    for transaction in transactions:
+        if start is not None and not start <= transaction['date'] < end:
+            continue
+        amount = float(transaction['amount'])
+        if amount < 0:
+            summary['total_spent'] += abs(amount)
+            category = transaction.get('category', ['Uncategorized'])[0]
+            summary['category_spending'][category] = summary['category_spending'].get(category, 0) + abs(amount)
+        else:
+            summary['total_income'] += amount
+    return summary
+
+
+def best_of(fn):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv):
+    count = int(argv[0]) if argv else 1000000
+    random.seed(7)
+    transactions = build_transactions(count)
+
+    loop_time, expected = best_of(lambda: dict_loop(transactions))
+    build_time, frame = best_of(lambda: TransactionFrame.from_transactions(transactions))
+    summary_time, actual = best_of(frame.summary)
+    assert abs(actual['total_expenses'] - expected['total_spent']) < 1e-6 * count
+    assert actual['category_spending'].keys() == expected['category_spending'].keys()
+
+    window_loop_time, _ = best_of(lambda: dict_loop(transactions, "2023-01-01", "2023-01-31"))
+    window_time, _ = best_of(lambda: frame.summary("2023-01-01", "2023-01-31"))
+
+    print(f"{count} transactions")
+    print(f"  per-dict totals loop     {loop_time * 1000:9.1f} ms")
+    print(f"  frame build (once)       {build_time * 1000:9.1f} ms")
+    print(f"  frame summary            {summary_time * 1000:9.1f} ms  {loop_time / summary_time:6.1f}x")
+    print(f"  per-dict 30-day window   {window_loop_time * 1000:9.1f} ms")
+    print(f"  frame 30-day window      {window_time * 1000:9.1f} ms  {window_loop_time / window_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+"""/transactions summary: MongoDB aggregation versus the Python loop over the history.
+
+Usage: MONGODB_URI=mongodb://localhost:27017 python benchmarks/bench_transaction_summary.py [sizes...]
+
+For each size (default 10000 and 100000) a scratch database gets that many
+transactions for one user. The Python loop streams date/amount/category
+for every transaction and sums them in Flask; the aggregation sends back
+only the per-(sign, category) totals. The scratch database is dropped
+afterwards.
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pymongo import MongoClient
+
+from transaction_store import TransactionStore, summarize_transactions
+
+CATEGORIES = ['Food', 'Travel', 'Shops', 'Recreation', 'Transfer', 'Payment', 'Service', 'Healthcare']
+ROUNDS = 5
+
+
+def build_transactions(count):
+    start = date(2020, 1, 1)
+    return [
+        {
+            'date': (start + timedelta(days=i % 1500)).isoformat(),
+            'name': f"Merchant {i % 300}",
+            'amount': round(random.uniform(-200, 60), 2),
+            'category': [random.choice(CATEGORIES)],
+            'transaction_id': f"t{i}",
+            'pending': False,
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(fn):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv):
+    uri = os.getenv('MONGODB_URI')
+    if not uri:
+        print("Set MONGODB_URI to a MongoDB server to benchmark against")
+        sys.exit(1)
+    sizes = [int(arg) for arg in argv] or [10000, 100000]
+
+    client = MongoClient(uri)
+    name = f"bench_summary_{uuid.uuid4().hex}"
+    try:
+        db = client[name]
+        print(f"{'transactions':>12} {'python loop':>13} {'aggregation':>13} {'speedup':>9}")
+        for size in sizes:
+            store = TransactionStore(db[f"transactions_{size}"])
+            for offset in range(0, size, 10000):
+                store.insert_many("bench", build_transactions(min(10000, size - offset)))
+
+            loop_time, expected = best_of(lambda: summarize_transactions(
+                store.find("bench", projection={'date': 1, 'amount': 1, 'category': 1})
+            ))
+            aggregate_time, actual = best_of(lambda: store.summary("bench"))
+            assert actual['count'] == expected['count'] == size
+            assert abs(actual['total_expenses'] - expected['total_expenses']) < 0.01 * size
+
+            print(f"{size:>12} {loop_time * 1000:>10.1f} ms {aggregate_time * 1000:>10.1f} ms "
+                  f"{loop_time / aggregate_time:>8.1f}x")
+    finally:
+        client.drop_database(name)
+        client.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,19 @@
+import os
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def db():
+    """A throwaway database on the MongoDB server at MONGODB_TEST_URI, dropped afterwards"""
+    # Needs a disposable MongoDB server, e.g. MONGODB_TEST_URI=mongodb://localhost:27017
+    pymongo = pytest.importorskip("pymongo")
+    uri = os.getenv('MONGODB_TEST_URI')
+    if not uri:
+        pytest.skip("MONGODB_TEST_URI is not set")
+    client = pymongo.MongoClient(uri)
+    name = f"finance_test_{uuid.uuid4().hex}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
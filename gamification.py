@@ -1,5 +1,11 @@
 import random
 import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from gamification_snapshot import SnapshotWriter
+from gamification_writeback import WriteBehindQueue
 from datetime import datetime, timedelta
 from enum import Enum
 
@@ -39,10 +45,69 @@ class ChallengeType(Enum):
     BUDGETING = "Budgeting"
 
 
+# Value -> member lookup tables, so deserializing resolves each enum field with one dict lookup
+CHARACTER_CLASSES = {member.value: member for member in CharacterClass}
+CHARACTER_LEVELS = {member.value: member for member in CharacterLevel}
+MISSION_TYPES = {member.value: member for member in MissionType}
+
+
+class StaleWriteError(Exception):
+    """Raised when a character keeps changing in another process faster than an update can be retried"""
+
+
+class TrackedList(list):
+    """List that reports in-place changes to the character that owns it"""
+    
+    __slots__ = ('_owner',)
+    
+    def __init__(self, iterable=(), owner=None):
+        super().__init__(iterable)
+        self._owner = owner
+        self._adopt()
+    
+    def _adopt(self):
+        # Missions inside the list report their own attribute changes to the owner
+        for item in self:
+            if isinstance(item, Mission):
+                item._owner = self._owner
+    
+    def _changed(self):
+        self._adopt()
+        if self._owner is not None:
+            self._owner._mark_dirty()
+
+
+def _tracked(name):
+    method = getattr(list, name)
+    
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
+        return result
+    
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(TrackedList, _name, _tracked(_name))
+
+
 class Character:
     """Represents a user's customizable avatar character"""
     
+    # Slots instead of a per-instance __dict__ keep resident characters small
+    __slots__ = (
+        '_dirty', '_on_change', 'user_id', 'name', 'character_class', 'level', 'experience',
+        'experience_to_next_level', 'coins', 'streak', 'last_login', 'inventory',
+        'active_missions', 'current_background', '__weakref__',
+    )
+    
     def __init__(self, user_id, name="Piggy", character_class=CharacterClass.SAVER):
+        # Dirty tracking: any public attribute change flags the character for the next save
+        self._dirty = False
+        self._on_change = None
         self.user_id = user_id
         self.name = name
         self.character_class = character_class
@@ -56,6 +121,29 @@ class Character:
         self.active_missions = []
         self.current_background = None
 
+    def __setattr__(self, name, value):
+        if name in ('inventory', 'active_missions') and not (isinstance(value, TrackedList) and value._owner is self):
+            value = TrackedList(value, owner=self)
+        object.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        # _on_change hears about every change, not just the first since the last
+        # save, so snapshot views can tell which of their records went stale
+        object.__setattr__(self, '_dirty', True)
+        if self._on_change is not None:
+            self._on_change(self.user_id)
+
+    @property
+    def is_dirty(self):
+        """Whether the character or one of its missions changed since the last save"""
+        return self._dirty
+
+    def mark_clean(self):
+        """Clear the dirty flag once the character has been persisted"""
+        object.__setattr__(self, '_dirty', False)
+
     def to_dict(self):
         """Convert the character to a dictionary"""
         return {
@@ -68,60 +156,67 @@ class Character:
             'coins': self.coins,
             'streak': self.streak,
             'last_login': self.last_login.isoformat(),
-            'inventory': {
-                'outfits': [],
-                'accessories': [],
-                'pets': []
-            },
-            'active_missions': [m.to_dict() if hasattr(m, 'to_dict') else m for m in self.active_missions]
+            'inventory': list(self.inventory),
+            'current_background': self.current_background,
+            # Free-form mission dicts are copied so the record does not change with them
+            'active_missions': [m.to_dict() if hasattr(m, 'to_dict') else dict(m) for m in self.active_missions]
         }
 
     @classmethod
     def from_dict(cls, data):
         """Create a Character instance from a dictionary"""
-        # Find the character class by value instead of name
-        character_class = None
-        for class_enum in CharacterClass:
-            if class_enum.value == data['character_class']:
-                character_class = class_enum
-                break
-        
-        if not character_class:
-            raise ValueError(f"Invalid character class: {data['character_class']}")
-        
-        character = cls(
-            user_id=data['user_id'],
-            name=data['name'],
-            character_class=character_class
-        )
-        
-        # Find the character level by value
-        level = None
-        for level_enum in CharacterLevel:
-            if level_enum.value == data['level']:
-                level = level_enum
-                break
-        
-        if not level:
-            raise ValueError(f"Invalid character level: {data['level']}")
-        
-        character.level = level
-        character.experience = data['experience']
-        character.experience_to_next_level = data['experience_to_next_level']
-        character.coins = data['coins']
-        character.streak = data['streak']
-        character.last_login = datetime.fromisoformat(data['last_login'])
-        
-        # Convert mission dictionaries back to Mission objects
-        character.active_missions = []
-        for mission_data in data.get('active_missions', []):
-            if isinstance(mission_data, dict):
-                mission = Mission.from_dict(mission_data)
-                character.active_missions.append(mission)
-            else:
-                character.active_missions.append(mission_data)
-        
-        return character
+        return cls.from_dicts([data])[0]
+
+    @classmethod
+    def from_dicts(cls, records):
+        """Create Character instances from many dictionaries in one pass.
+
+        Fields are set directly rather than through __init__ and the dirty
+        tracking in __setattr__, so the characters come back clean.
+        """
+        new = cls.__new__
+        set_field = object.__setattr__
+        parse_time = datetime.fromisoformat
+        mission_from_dict = Mission.from_dict
+        characters = []
+        for data in records:
+            character_class = CHARACTER_CLASSES.get(data['character_class'])
+            if character_class is None:
+                raise ValueError(f"Invalid character class: {data['character_class']}")
+            level = CHARACTER_LEVELS.get(data['level'])
+            if level is None:
+                raise ValueError(f"Invalid character level: {data['level']}")
+            
+            character = new(cls)
+            set_field(character, '_dirty', False)
+            set_field(character, '_on_change', None)
+            set_field(character, 'user_id', data['user_id'])
+            set_field(character, 'name', data['name'])
+            set_field(character, 'character_class', character_class)
+            set_field(character, 'level', level)
+            set_field(character, 'experience', data['experience'])
+            set_field(character, 'experience_to_next_level', data['experience_to_next_level'])
+            set_field(character, 'coins', data['coins'])
+            set_field(character, 'streak', data['streak'])
+            set_field(character, 'last_login', parse_time(data['last_login']))
+            # Older records hold a placeholder dict instead of the list of item IDs
+            inventory = data.get('inventory')
+            set_field(character, 'inventory', TrackedList(inventory if isinstance(inventory, list) else [], owner=character))
+            set_field(character, 'current_background', data.get('current_background'))
+            
+            # Convert mission dictionaries back to Mission objects; the free-form
+            # quests built by the /missions route stay plain dicts
+            set_field(character, 'active_missions', TrackedList(
+                [
+                    mission_from_dict(mission_data)
+                    if isinstance(mission_data, dict) and isinstance(mission_data.get('mission_type'), str)
+                    else mission_data
+                    for mission_data in data.get('active_missions', [])
+                ],
+                owner=character
+            ))
+            characters.append(character)
+        return characters
 
     def add_experience(self, amount):
         self.experience += amount
@@ -191,7 +286,13 @@ class Character:
 class Mission:
     """Represents a mission that a character can complete"""
     
+    __slots__ = (
+        '_owner', 'title', 'description', 'mission_type', 'reward_coins', 'reward_exp',
+        'is_completed', 'created_at', '__weakref__',
+    )
+    
     def __init__(self, title, description, mission_type, reward_coins, reward_exp):
+        self._owner = None  # Character whose active_missions holds this mission
         self.title = title
         self.description = description
         self.mission_type = mission_type
@@ -200,6 +301,11 @@ class Mission:
         self.is_completed = False
         self.created_at = datetime.now()
     
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if not name.startswith('_') and self._owner is not None:
+            self._owner._mark_dirty()
+    
     def to_dict(self):
         """Convert the mission to a dictionary"""
         return {
@@ -214,25 +320,21 @@ class Mission:
     
     @classmethod
     def from_dict(cls, data):
-        # Find the mission type by value
-        mission_type = None
-        for type_enum in MissionType:
-            if type_enum.value == data['mission_type']:
-                mission_type = type_enum
-                break
-        
-        if not mission_type:
+        mission_type = MISSION_TYPES.get(data['mission_type'])
+        if mission_type is None:
             raise ValueError(f"Invalid mission type: {data['mission_type']}")
         
-        mission = cls(
-            data['title'],
-            data['description'],
-            mission_type,
-            data['reward_coins'],
-            data['reward_exp']
-        )
-        mission.is_completed = data['is_completed']
-        mission.created_at = datetime.fromisoformat(data['start_date'])  # Use start_date from state file
+        # Set fields directly: a mission being loaded has no owner to notify yet
+        mission = cls.__new__(cls)
+        set_field = object.__setattr__
+        set_field(mission, '_owner', None)
+        set_field(mission, 'title', data['title'])
+        set_field(mission, 'description', data['description'])
+        set_field(mission, 'mission_type', mission_type)
+        set_field(mission, 'reward_coins', data['reward_coins'])
+        set_field(mission, 'reward_exp', data['reward_exp'])
+        set_field(mission, 'is_completed', data['is_completed'])
+        set_field(mission, 'created_at', datetime.fromisoformat(data['start_date']))  # Use start_date from state file
         return mission
 
 
@@ -309,8 +411,47 @@ class Shop:
 class GamificationSystem:
     """Manages the gamification system for the finance app"""
     
-    def __init__(self):
-        self.characters = {}
+    def __init__(self, store=None, cache_size=None, shared=False, refresh_interval=1.0):
+        self.store = store  # Optional persistence backend, see save_state
+        self.write_behind = None  # Set by enable_write_behind
+        self.snapshots = None  # Set by enable_snapshots
+        self._dirty_ids = set()
+        # Snapshot mode: last serialized record per character, and the characters
+        # that changed since it was taken (None while snapshots are off)
+        self._snapshot_records = {}
+        self._snapshot_stale = None
+        
+        # Shared mode: several processes use the same store. Writes carry the
+        # version they were based on, stale ones are rejected, and cached
+        # characters another process changed are dropped (see refresh)
+        self.shared = shared
+        self.refresh_interval = refresh_interval
+        self.stale_writes = 0
+        self._versions = {}
+        self._seen_seq = 0
+        self._last_refresh = 0.0
+        if shared:
+            if store is None or not hasattr(store, 'save_versioned'):
+                raise ValueError("Shared mode needs a store that supports versioned saves")
+            # Other processes create characters too, so misses must always go to the store
+            if cache_size is None:
+                cache_size = 10000
+            self._seen_seq = store.current_seq()
+        
+        # Lazy mode: characters are faulted in from the store on first access and
+        # at most cache_size of them stay resident, least recently used first out
+        self.cache_size = cache_size
+        if cache_size is not None:
+            if store is None or not hasattr(store, 'load'):
+                raise ValueError("Lazy loading needs a store that supports per-user load()")
+            self.characters = OrderedDict()
+        else:
+            self.characters = {}
+        self._cache_lock = threading.RLock()
+        # Striped per-user locks for update_character
+        self._update_locks = [threading.Lock() for _ in range(64)]
+        # Evicted characters a request may still hold, so a fault-in reuses the same object
+        self._evicted = weakref.WeakValueDictionary()
         self.mission_templates = self._generate_mission_templates()
     
     def _generate_mission_templates(self):
@@ -322,15 +463,83 @@ class GamificationSystem:
         ]
     
     def create_character(self, user_id, name, character_class):
-        if user_id in self.characters:
+        if self.get_character(user_id) is not None:
             raise ValueError("Character already exists for this user ID")
         
         character = Character(user_id, name, character_class)
-        self.characters[user_id] = character
+        self._track(user_id, character)
+        self._make_resident(user_id, character)
+        if self.shared:
+            # Claim the row now so two processes cannot both create this character
+            self._dirty_ids.discard(user_id)
+            character.mark_clean()
+            if self._persist({user_id: character.to_dict()}):
+                raise ValueError("Character already exists for this user ID")
         return character
     
     def get_character(self, user_id):
-        return self.characters.get(user_id)
+        if self.cache_size is None:
+            return self.characters.get(user_id)
+        
+        if self.shared and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+        
+        with self._cache_lock:
+            character = self.characters.get(user_id)
+            if character is not None:
+                self.characters.move_to_end(user_id)
+                return character
+            
+            character = self._evicted.pop(user_id, None)
+            if character is None:
+                character = self._fault_in(user_id)
+            if character is not None:
+                self._make_resident(user_id, character)
+            return character
+    
+    def update_character(self, user_id, mutate, retries=5):
+        """Apply mutate(character) and return its result.
+
+        In shared mode the change is written straight away with the version it
+        was based on. If another process got there first, the cached copy is
+        dropped, the character is reloaded and mutate runs again, so mutate
+        must only change the character it is given. Outside shared mode this
+        just applies the change; save_state persists it as usual.
+        """
+        # Updates to one user are serialized; the store write happens outside
+        # the cache lock so other users are not held up behind it
+        with self._update_locks[hash(user_id) % len(self._update_locks)]:
+            for _ in range(retries):
+                with self._cache_lock:
+                    character = self.get_character(user_id)
+                    if not character:
+                        raise ValueError("Character not found")
+                    result = mutate(character)
+                    if not self.shared or not (character.is_dirty or user_id in self._dirty_ids):
+                        return result
+                    
+                    self._dirty_ids.discard(user_id)
+                    character.mark_clean()
+                    changes = {user_id: character.to_dict()}
+                if not self._persist(changes):
+                    return result
+        raise StaleWriteError(f"Gave up updating character {user_id} after {retries} attempts")
+    
+    def invalidate(self, user_id):
+        """Drop the cached copy of a character that was changed directly in the store"""
+        with self._cache_lock:
+            self._invalidate(user_id)
+    
+    def refresh(self):
+        """Drop cached characters that another process has written since the last check"""
+        if not self.shared:
+            return
+        with self._cache_lock:
+            self._last_refresh = time.monotonic()
+            for user_id, version, seq in self.store.changed_since(self._seen_seq):
+                self._seen_seq = max(self._seen_seq, seq)
+                if user_id in self._versions and self._versions[user_id] != version:
+                    self._invalidate(user_id)
     
     def assign_missions(self, user_id):
         character = self.get_character(user_id)
@@ -432,34 +641,118 @@ class GamificationSystem:
         else:
             return CharacterLevel.MASTER
     
-    def save_state(self, filename):
+    def save_state(self, filename, user_id=None):
+        """Save the game state.
+
+        Only characters that changed since the last save are serialized. With a
+        store attached (anything with load_all() and save(changes)) just those
+        records are written; otherwise the whole state file is rewritten.
+        Passing user_id also flags that character as changed, which covers
+        edits the tracking cannot see such as in-place mission dict updates.
+        """
+        if user_id is not None and user_id in self.characters:
+            self._note_change(user_id)
+        
+        if self.write_behind is not None:
+            self.write_behind.request_save(filename)
+            return
+        
+        self._write_state(filename)
+    
+    def enable_write_behind(self, flush_interval_ms=200, max_pending=100):
+        """Switch save_state to write-behind mode.
+
+        Saves return immediately and a background flusher writes the changed
+        characters at most every flush_interval_ms, or sooner once max_pending
+        saves are waiting.
+        """
+        if self.write_behind is None:
+            self.write_behind = WriteBehindQueue(self._write_state, flush_interval_ms, max_pending)
+        return self.write_behind
+    
+    def enable_snapshots(self, path, snapshot_format='json'):
+        """Replace the blocking full-state rewrite with background snapshots.
+
+        Only for systems without a store. save_state then just asks the
+        SnapshotWriter for a snapshot; it captures a view with capture_view()
+        and writes it to path ('json' or 'binary' format) off the request thread.
+        """
+        if self.store is not None:
+            raise ValueError("Snapshots replace the state file rewrite and cannot be used with a store")
+        if self.snapshots is None:
+            # Build the first records up front so no capture has to serialize everyone
+            with self._cache_lock:
+                self._snapshot_records = {
+                    user_id: character.to_dict() for user_id, character in self.characters.items()
+                }
+                self._snapshot_stale = set()
+            self.snapshots = SnapshotWriter(self.capture_view, path, snapshot_format)
+        return self.snapshots
+    
+    def capture_view(self):
+        """Return a point-in-time {user_id: character record} view of every character.
+
+        Records are reused from the previous capture unless the character
+        changed since, and are never mutated once built, so the view can be
+        serialized without holding any lock. Updates made through
+        update_character are either entirely in the view or not at all.
+        """
+        with self._cache_lock:
+            records = self._snapshot_records
+            stale = self._snapshot_stale
+            while stale:
+                user_id = stale.pop()
+                character = self.characters.get(user_id)
+                if character is None:
+                    records.pop(user_id, None)
+                else:
+                    records[user_id] = character.to_dict()
+            return dict(records)
+    
+    def flush(self):
+        """Write out any saves still queued in write-behind mode or as pending snapshots"""
+        if self.write_behind is not None:
+            self.write_behind.flush()
+        if self.snapshots is not None:
+            self.snapshots.wait()
+    
+    def _write_state(self, filename):
+        changes = self._collect_changes(serialize=self.store is not None)
+        if self.store is not None:
+            if changes:
+                try:
+                    self._persist(changes)
+                except Exception:
+                    # Keep the characters queued for the next save
+                    self._dirty_ids.update(changes)
+                    raise
+            return
+        
+        if self.snapshots is not None:
+            self.snapshots.request()
+            return
+        
         state = {
-            'characters': {user_id: char.to_dict() for user_id, char in self.characters.items()}
+            'characters': {user_id: char.to_dict() for user_id, char in list(self.characters.items())}
         }
         with open(filename, 'w') as f:
             json.dump(state, f, indent=2)
     
     def load_state(self, filename):
-        """Load the game state from a JSON file"""
+        """Load the game state from a JSON file, or from the store when one is attached.
+
+        In lazy mode this is a no-op: characters are read on first access instead.
+        """
+        if self.cache_size is not None:
+            return
         try:
-            with open(filename, 'r') as f:
-                state = json.load(f)
+            if self.store is not None:
+                state = {'characters': self.store.load_all()}
+            else:
+                with open(filename, 'r') as f:
+                    state = json.load(f)
             
-            # Load characters
-            for user_id, char_data in state['characters'].items():
-                # Initialize character without missions
-                character = Character.from_dict(char_data)
-                
-                # Add missions if they exist for this user
-                if user_id in state.get('active_missions', {}):
-                    character.active_missions = [
-                        Mission.from_dict(mission_data)
-                        for mission_data in state['active_missions'][user_id]
-                    ]
-                else:
-                    character.active_missions = []
-                
-                self.characters[user_id] = character
+            self._load_characters(state)
         except FileNotFoundError:
             print(f"No state file found at {filename}, starting fresh.")
         except json.JSONDecodeError:
@@ -467,6 +760,128 @@ class GamificationSystem:
         except Exception as e:
             print(f"Error loading state: {e}, starting fresh.")
 
+    def dirty_characters(self):
+        """Return the user IDs of characters changed since the last save"""
+        return set(self._dirty_ids)
+
+    def _track(self, user_id, character):
+        character._on_change = self._note_change
+        if character.is_dirty:
+            self._dirty_ids.add(user_id)
+        if self._snapshot_stale is not None:
+            self._snapshot_stale.add(user_id)
+
+    def _note_change(self, user_id):
+        self._dirty_ids.add(user_id)
+        if self._snapshot_stale is not None:
+            self._snapshot_stale.add(user_id)
+
+    def _collect_changes(self, serialize=True):
+        changes = {}
+        while self._dirty_ids:
+            user_id = self._dirty_ids.pop()
+            character = self.characters.get(user_id) or self._evicted.get(user_id)
+            if character is None:
+                continue
+            # Clear the flag before serializing so a concurrent edit re-queues the character
+            character.mark_clean()
+            changes[user_id] = character.to_dict() if serialize else None
+        return changes
+
+    def _load_characters(self, state):
+        # Deserialize every character in one bulk pass, then attach them
+        records = state['characters']
+        for user_id, character in zip(records, Character.from_dicts(records.values())):
+            self.characters[user_id] = self._finish_loading(user_id, character, state)
+
+    def _build_character(self, user_id, char_data, state):
+        return self._finish_loading(user_id, Character.from_dict(char_data), state)
+
+    def _finish_loading(self, user_id, character, state):
+        # Old state files kept missions in a separate per-user map, which then
+        # replaces the record's own; every other record keeps its missions
+        if state is not None and 'active_missions' in state:
+            character.active_missions = [
+                Mission.from_dict(mission_data)
+                for mission_data in state['active_missions'].get(user_id, [])
+            ]
+        
+        # Freshly loaded characters match what is on disk
+        character.mark_clean()
+        self._track(user_id, character)
+        return character
+
+    def _persist(self, changes):
+        """Write serialized characters to the store and return the user IDs rejected as stale"""
+        if not self.shared:
+            self.store.save(changes)
+            return []
+        
+        with self._cache_lock:
+            expected = {user_id: (char_data, self._versions.get(user_id)) for user_id, char_data in changes.items()}
+        # A write racing this one for the same user is rejected by the version check
+        versions, conflicts = self.store.save_versioned(expected)
+        with self._cache_lock:
+            self._versions.update(versions)
+            for user_id in conflicts:
+                # The stored copy is newer: drop ours so the next access reloads it. Conflicts
+                # are the normal retry path, so they are only counted (see /metrics)
+                self.stale_writes += 1
+                self._invalidate(user_id)
+        return conflicts
+
+    def _invalidate(self, user_id):
+        character = self.characters.pop(user_id, None) or self._evicted.pop(user_id, None)
+        self._evicted.pop(user_id, None)
+        self._versions.pop(user_id, None)
+        self._dirty_ids.discard(user_id)
+        if character is not None:
+            character._on_change = None
+
+    def _fault_in(self, user_id):
+        try:
+            if self.shared:
+                char_data, version = self.store.load_versioned(user_id)
+                if char_data is not None:
+                    self._versions[user_id] = version
+            else:
+                char_data = self.store.load(user_id)
+            if char_data is None:
+                return None
+            return self._build_character(user_id, char_data, None)
+        except Exception as e:
+            print(f"Error loading character {user_id}: {e}")
+            return None
+
+    def _make_resident(self, user_id, character):
+        with self._cache_lock:
+            self.characters[user_id] = character
+            if self.cache_size is None:
+                return
+            self.characters.move_to_end(user_id)
+            while len(self.characters) > self.cache_size:
+                evicted_id, evicted = self.characters.popitem(last=False)
+                if not self._write_back(evicted_id, evicted):
+                    # Keep it resident until the store accepts the write
+                    self.characters[evicted_id] = evicted
+                    break
+
+    def _write_back(self, user_id, character):
+        # Persist an evicted character before it leaves the cache
+        if user_id in self._dirty_ids or character.is_dirty:
+            self._dirty_ids.discard(user_id)
+            character.mark_clean()
+            try:
+                if self._persist({user_id: character.to_dict()}):
+                    # Stale copy: it has been invalidated, so do not keep it around
+                    return True
+            except Exception as e:
+                print(f"Error writing back character {user_id}: {e}")
+                self._dirty_ids.add(user_id)
+                return False
+        self._evicted[user_id] = character
+        return True
+
 
 # Example usage
 if __name__ == "__main__":
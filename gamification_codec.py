@@ -0,0 +1,272 @@
+"""Compact binary snapshot format for gamification state.
+
+A snapshot is a magic header followed by length-prefixed records, one per
+character, so it can be written and read one record at a time:
+
+    header  := b'GMS1'
+    record  := u32 payload_length, payload
+    payload := u8 kind, ...
+
+Kind 0 records pack the character fields directly: enums become one-byte
+codes, datetimes become int64 microseconds since the epoch, and strings are
+u32 length-prefixed UTF-8. The current background comes last, as JSON;
+records written before it was stored end after the missions and decode
+with no background. Anything that does not fit that layout (unknown
+enum values, free-form mission dicts from the /missions route) is stored as
+a kind 1 record holding the character's JSON, so every state round-trips.
+"""
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+
+from gamification import CharacterClass, MissionType
+
+MAGIC = b'GMS1'
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+KIND_PACKED = 0
+KIND_JSON = 1
+
+CLASS_VALUES = [member.value for member in CharacterClass]
+CLASS_CODES = {value: code for code, value in enumerate(CLASS_VALUES)}
+MISSION_TYPE_VALUES = [member.value for member in MissionType]
+MISSION_TYPE_CODES = {value: code for code, value in enumerate(MISSION_TYPE_VALUES)}
+
+LENGTH = struct.Struct('<I')
+COUNT = struct.Struct('<H')
+CHARACTER_FIELDS = struct.Struct('<BBqqqqq')  # class, level, experience, to next level, coins, streak, last_login
+MISSION_FIELDS = struct.Struct('<Bqq?q')  # type, reward coins, reward exp, completed, start_date
+
+CHARACTER_KEYS = {
+    'user_id', 'name', 'character_class', 'level', 'experience', 'experience_to_next_level',
+    'coins', 'streak', 'last_login', 'inventory', 'active_missions', 'current_background',
+}
+MISSION_KEYS = {
+    'title', 'description', 'mission_type', 'reward_coins', 'reward_exp', 'is_completed', 'start_date',
+}
+
+
+class CodecError(ValueError):
+    """Raised when a snapshot file is not in the binary format"""
+
+
+def encode_record(user_id, char_data):
+    """Encode one character dict (as produced by Character.to_dict) into a length-prefixed record"""
+    try:
+        payload = _pack_character(user_id, char_data)
+    except (KeyError, TypeError, ValueError, struct.error):
+        payload = bytes([KIND_JSON]) + _pack_str(user_id) + _pack_str(json.dumps(char_data))
+    return LENGTH.pack(len(payload)) + payload
+
+
+def decode_record(payload):
+    """Decode a record payload back into (user_id, character dict)"""
+    kind = payload[0]
+    user_id, offset = _unpack_str(payload, 1)
+    if kind == KIND_JSON:
+        text, _ = _unpack_str(payload, offset)
+        return user_id, json.loads(text)
+    if kind != KIND_PACKED:
+        raise CodecError(f"Unknown record kind {kind}")
+
+    name, offset = _unpack_str(payload, offset)
+    class_code, level, experience, to_next, coins, streak, last_login = CHARACTER_FIELDS.unpack_from(payload, offset)
+    offset += CHARACTER_FIELDS.size
+    inventory, offset = _unpack_str(payload, offset)
+    (mission_count,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+
+    missions = []
+    for _ in range(mission_count):
+        title, offset = _unpack_str(payload, offset)
+        description, offset = _unpack_str(payload, offset)
+        type_code, reward_coins, reward_exp, is_completed, start_date = MISSION_FIELDS.unpack_from(payload, offset)
+        offset += MISSION_FIELDS.size
+        missions.append({
+            'title': title,
+            'description': description,
+            'mission_type': MISSION_TYPE_VALUES[type_code],
+            'reward_coins': reward_coins,
+            'reward_exp': reward_exp,
+            'is_completed': is_completed,
+            'start_date': _from_micros(start_date),
+        })
+    background = None
+    if offset < len(payload):
+        text, offset = _unpack_str(payload, offset)
+        background = json.loads(text)
+
+    return user_id, {
+        'user_id': user_id,
+        'name': name,
+        'character_class': CLASS_VALUES[class_code],
+        'level': level,
+        'experience': experience,
+        'experience_to_next_level': to_next,
+        'coins': coins,
+        'streak': streak,
+        'last_login': _from_micros(last_login),
+        'inventory': json.loads(inventory),
+        'current_background': background,
+        'active_missions': missions,
+    }
+
+
+def write_snapshot(path, records):
+    """Stream (user_id, character dict) pairs into a binary snapshot, replacing path atomically.
+
+    Returns the number of records written.
+    """
+    tmp_path = path + '.tmp'
+    count = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            for user_id, char_data in records:
+                f.write(encode_record(user_id, char_data))
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # path keeps its previous contents
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return count
+
+
+def iter_snapshot(path):
+    """Yield (user_id, character dict) pairs from a binary snapshot one record at a time"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise CodecError(f"{path} is not a binary gamification snapshot")
+        while True:
+            header = f.read(LENGTH.size)
+            if not header:
+                return
+            if len(header) < LENGTH.size:
+                raise CodecError(f"Truncated record header in {path}")
+            (length,) = LENGTH.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                raise CodecError(f"Truncated record in {path}")
+            yield decode_record(payload)
+
+
+def iter_characters(gamification):
+    """Yield (user_id, character dict) for every resident character, one at a time"""
+    for user_id, character in list(gamification.characters.items()):
+        yield user_id, character.to_dict()
+
+
+def json_to_binary(json_path, binary_path):
+    """Convert a gamification_state.json file into a binary snapshot"""
+    with open(json_path, 'r') as f:
+        state = json.load(f)
+    return write_snapshot(binary_path, state.get('characters', {}).items())
+
+
+def binary_to_json(binary_path, json_path):
+    """Convert a binary snapshot back into the gamification_state.json layout, streaming the output"""
+    tmp_path = json_path + '.tmp'
+    count = 0
+    with open(tmp_path, 'w') as f:
+        f.write('{"characters": {')
+        for user_id, char_data in iter_snapshot(binary_path):
+            if count:
+                f.write(', ')
+            f.write(json.dumps(user_id) + ': ' + json.dumps(char_data))
+            count += 1
+        f.write('}}')
+    os.replace(tmp_path, json_path)
+    return count
+
+
+def _pack_character(user_id, char_data):
+    if set(char_data) - CHARACTER_KEYS or char_data['user_id'] != user_id:
+        raise ValueError("Character has fields the packed layout does not cover")
+
+    missions = char_data.get('active_missions', [])
+    parts = [
+        bytes([KIND_PACKED]),
+        _pack_str(user_id),
+        _pack_str(char_data['name']),
+        CHARACTER_FIELDS.pack(
+            CLASS_CODES[char_data['character_class']],
+            char_data['level'],
+            _int(char_data['experience']),
+            _int(char_data['experience_to_next_level']),
+            _int(char_data['coins']),
+            _int(char_data['streak']),
+            _to_micros(char_data['last_login']),
+        ),
+        _pack_str(json.dumps(char_data['inventory'])),
+        COUNT.pack(len(missions)),
+    ]
+    for mission in missions:
+        if set(mission) != MISSION_KEYS:
+            raise ValueError("Mission does not match the packed layout")
+        parts.append(_pack_str(mission['title']))
+        parts.append(_pack_str(mission['description']))
+        parts.append(MISSION_FIELDS.pack(
+            MISSION_TYPE_CODES[mission['mission_type']],
+            _int(mission['reward_coins']),
+            _int(mission['reward_exp']),
+            _bool(mission['is_completed']),
+            _to_micros(mission['start_date']),
+        ))
+    parts.append(_pack_str(json.dumps(char_data.get('current_background'))))
+    return b''.join(parts)
+
+
+def _int(value):
+    # bool is an int subclass but would not round-trip as one
+    if type(value) is not int:
+        raise TypeError("Expected an int")
+    return value
+
+
+def _bool(value):
+    if type(value) is not bool:
+        raise TypeError("Expected a bool")
+    return value
+
+
+def _pack_str(value):
+    if not isinstance(value, str):
+        raise TypeError("Expected a string")
+    data = value.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_str(buffer, offset):
+    (length,) = LENGTH.unpack_from(buffer, offset)
+    offset += LENGTH.size
+    return buffer[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _to_micros(text):
+    value = datetime.fromisoformat(text)
+    # Only naive timestamps that print back identically are packed
+    if value.tzinfo is not None or value.isoformat() != text:
+        raise ValueError("Timestamp does not round-trip")
+    return (value - EPOCH) // MICROSECOND
+
+
+def _from_micros(micros):
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ('to-binary', 'to-json'):
+        print("Usage: python gamification_codec.py to-binary <state.json> <state.bin>")
+        print("       python gamification_codec.py to-json <state.bin> <state.json>")
+        sys.exit(1)
+    if sys.argv[1] == 'to-binary':
+        count = json_to_binary(sys.argv[2], sys.argv[3])
+    else:
+        count = binary_to_json(sys.argv[2], sys.argv[3])
+    print(f"Converted {count} characters into {sys.argv[3]}")
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+
+from gamification_codec import CodecError, iter_snapshot, write_snapshot
+
+
+class CharacterJournal:
+    """Append-only write-ahead log of character records, folded into a snapshot by a compactor.
+
+    Every save appends one small JSON line per changed character to the log
+    instead of rewriting the whole state file. The snapshot keeps the same
+    layout as gamification_state.json ({'characters': {user_id: {...}}}), so
+    existing state files are picked up as the initial snapshot. With
+    snapshot_format='binary' the snapshot uses gamification_codec instead and
+    compaction streams the old snapshot record by record.
+    """
+
+    def __init__(self, snapshot_path, log_path=None, compact_threshold=10000, fsync=False, snapshot_format='json'):
+        if snapshot_format not in ('json', 'binary'):
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        self.snapshot_path = snapshot_path
+        self.snapshot_format = snapshot_format
+        self.log_path = log_path or snapshot_path + '.log'
+        self.compacting_path = self.log_path + '.compacting'
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.records_since_compaction = 0
+        self._log = None
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compact_requested = threading.Event()
+        self._stop = threading.Event()
+        self._compactor = None
+
+    def append(self, user_id, char_data):
+        """Append a single character record to the log"""
+        self.save({user_id: char_data})
+
+    def save(self, changes):
+        """Append a record for every changed character in a single write"""
+        lines = ''.join(
+            json.dumps({'user_id': user_id, 'character': char_data}, separators=(',', ':')) + '\n'
+            for user_id, char_data in changes.items()
+        )
+        with self._lock:
+            if self._log is None:
+                self._log = open(self.log_path, 'a')
+            self._log.write(lines)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self.records_since_compaction += len(changes)
+            if self.records_since_compaction >= self.compact_threshold:
+                self._compact_requested.set()
+
+    def load_all(self):
+        """Return every character record, for GamificationSystem.load_state"""
+        return self.replay()['characters']
+
+    def replay(self):
+        """Return the snapshot state with every logged record applied on top"""
+        state = self._read_snapshot()
+        characters = state.setdefault('characters', {})
+        # A leftover .compacting file is older than the live log, so apply it first
+        for path in (self.compacting_path, self.log_path):
+            for record in self._read_log(path):
+                characters[record['user_id']] = record['character']
+        return state
+
+    def compact(self):
+        """Fold the current log into a fresh snapshot"""
+        with self._compact_lock:
+            # Rotate the log so appends can continue while the snapshot is rebuilt
+            with self._lock:
+                self._close_log()
+                if os.path.exists(self.log_path) and not os.path.exists(self.compacting_path):
+                    os.replace(self.log_path, self.compacting_path)
+                self.records_since_compaction = 0
+                self._compact_requested.clear()
+
+            if not os.path.exists(self.compacting_path):
+                return
+
+            if self.snapshot_format == 'binary':
+                self._compact_binary()
+            else:
+                # A snapshot that cannot be read is left alone, with the rotated log beside it
+                state = self._read_snapshot(strict=True)
+                characters = state.setdefault('characters', {})
+                for record in self._read_log(self.compacting_path):
+                    characters[record['user_id']] = record['character']
+                self._write_snapshot(state)
+            os.remove(self.compacting_path)
+
+    def _compact_binary(self):
+        # Only the logged records are held in memory; the snapshot is merged as it streams past
+        updates = {}
+        for record in self._read_log(self.compacting_path):
+            updates[record['user_id']] = record['character']
+
+        def merged():
+            # A damaged snapshot aborts the write rather than keeping only the records before the damage
+            for user_id, char_data in self._iter_binary_snapshot(strict=True):
+                yield user_id, updates.pop(user_id, char_data)
+            yield from list(updates.items())
+
+        write_snapshot(self.snapshot_path, merged())
+
+    def start_compactor(self, interval=60):
+        """Compact in a background thread every `interval` seconds or once the log passes the threshold"""
+        if self._compactor is not None:
+            return
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._run_compactor, args=(interval,), daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        """Stop the compactor and close the log file"""
+        if self._compactor is not None:
+            self._stop.set()
+            self._compact_requested.set()
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self._close_log()
+
+    def _run_compactor(self, interval):
+        while not self._stop.is_set():
+            self._compact_requested.wait(interval)
+            if self._stop.is_set():
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting gamification journal: {e}")
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _read_snapshot(self, strict=False):
+        # strict raises instead of treating an unreadable snapshot as empty
+        if self.snapshot_format == 'binary':
+            return {'characters': dict(self._iter_binary_snapshot(strict))}
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'characters': {}}
+        except json.JSONDecodeError:
+            if strict:
+                raise
+            print(f"Error reading snapshot {self.snapshot_path}, starting from an empty snapshot.")
+            return {'characters': {}}
+
+    def _iter_binary_snapshot(self, strict=False):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            yield from iter_snapshot(self.snapshot_path)
+        except CodecError as e:
+            if strict:
+                raise
+            print(f"Error reading snapshot {self.snapshot_path}: {e}")
+
+    def _read_log(self, path):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append can leave a torn final line behind
+                        print(f"Skipping unreadable record in {path}")
+        except FileNotFoundError:
+            return
+
+    def _write_snapshot(self, state):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
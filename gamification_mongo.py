@@ -0,0 +1,177 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+EPOCH = datetime(1970, 1, 1)
+# Bookkeeping fields that are not part of Character.to_dict()
+INTERNAL_FIELDS = {'_id': 0, 'version': 0, 'seq': 0}
+# Every write bumps the version and stamps seq with the server's clock
+STAMP = {'$inc': {'version': 1}, '$currentDate': {'seq': True}}
+
+
+class MongoCharacterStore:
+    """Gamification state in MongoDB: one document per character, keyed by user_id.
+
+    Implements the same load/save and versioned save interface as
+    SQLiteStateStore, so GamificationSystem can run in lazy, shared mode on
+    top of it and no process has to hold every character. Coin spends,
+    quest rewards and mission assignment also have single-document atomic
+    operations (purchase, complete_mission, push_missions). They bump the
+    version like any other write, so cached copies and in-flight versioned
+    saves see the change instead of overwriting it.
+
+    seq is a server-side timestamp rather than a counter, so changed_since()
+    can return a change twice; callers compare versions, which makes that harmless.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        collection.create_index([('seq', ASCENDING)])
+
+    def load_all(self):
+        """Return every character record, for GamificationSystem.load_state"""
+        return {doc['user_id']: doc for doc in self.collection.find({}, INTERNAL_FIELDS)}
+
+    def load(self, user_id):
+        """Return one character record, or None if the user has no state"""
+        return self.collection.find_one({'_id': user_id}, INTERNAL_FIELDS)
+
+    def load_versioned(self, user_id):
+        """Return (character record, version), or (None, None) if the user has no state"""
+        doc = self.collection.find_one({'_id': user_id}, {'_id': 0, 'seq': 0})
+        if doc is None:
+            return None, None
+        return doc, doc.pop('version')
+
+    def save(self, changes):
+        """Upsert the changed characters in one batched write"""
+        if not changes:
+            return
+        self.collection.bulk_write([
+            UpdateOne({'_id': user_id}, dict(STAMP, **{'$set': char_data}), upsert=True)
+            for user_id, char_data in changes.items()
+        ], ordered=False)
+
+    def save_versioned(self, changes):
+        """Write characters only where the stored version still matches.
+
+        changes maps user_id to (character record, expected version); an
+        expected version of None means the character must not exist yet.
+        Returns (new versions by user_id, list of user_ids whose write was
+        rejected as stale).
+        """
+        versions = {}
+        conflicts = []
+        for user_id, (char_data, expected_version) in changes.items():
+            if expected_version is None:
+                try:
+                    self.collection.update_one(
+                        {'_id': user_id, 'version': {'$exists': False}},
+                        dict(STAMP, **{'$set': char_data}),
+                        upsert=True
+                    )
+                except DuplicateKeyError:
+                    # The upsert lost to an existing document
+                    conflicts.append(user_id)
+                    continue
+                versions[user_id] = 1
+                continue
+            result = self.collection.update_one(
+                {'_id': user_id, 'version': expected_version},
+                dict(STAMP, **{'$set': char_data})
+            )
+            if result.matched_count:
+                versions[user_id] = expected_version + 1
+            else:
+                conflicts.append(user_id)
+        return versions, conflicts
+
+    def current_seq(self):
+        """Return the timestamp of the most recent write"""
+        doc = self.collection.find_one({}, {'seq': 1}, sort=[('seq', DESCENDING)])
+        return doc['seq'] if doc else EPOCH
+
+    def changed_since(self, seq):
+        """Return (user_id, version, seq) for every character written at or after seq"""
+        return [
+            (doc['_id'], doc['version'], doc['seq'])
+            for doc in self.collection.find({'seq': {'$gte': seq}}, {'version': 1, 'seq': 1}).sort('seq', ASCENDING)
+        ]
+
+    def count(self):
+        """Return the number of stored characters"""
+        return self.collection.count_documents({})
+
+    def purchase(self, user_id, item_id, cost):
+        """Spend `cost` coins on `item_id` in a single conditional update.
+
+        Returns (outcome, coins) with outcome 'purchased', 'owned',
+        'insufficient' or 'missing'. The balance and ownership checks are
+        part of the update's filter, so concurrent purchases cannot overdraw.
+        """
+        doc = self.collection.find_one_and_update(
+            {'_id': user_id, 'coins': {'$gte': cost}, 'inventory': {'$ne': item_id}},
+            {
+                '$inc': {'coins': -cost, 'version': 1},
+                '$push': {'inventory': item_id},
+                '$currentDate': {'seq': True},
+            },
+            projection={'coins': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            return 'purchased', doc['coins']
+
+        # Only a rejected purchase pays for a second read, to say why
+        doc = self.collection.find_one({'_id': user_id}, {'coins': 1, 'inventory': 1})
+        if doc is None:
+            return 'missing', None
+        if item_id in doc.get('inventory', []):
+            return 'owned', doc['coins']
+        return 'insufficient', doc['coins']
+
+    def complete_mission(self, user_id, mission_id):
+        """Mark the mission with the given id completed and pay its reward coins once.
+
+        Returns (outcome, mission, coins) with outcome 'ok',
+        'already_completed' or 'missing'. The payout is conditional on the
+        mission still being open, so a repeated request cannot pay twice.
+        """
+        doc = self.collection.find_one(
+            {'_id': user_id, 'active_missions.id': mission_id}, {'active_missions.$': 1}
+        )
+        if doc is None:
+            return 'missing', None, None
+        mission = doc['active_missions'][0]
+        if mission.get('is_completed'):
+            return 'already_completed', mission, None
+
+        doc = self.collection.find_one_and_update(
+            {'_id': user_id, 'active_missions': {'$elemMatch': {'id': mission_id, 'is_completed': {'$ne': True}}}},
+            {
+                '$set': {'active_missions.$.is_completed': True, 'active_missions.$.progress': 100},
+                '$inc': {'coins': mission.get('reward_coins', 5), 'version': 1},
+                '$currentDate': {'seq': True},
+            },
+            projection={'coins': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            # Another request completed it between the two calls
+            return 'already_completed', mission, None
+        return 'ok', mission, doc['coins']
+
+    def push_missions(self, user_id, missions, only_if_empty=True):
+        """Append missions to the character's active missions; returns whether they were added.
+
+        With only_if_empty, missions are only added when the character has
+        none, so two requests generating quests at once do not both add theirs.
+        """
+        query = {'_id': user_id}
+        if only_if_empty:
+            query['active_missions'] = {'$size': 0}
+        result = self.collection.update_one(
+            query, dict(STAMP, **{'$push': {'active_missions': {'$each': list(missions)}}})
+        )
+        return result.modified_count == 1
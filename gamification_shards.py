@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import zlib
+
+
+class ShardedStateStore:
+    """Character state split across a fixed set of shard files.
+
+    Each shard is a text file with one `"<user_id>"\t<character json>` line per
+    character. A save only rewrites the shards that hold changed characters,
+    and lines for characters that did not change are copied over verbatim, so
+    untouched entries stay byte-for-byte identical.
+    """
+
+    def __init__(self, directory, shard_count=64):
+        self.directory = directory
+        self.shard_count = shard_count
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def shard_path(self, user_id):
+        """Return the shard file that holds the given user"""
+        # crc32 rather than hash() so the layout is stable across processes
+        shard = zlib.crc32(str(user_id).encode('utf-8')) % self.shard_count
+        return os.path.join(self.directory, f"shard-{shard:03d}.jsonl")
+
+    def load_all(self):
+        """Return every character record across all shards"""
+        characters = {}
+        for shard in range(self.shard_count):
+            path = os.path.join(self.directory, f"shard-{shard:03d}.jsonl")
+            for user_id, line in self._read_shard(path):
+                characters[user_id] = json.loads(line.split('\t', 1)[1])
+        return characters
+
+    def load(self, user_id):
+        """Return one character record, or None if the user has no state"""
+        for shard_user_id, line in self._read_shard(self.shard_path(user_id)):
+            if shard_user_id == user_id:
+                return json.loads(line.split('\t', 1)[1])
+        return None
+
+    def save(self, changes):
+        """Write the changed characters, touching only the shards that hold them"""
+        by_shard = {}
+        for user_id, char_data in changes.items():
+            by_shard.setdefault(self.shard_path(user_id), {})[user_id] = char_data
+
+        with self._lock:
+            for path, shard_changes in by_shard.items():
+                self._rewrite_shard(path, shard_changes)
+
+    def _rewrite_shard(self, path, shard_changes):
+        pending = dict(shard_changes)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as out:
+            for user_id, line in self._read_shard(path):
+                if user_id in pending:
+                    line = self._format_line(user_id, pending.pop(user_id))
+                out.write(line)
+            for user_id, char_data in pending.items():
+                out.write(self._format_line(user_id, char_data))
+        os.replace(tmp_path, path)
+
+    def _format_line(self, user_id, char_data):
+        return json.dumps(user_id) + '\t' + json.dumps(char_data, separators=(',', ':')) + '\n'
+
+    def _read_shard(self, path):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    yield json.loads(line.split('\t', 1)[0]), line
+        except FileNotFoundError:
+            return
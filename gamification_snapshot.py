@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+
+
+class SnapshotWriter:
+    """Writes point-in-time snapshots of the gamification state from a background thread.
+
+    `capture` returns a {user_id: character record} view whose records are
+    never mutated afterwards (see GamificationSystem.capture_view), so the
+    thread can serialize it while requests keep changing characters. Only
+    the capture itself runs under the system's lock; that is the stall
+    reported in stats(). Snapshots requested while one is being written are
+    folded into a single follow-up snapshot. The file is written to a temp
+    path and renamed over the old one, so readers never see a partial file.
+    """
+
+    def __init__(self, capture, path, snapshot_format='json'):
+        if snapshot_format not in ('json', 'binary'):
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        self._capture = capture
+        self.path = path
+        self.snapshot_format = snapshot_format
+        self._requested = False
+        self._busy = False
+        self._stop = False
+        self._condition = threading.Condition()
+        self._stats = {
+            'requests': 0,
+            'snapshots': 0,
+            'failed_snapshots': 0,
+            'last_records': 0,
+            'last_stall_ms': 0.0,
+            'max_stall_ms': 0.0,
+            'total_stall_ms': 0.0,
+            'last_duration_ms': 0.0,
+            'max_duration_ms': 0.0,
+            'total_duration_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Ask for a snapshot of the current state; returns immediately"""
+        with self._condition:
+            self._stats['requests'] += 1
+            self._requested = True
+            self._condition.notify_all()
+
+    def wait(self):
+        """Block until every requested snapshot has been written"""
+        with self._condition:
+            while (self._requested or self._busy) and self._thread.is_alive():
+                self._condition.wait()
+
+    def close(self):
+        """Write any requested snapshot and stop the background thread"""
+        self.wait()
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        """Return snapshot counters: time spent capturing (stall) and writing (duration)"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = self._requested or self._busy
+        snapshots = stats['snapshots']
+        stats['avg_stall_ms'] = stats['total_stall_ms'] / snapshots if snapshots else 0.0
+        stats['avg_duration_ms'] = stats['total_duration_ms'] / snapshots if snapshots else 0.0
+        return stats
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stop and not self._requested:
+                    self._condition.wait()
+                if not self._requested:
+                    return
+                self._requested = False
+                self._busy = True
+            try:
+                self._snapshot()
+            except Exception as e:
+                print(f"Error writing gamification snapshot: {e}")
+                with self._condition:
+                    self._stats['failed_snapshots'] += 1
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _snapshot(self):
+        start = time.perf_counter()
+        view = self._capture()
+        captured = time.perf_counter()
+        if self.snapshot_format == 'binary':
+            # Imported here because gamification_codec imports gamification
+            from gamification_codec import write_snapshot
+            write_snapshot(self.path, view.items())
+        else:
+            self._write_json(view)
+        stall_ms = (captured - start) * 1000
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        with self._condition:
+            self._stats['snapshots'] += 1
+            self._stats['last_records'] = len(view)
+            self._stats['last_stall_ms'] = stall_ms
+            self._stats['max_stall_ms'] = max(self._stats['max_stall_ms'], stall_ms)
+            self._stats['total_stall_ms'] += stall_ms
+            self._stats['last_duration_ms'] = duration_ms
+            self._stats['max_duration_ms'] = max(self._stats['max_duration_ms'], duration_ms)
+            self._stats['total_duration_ms'] += duration_ms
+
+    def _write_json(self, view):
+        # Same layout as gamification_state.json, encoded one record at a time
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('{"characters": {')
+            for count, (user_id, char_data) in enumerate(view.items()):
+                if count:
+                    f.write(', ')
+                f.write(json.dumps(user_id) + ': ' + json.dumps(char_data))
+            f.write('}}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,300 @@
+import json
+import sqlite3
+import sys
+import threading
+
+CHARACTER_COLUMNS = (
+    'user_id', 'name', 'character_class', 'level', 'experience',
+    'experience_to_next_level', 'coins', 'streak', 'last_login', 'inventory', 'current_background',
+)
+MISSION_COLUMNS = (
+    'title', 'description', 'mission_type', 'reward_coins', 'reward_exp',
+    'is_completed', 'start_date',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    user_id TEXT PRIMARY KEY,
+    name TEXT,
+    character_class TEXT,
+    level INTEGER,
+    experience INTEGER,
+    experience_to_next_level INTEGER,
+    coins INTEGER,
+    streak INTEGER,
+    last_login TEXT,
+    inventory TEXT,
+    current_background TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS missions (
+    user_id TEXT NOT NULL REFERENCES characters(user_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    description TEXT,
+    mission_type TEXT,
+    reward_coins INTEGER,
+    reward_exp INTEGER,
+    is_completed INTEGER,
+    start_date TEXT,
+    extra TEXT,
+    PRIMARY KEY (user_id, position)
+);
+"""
+# Created after the upgrade check so databases from before versioning get the columns first
+SEQ_INDEX = "CREATE INDEX IF NOT EXISTS characters_seq ON characters(seq)"
+
+
+class SQLiteStateStore:
+    """Gamification state in SQLite (WAL mode): one row per character plus a missions child table.
+
+    Reads and writes for a user are primary-key lookups, and WAL lets request
+    threads (or other processes) read while a save is being committed.
+
+    Every write bumps the row's version and stamps it with a database-wide
+    sequence number. save_versioned() only applies a write when the caller's
+    version is still current, and changed_since() lets other processes find
+    rows they have cached that changed under them.
+    """
+
+    def __init__(self, path='gamification.db'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(characters)')}
+        for column in ('version', 'seq'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE characters ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+        if 'current_background' not in columns:
+            conn.execute('ALTER TABLE characters ADD COLUMN current_background TEXT')
+        conn.execute(SEQ_INDEX)
+
+    def load_all(self):
+        """Return every character record, for GamificationSystem.load_state"""
+        conn = self._connection()
+        characters = {}
+        for row in conn.execute(f"SELECT {', '.join(CHARACTER_COLUMNS)} FROM characters"):
+            char_data = self._character_from_row(row)
+            char_data['active_missions'] = []
+            characters[char_data['user_id']] = char_data
+        for row in conn.execute(
+            f"SELECT user_id, {', '.join(MISSION_COLUMNS)}, extra FROM missions ORDER BY user_id, position"
+        ):
+            if row[0] in characters:
+                characters[row[0]]['active_missions'].append(self._mission_from_row(row[1:]))
+        return characters
+
+    def load(self, user_id):
+        """Return one character record, or None if the user has no state"""
+        return self.load_versioned(user_id)[0]
+
+    def load_versioned(self, user_id):
+        """Return (character record, version), or (None, None) if the user has no state"""
+        conn = self._connection()
+        # One read transaction so the character and its missions come from the same commit
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(CHARACTER_COLUMNS)}, version FROM characters WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            char_data = self._character_from_row(row[:-1])
+            char_data['active_missions'] = [
+                self._mission_from_row(mission_row)
+                for mission_row in conn.execute(
+                    f"SELECT {', '.join(MISSION_COLUMNS)}, extra FROM missions WHERE user_id = ? ORDER BY position",
+                    (user_id,)
+                )
+            ]
+            return char_data, row[-1]
+        finally:
+            conn.execute('COMMIT')
+
+    def save(self, changes):
+        """Upsert the changed characters and replace their missions in one transaction"""
+        self._save(changes.items(), expected_versions=None)
+
+    def save_versioned(self, changes):
+        """Write characters only where the stored version still matches.
+
+        changes maps user_id to (character record, expected version); an
+        expected version of None means the character must not exist yet.
+        Returns (new versions by user_id, list of user_ids whose write was
+        rejected as stale). Accepted writes are committed even when others
+        in the batch are rejected.
+        """
+        expected_versions = {user_id: version for user_id, (_, version) in changes.items()}
+        return self._save(
+            ((user_id, char_data) for user_id, (char_data, _) in changes.items()),
+            expected_versions=expected_versions
+        )
+
+    def current_seq(self):
+        """Return the sequence number of the most recent write"""
+        return self._connection().execute('SELECT COALESCE(MAX(seq), 0) FROM characters').fetchone()[0]
+
+    def changed_since(self, seq):
+        """Return (user_id, version, seq) for every character written after the given sequence number"""
+        return self._connection().execute(
+            'SELECT user_id, version, seq FROM characters WHERE seq > ? ORDER BY seq', (seq,)
+        ).fetchall()
+
+    def _save(self, items, expected_versions):
+        conn = self._connection()
+        versions = {}
+        conflicts = []
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM characters').fetchone()[0]
+                for user_id, char_data in items:
+                    seq += 1
+                    if expected_versions is None:
+                        version = self._write_character(conn, user_id, char_data, seq)
+                    else:
+                        version = self._write_character_if_current(
+                            conn, user_id, char_data, seq, expected_versions[user_id]
+                        )
+                    if version is None:
+                        conflicts.append(user_id)
+                    else:
+                        versions[user_id] = version
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return versions, conflicts
+
+    def count(self):
+        """Return the number of stored characters"""
+        return self._connection().execute('SELECT COUNT(*) FROM characters').fetchone()[0]
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly in save()
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _character_values(self, user_id, char_data):
+        values = [user_id] + [char_data.get(column) for column in CHARACTER_COLUMNS[1:]]
+        values[CHARACTER_COLUMNS.index('inventory')] = json.dumps(char_data.get('inventory', []))
+        return values
+
+    def _write_character(self, conn, user_id, char_data, seq):
+        conn.execute(
+            f"INSERT INTO characters ({', '.join(CHARACTER_COLUMNS)}, version, seq) "
+            f"VALUES ({', '.join('?' for _ in CHARACTER_COLUMNS)}, 1, ?) "
+            f"ON CONFLICT(user_id) DO UPDATE SET "
+            + ', '.join(f"{column} = excluded.{column}" for column in CHARACTER_COLUMNS[1:])
+            + ", version = version + 1, seq = excluded.seq",
+            self._character_values(user_id, char_data) + [seq]
+        )
+        self._write_missions(conn, user_id, char_data)
+        return conn.execute('SELECT version FROM characters WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    def _write_character_if_current(self, conn, user_id, char_data, seq, expected_version):
+        values = self._character_values(user_id, char_data)
+        if expected_version is None:
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO characters ({', '.join(CHARACTER_COLUMNS)}, version, seq) "
+                f"VALUES ({', '.join('?' for _ in CHARACTER_COLUMNS)}, 1, ?)",
+                values + [seq]
+            )
+            new_version = 1
+        else:
+            cursor = conn.execute(
+                "UPDATE characters SET "
+                + ', '.join(f"{column} = ?" for column in CHARACTER_COLUMNS[1:])
+                + ", version = version + 1, seq = ? WHERE user_id = ? AND version = ?",
+                values[1:] + [seq, user_id, expected_version]
+            )
+            new_version = expected_version + 1
+        if cursor.rowcount == 0:
+            return None
+        self._write_missions(conn, user_id, char_data)
+        return new_version
+
+    def _write_missions(self, conn, user_id, char_data):
+        conn.execute('DELETE FROM missions WHERE user_id = ?', (user_id,))
+        conn.executemany(
+            f"INSERT INTO missions (user_id, position, {', '.join(MISSION_COLUMNS)}, extra) "
+            f"VALUES (?, ?, {', '.join('?' for _ in MISSION_COLUMNS)}, ?)",
+            [
+                (user_id, position, *self._mission_to_row(mission_data))
+                for position, mission_data in enumerate(char_data.get('active_missions', []))
+            ]
+        )
+
+    def _character_from_row(self, row):
+        char_data = dict(zip(CHARACTER_COLUMNS, row))
+        char_data['inventory'] = json.loads(char_data['inventory']) if char_data['inventory'] else []
+        return char_data
+
+    def _mission_to_row(self, mission_data):
+        # Missions built by the /missions route are free-form dicts; anything that
+        # does not fit a scalar column is kept in the extra JSON column
+        columns = []
+        extra = {}
+        for column in MISSION_COLUMNS:
+            value = mission_data.get(column)
+            if isinstance(value, (dict, list)):
+                extra[column] = value
+                value = None
+            columns.append(value)
+        for key, value in mission_data.items():
+            if key not in MISSION_COLUMNS:
+                extra[key] = value
+        return (*columns, json.dumps(extra) if extra else None)
+
+    def _mission_from_row(self, row):
+        mission_data = {
+            column: value for column, value in zip(MISSION_COLUMNS, row[:-1]) if value is not None
+        }
+        if 'is_completed' in mission_data:
+            mission_data['is_completed'] = bool(mission_data['is_completed'])
+        if row[-1]:
+            mission_data.update(json.loads(row[-1]))
+        return mission_data
+
+
+def migrate_json_state(json_path, store, batch_size=1000):
+    """One-shot import of a gamification_state.json file into a store. Returns the number of characters copied."""
+    with open(json_path, 'r') as f:
+        state = json.load(f)
+
+    batch = {}
+    copied = 0
+    for user_id, char_data in state.get('characters', {}).items():
+        batch[user_id] = char_data
+        if len(batch) >= batch_size:
+            store.save(batch)
+            copied += len(batch)
+            batch = {}
+    if batch:
+        store.save(batch)
+        copied += len(batch)
+    return copied
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python gamification_sqlite.py <gamification_state.json> <gamification.db>")
+        sys.exit(1)
+    copied = migrate_json_state(sys.argv[1], SQLiteStateStore(sys.argv[2]))
+    print(f"Migrated {copied} characters into {sys.argv[2]}")
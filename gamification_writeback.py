@@ -0,0 +1,126 @@
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """Coalesces GamificationSystem saves into periodic background writes.
+
+    Request threads only record that a save is owed and return. A single
+    flusher thread performs the real write once `flush_interval_ms` has passed
+    since the oldest unflushed save, or as soon as `max_pending` saves have
+    piled up, whichever comes first.
+    """
+
+    def __init__(self, write, flush_interval_ms=200, max_pending=100):
+        self._write = write  # Callable taking the filename to persist to
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self._filename = None
+        self._pending = 0
+        self._oldest_pending_at = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stop = False
+        self._stats = {
+            'save_requests': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'last_lag_ms': 0.0,
+            'max_lag_ms': 0.0,
+            'total_lag_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request_save(self, filename):
+        """Record that the state changed and wake the flusher if the batch is full"""
+        with self._condition:
+            self._filename = filename
+            self._stats['save_requests'] += 1
+            if self._pending == 0:
+                self._oldest_pending_at = time.monotonic()
+            self._pending += 1
+            if self._pending >= self.max_pending or self._pending == 1:
+                self._condition.notify()
+
+    def flush(self):
+        """Write any pending changes now and wait for the write to finish.
+
+        Errors from the underlying write are raised after the batch has been
+        re-queued, so nothing is dropped.
+        """
+        with self._write_lock:
+            with self._condition:
+                if self._pending == 0:
+                    return
+                filename, pending, oldest = self._take_batch()
+            self._do_write(filename, pending, oldest)
+
+    def close(self):
+        """Flush what is pending and stop the background thread"""
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Return counters for tuning: coalescing ratio and durability lag"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+            stats['current_lag_ms'] = (
+                (time.monotonic() - self._oldest_pending_at) * 1000 if self._pending else 0.0
+            )
+        flushes = stats['flushes']
+        stats['coalescing_ratio'] = (stats['save_requests'] - stats['pending']) / flushes if flushes else 0.0
+        stats['avg_lag_ms'] = stats['total_lag_ms'] / flushes if flushes else 0.0
+        return stats
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stop and self._pending == 0:
+                    self._condition.wait()
+                if self._stop:
+                    return
+                # Wait out the rest of the interval unless the batch fills up first
+                deadline = self._oldest_pending_at + self.flush_interval
+                while not self._stop and self._pending < self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing gamification state: {e}")
+                # Back off for one interval instead of retrying in a tight loop
+                with self._condition:
+                    if not self._stop:
+                        self._condition.wait(self.flush_interval)
+
+    def _take_batch(self):
+        batch = (self._filename, self._pending, self._oldest_pending_at)
+        self._pending = 0
+        self._oldest_pending_at = None
+        return batch
+
+    def _do_write(self, filename, pending, oldest):
+        try:
+            self._write(filename)
+        except Exception:
+            with self._condition:
+                # Put the batch back so the next flush retries it
+                self._stats['failed_flushes'] += 1
+                self._pending += pending
+                if self._oldest_pending_at is None or oldest < self._oldest_pending_at:
+                    self._oldest_pending_at = oldest
+            raise
+
+        lag_ms = (time.monotonic() - oldest) * 1000
+        with self._condition:
+            self._stats['flushes'] += 1
+            self._stats['last_lag_ms'] = lag_ms
+            self._stats['max_lag_ms'] = max(self._stats['max_lag_ms'], lag_ms)
+            self._stats['total_lag_ms'] += lag_ms
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    latency REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS insights_used_at ON insights(used_at);
+"""
+# Size eviction runs every this many writes rather than counting rows on each one
+PURGE_EVERY = 100
+
+
+def insight_key(payload):
+    """Stable content hash of the inputs an insight was generated from.
+
+    payload is any JSON-compatible structure; floats are rounded to cents
+    and keys sorted, so totals summed in a different order hash the same.
+    """
+    return hashlib.sha256(
+        json.dumps(_round_floats(payload), sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()
+
+
+class InsightCache:
+    """Two-tier cache of generated insights keyed by insight_key().
+
+    An in-memory LRU of `memory_size` entries sits in front of a SQLite
+    table (WAL mode) shared by every worker process using the same `path`.
+    Entries expire `ttl` seconds after they are written, and the table is
+    cut back to the `max_rows` most recently used rows. path=None keeps
+    only the memory tier. Each entry remembers how long generating it
+    took, so stats() can report the latency hits saved.
+    """
+
+    def __init__(self, path='insight_cache.db', ttl=24 * 3600, memory_size=256, max_rows=10000):
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self._memory = OrderedDict()  # key -> (expires_at, value, latency)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'latency_saved': 0.0}
+        if path is not None:
+            self._connection().executescript(SCHEMA)
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                self._stats['latency_saved'] += entry[2]
+                return entry[1]
+            if entry is not None:
+                del self._memory[key]
+
+        if self.path is not None:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value, latency, expires_at FROM insights WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute('UPDATE insights SET used_at = ? WHERE key = ?', (now, key))
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, (row[2], value, row[1]))
+                    self._stats['disk_hits'] += 1
+                    self._stats['latency_saved'] += row[1]
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key, value, latency=0.0):
+        """Cache a JSON-compatible value; latency is how long producing it took, in seconds"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, (expires_at, value, latency))
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if self.path is not None:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO insights (key, value, latency, expires_at, used_at) VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(value), latency, expires_at, now)
+            )
+            if purge:
+                self.purge()
+
+    def purge(self):
+        """Drop expired rows and the least recently used ones beyond max_rows; returns rows removed"""
+        if self.path is None:
+            return 0
+        conn = self._connection()
+        removed = conn.execute('DELETE FROM insights WHERE expires_at <= ?', (time.time(),)).rowcount
+        removed += conn.execute(
+            'DELETE FROM insights WHERE key IN ('
+            'SELECT key FROM insights ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.max_rows,)
+        ).rowcount
+        return removed
+
+    def stats(self):
+        """Hit counts per tier, misses, hit rate and seconds of generation the hits saved"""
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory))
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+def _round_floats(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {str(k): _round_floats(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round_floats(v) for v in value]
+    return value
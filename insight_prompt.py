@@ -0,0 +1,192 @@
+import re
+import threading
+
+NON_LETTERS = re.compile(r'[^a-z]+')
+# Category and merchant names are cut to this many characters in the prompt
+NAME_LENGTH = 24
+
+PROMPT_HEADER = "Analyze the following financial data and provide personalized savings recommendations."
+PROMPT_INSTRUCTIONS = """Please provide:
+1. A time estimate to reach the savings goal
+2. Three personalized daily quests to help achieve the goal
+3. Specific recommendations for reducing expenses in the top spending categories
+
+Format the response as a JSON object with 'time_estimate' and 'quests' fields.
+Each quest should have 'title', 'progress', and 'description' fields."""
+
+
+def estimate_tokens(text):
+    """Rough token count of a prompt: about four characters per token for English text"""
+    return (len(text) + 3) // 4
+
+
+def merchant_key(name):
+    """Lower-cased letters of a merchant name, so "NETFLIX.COM 1234" and "Netflix.com" match"""
+    return ' '.join(NON_LETTERS.sub(' ', str(name).lower()).split())
+
+
+def monthly_periods(transactions, until=None):
+    """Per-month totals of an iterable of transactions, shaped like TransactionRollups.periods.
+
+    Months at or after `until` (a 'YYYY-MM' key) are left out, so a partial
+    current month can be excluded.
+    """
+    periods = {}
+    for transaction in transactions:
+        month = str(transaction['date'])[:7]
+        if until is not None and month >= until:
+            continue
+        period = periods.setdefault(month, {'income': 0.0, 'expense': 0.0, 'count': 0, 'categories': {}})
+        amount = float(transaction['amount'])
+        period['count'] += 1
+        if amount > 0:
+            period['income'] += amount
+        else:
+            period['expense'] += -amount
+            category = (transaction.get('category') or ['Uncategorized'])[0]
+            period['categories'][category] = period['categories'].get(category, 0.0) - amount
+    return dict(sorted(periods.items()))
+
+
+def recurring_merchants(transactions, min_months=3):
+    """Merchants charged in at least `min_months` different months, biggest average monthly spend first.
+
+    Returns [{'name', 'monthly', 'months'}], where monthly is the spend per
+    month the merchant appeared in.
+    """
+    merchants = {}
+    for transaction in transactions:
+        amount = float(transaction['amount'])
+        key = merchant_key(transaction.get('name', ''))
+        if amount >= 0 or not key:
+            continue
+        merchant = merchants.setdefault(key, {'name': str(transaction['name']), 'months': set(), 'spent': 0.0})
+        merchant['months'].add(str(transaction['date'])[:7])
+        merchant['spent'] += -amount
+    recurring = [
+        {'name': merchant['name'], 'monthly': merchant['spent'] / len(merchant['months']), 'months': len(merchant['months'])}
+        for merchant in merchants.values() if len(merchant['months']) >= min_months
+    ]
+    recurring.sort(key=lambda merchant: -merchant['monthly'])
+    return recurring
+
+
+def percent_change(new, old):
+    return round((new - old) * 100 / old) if old else None
+
+
+def trend_deltas(periods, categories, baseline_months=3):
+    """Latest month's spending against the average of up to `baseline_months` before it.
+
+    `periods` is {month: {'expense', 'categories'}} in month order, complete
+    months only. Returns {'month', 'spent', 'categories': {category: change}}
+    with changes in percent, or None with fewer than two months.
+    """
+    months = list(periods)
+    if len(months) < 2:
+        return None
+    latest = periods[months[-1]]
+    baseline = [periods[month] for month in months[-1 - baseline_months:-1]]
+
+    def average(value):
+        return sum(value(period) for period in baseline) / len(baseline)
+
+    changes = {}
+    for category in categories:
+        change = percent_change(latest['categories'].get(category, 0.0),
+                                average(lambda period: period['categories'].get(category, 0.0)))
+        if change is not None:
+            changes[category] = change
+    return {
+        'month': months[-1],
+        'spent': percent_change(latest['expense'], average(lambda period: period['expense'])),
+        'categories': changes
+    }
+
+
+class PromptBuilder:
+    """Builds the insight prompt from a fixed-size feature summary within a token budget.
+
+    However long a user's history, the prompt carries the same features:
+    income and spending totals, the `top_categories` largest categories
+    (the rest folded into "Other"), trend deltas for the latest complete
+    month and the `recurring` largest recurring merchants. If the estimate
+    is still over `budget` tokens, merchants, then categories, then trends
+    are dropped until it fits. stats() reports the estimated tokens per call.
+    """
+
+    def __init__(self, budget=400, top_categories=5, recurring=3):
+        self.budget = budget
+        self.top_categories = top_categories
+        self.recurring = recurring
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'tokens': 0, 'max_tokens': 0, 'trimmed': 0, 'over_budget': 0}
+
+    def build(self, transaction_summary, savings_goal):
+        """Return (prompt, estimated tokens) for a summary from build_transaction_summary"""
+        categories = sorted(transaction_summary['category_spending'].items(), key=lambda item: -item[1])
+        top = categories[:self.top_categories]
+        other = sum(spent for _, spent in categories[self.top_categories:])
+        trends = trend_deltas(transaction_summary.get('months') or {}, [category for category, _ in top])
+        merchants = list(transaction_summary.get('recurring') or [])[:self.recurring]
+
+        prompt = self.render(transaction_summary, savings_goal, top, other, trends, merchants)
+        tokens = estimate_tokens(prompt)
+        trimmed = False
+        while tokens > self.budget:
+            if merchants:
+                merchants.pop()
+            elif len(top) > 1:
+                other += top.pop()[1]
+            elif trends:
+                trends = None
+            else:
+                break
+            trimmed = True
+            prompt = self.render(transaction_summary, savings_goal, top, other, trends, merchants)
+            tokens = estimate_tokens(prompt)
+
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['tokens'] += tokens
+            self._stats['max_tokens'] = max(self._stats['max_tokens'], tokens)
+            self._stats['trimmed'] += trimmed
+            self._stats['over_budget'] += tokens > self.budget
+        return prompt, tokens
+
+    def render(self, transaction_summary, savings_goal, top, other, trends, merchants):
+        changes = trends['categories'] if trends else {}
+        category_lines = [
+            f"- {category[:NAME_LENGTH]}: ${spent:.2f}"
+            + (f" ({changes[category]:+d}% in {trends['month']})" if category in changes else "")
+            for category, spent in top
+        ]
+        if other:
+            category_lines.append(f"- Other: ${other:.2f}")
+        lines = [
+            PROMPT_HEADER,
+            "",
+            f"Monthly Income: ${transaction_summary['total_income']:.2f}",
+            f"Monthly Expenses: ${transaction_summary['total_spent']:.2f}",
+            f"Savings Goal: ${savings_goal:.2f}",
+            "",
+            "Top Spending Categories:",
+            *category_lines
+        ]
+        if trends and trends['spent'] is not None:
+            lines.append(f"Spending in {trends['month']}: {trends['spent']:+d}% against the months before")
+        if merchants:
+            lines.append("Recurring Charges:")
+            lines.extend(
+                f"- {merchant['name'][:NAME_LENGTH]}: ${merchant['monthly']:.2f}/month for {merchant['months']} months"
+                for merchant in merchants
+            )
+        lines.extend(["", PROMPT_INSTRUCTIONS])
+        return '\n'.join(lines)
+
+    def stats(self):
+        """Prompts built, their mean and largest estimated token counts, and how many were trimmed"""
+        with self._lock:
+            stats = dict(self._stats, budget=self.budget)
+        stats['avg_tokens'] = stats['tokens'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """The breaker is open (or the call slots are all taken), so the call was not attempted"""
+
+
+class ModelTimeoutError(Exception):
+    """The model did not answer within the deadline"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row (errors, timeouts, or calls
+    slower than `slow_call_seconds`) the breaker opens and allow() refuses
+    calls for `reset_seconds`. Then a single trial call is let through
+    (half open): success closes the breaker, failure opens it again. Only
+    the trial's outcome moves a breaker that is not closed; calls admitted
+    before it opened that finish late are counted but change nothing.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, slow_call_seconds=None):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'successes': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        """Whether a call may go ahead now; refused calls are counted as rejected.
+
+        Returns False, or the state the call was let through in: CLOSED, or
+        HALF_OPEN for the trial call, whose outcome must be reported with trial=True.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._trial_running):
+                self._trial_running = self.state == HALF_OPEN
+                self._stats['calls'] += 1
+                return self.state
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self, seconds=0.0, trial=False):
+        """Report a call that returned; one slower than slow_call_seconds counts as a failure"""
+        if self.slow_call_seconds is not None and seconds > self.slow_call_seconds:
+            with self._lock:
+                self._stats['slow_calls'] += 1
+            self.record_failure(trial)
+            return
+        with self._lock:
+            self._stats['successes'] += 1
+            if trial:
+                self._trial_running = False
+                self.state = CLOSED
+            if self.state == CLOSED:
+                self._consecutive_failures = 0
+
+    def record_failure(self, trial=False):
+        with self._lock:
+            self._stats['failures'] += 1
+            if trial:
+                self._trial_running = False
+            elif self.state != CLOSED:
+                # Admitted before the breaker opened; the trial decides what happens next
+                return
+            self._consecutive_failures += 1
+            if trial or self._consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._stats['opened'] += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        """Breaker state, consecutive failures and call counters"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                state = HALF_OPEN
+            else:
+                state = self.state
+            return dict(self._stats, state=state, consecutive_failures=self._consecutive_failures)
+
+
+class GuardedModel:
+    """Wraps a model's generate_content with a deadline and a circuit breaker.
+
+    Each call runs on a small pool of `max_concurrent` threads and the
+    caller waits at most `timeout` seconds for it. A call that times out is
+    abandoned and keeps its slot until the model finally returns, so a hung
+    backend can tie up at most max_concurrent threads; once they are all
+    taken, further calls fail at once instead of queueing. Timeouts, errors
+    and slow calls count towards opening the breaker, and while it is open
+    calls raise CircuitOpenError without touching the model.
+    """
+
+    def __init__(self, model, timeout=10.0, breaker=None, max_concurrent=8):
+        self.model = model
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='model-call')
+        self._timeouts = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, timeout=None):
+        """Call the model; raises CircuitOpenError, ModelTimeoutError or whatever the model raised"""
+        admitted = self.breaker.allow()
+        if not admitted:
+            raise CircuitOpenError("Model circuit breaker is open")
+        trial = admitted == HALF_OPEN
+        if not self._slots.acquire(blocking=False):
+            self.breaker.record_failure(trial)
+            raise CircuitOpenError("All model call slots are busy")
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(self.model.generate_content, prompt)
+        except Exception:
+            self._slots.release()
+            # Report it even so, or a trial call would leave the breaker half open for good
+            self.breaker.record_failure(trial)
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            response = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            self.breaker.record_failure(trial)
+            raise ModelTimeoutError(f"Model did not answer within {self.timeout if timeout is None else timeout}s")
+        except Exception:
+            self.breaker.record_failure(trial)
+            raise
+        self.breaker.record_success(time.monotonic() - started, trial)
+        return response
+
+    def stats(self):
+        """Breaker stats plus the number of calls abandoned at the deadline"""
+        with self._lock:
+            return dict(self.breaker.stats(), timeouts=self._timeouts)
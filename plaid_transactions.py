@@ -57,7 +57,9 @@ class PlaidClient:
                     'transaction_id': str(t.transaction_id) if t.transaction_id else '',
                     'merchant_name': str(t.merchant_name) if t.merchant_name else '',
                     'payment_channel': str(t.payment_channel) if t.payment_channel else '',
-                    'pending': bool(t.pending) if t.pending is not None else False
+                    'pending': bool(t.pending) if t.pending is not None else False,
+                    # Set on posted transactions that replace an earlier pending one
+                    'pending_transaction_id': str(t.pending_transaction_id) if t.pending_transaction_id else None
                 }
                 processed_transactions.append(transaction_data)
             
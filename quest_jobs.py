@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QuestJobs:
+    """Runs slow per-user jobs (AI quest generation) on a background thread pool.
+
+    submit() returns immediately. A user has at most one job queued or
+    running at a time; submitting again while it is pending is a no-op,
+    so reloading a page does not queue duplicate model calls. The outcome
+    of each user's latest finished job is kept (up to `keep_results`
+    users) for status().
+    """
+
+    def __init__(self, run, workers=4, keep_results=1000):
+        self._run = run  # run(user_id, *args) -> outcome
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quest-jobs')
+        self.keep_results = keep_results
+        self._pending = set()
+        self._results = OrderedDict()  # user_id -> ('done', outcome) or ('failed', message)
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'completed': 0, 'failed': 0, 'total_seconds': 0.0}
+
+    def submit(self, user_id, *args):
+        """Queue run(user_id, *args) unless a job for the user is already pending; returns whether one was queued"""
+        with self._lock:
+            if user_id in self._pending:
+                self._stats['deduplicated'] += 1
+                return False
+            self._pending.add(user_id)
+            self._results.pop(user_id, None)
+            self._stats['submitted'] += 1
+        self._executor.submit(self._work, user_id, args)
+        return True
+
+    def status(self, user_id):
+        """Return ('pending', None), ('done', outcome), ('failed', message) or (None, None)"""
+        with self._lock:
+            if user_id in self._pending:
+                return 'pending', None
+            return self._results.get(user_id, (None, None))
+
+    def stats(self):
+        """Jobs submitted, deduplicated, completed and failed, how many are pending, and their mean run time"""
+        with self._lock:
+            stats = dict(self._stats, pending=len(self._pending))
+        finished = stats['completed'] + stats['failed']
+        stats['avg_seconds'] = stats['total_seconds'] / finished if finished else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        """Stop taking jobs; with wait, finish the ones already queued"""
+        self._executor.shutdown(wait=wait)
+
+    def _work(self, user_id, args):
+        started = time.perf_counter()
+        try:
+            result = ('done', self._run(user_id, *args))
+        except Exception as e:
+            print(f"Quest job for {user_id} failed: {e}")
+            result = ('failed', str(e))
+        with self._lock:
+            self._pending.discard(user_id)
+            self._results[user_id] = result
+            while len(self._results) > self.keep_results:
+                self._results.popitem(last=False)
+            self._stats['completed' if result[0] == 'done' else 'failed'] += 1
+            self._stats['total_seconds'] += time.perf_counter() - started
@@ -0,0 +1,213 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from pymongo import ASCENDING, UpdateOne
+
+# Users due a refresh are found through this index, never-refreshed users (null) first
+DUE_INDEX = [('last_quest_refresh', ASCENDING), ('_id', ASCENDING)]
+DUE_INDEX_NAME = 'last_quest_refresh_id'
+CHECKPOINT_ID = 'quest_refresh'
+REFRESH_PROJECTION = {'last_quest_refresh': 1, 'savings_goal': 1}
+SKIPPED = object()
+
+
+def quest_refresh_fields(quests, today):
+    """The users fields written when a user's daily quests are replaced"""
+    return {
+        'last_quest_refresh': str(today),
+        'completed_quests': [],  # Reset completed quests
+        'current_quests': quests  # Store current quests
+    }
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads; rate None or 0 means unlimited"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def stale_users(users, today, after=None, projection=None, batch_size=100):
+    """Yield users whose quests were last refreshed before `today` (or never).
+
+    Users come in (last_quest_refresh, _id) order straight off DUE_INDEX,
+    starting after the `after` position, a (last_quest_refresh, _id) pair
+    as kept in the checkpoint.
+    """
+    refreshed, after_id = after or (None, None)
+    queries = []
+    if refreshed is None:
+        never = {'last_quest_refresh': None}
+        if after_id is not None:
+            never['_id'] = {'$gt': after_id}
+        queries.append(never)
+        queries.append({'last_quest_refresh': {'$lt': str(today)}})
+    else:
+        queries.append({'$or': [
+            {'last_quest_refresh': {'$gt': refreshed, '$lt': str(today)}},
+            {'last_quest_refresh': refreshed, '_id': {'$gt': after_id}}
+        ]})
+    for query in queries:
+        cursor = users.find(query, projection).sort(DUE_INDEX).hint(DUE_INDEX_NAME).batch_size(batch_size)
+        yield from cursor
+
+
+def refresh_stale_quests(users, prepare, generate, checkpoints=None, today=None, workers=4, rate=None,
+                         batch_size=100, progress=None, stop=None):
+    """Regenerate the daily quests of every user not yet refreshed today.
+
+    Users stream off an indexed cursor (see stale_users) into a pool of
+    `workers` threads, with at most 2 * workers users in flight. For each,
+    prepare(user) gathers the inputs (None skips the user, e.g. no
+    transactions yet) and generate(inputs) returns the quests, or None if
+    the model could not produce them; such users count as failed and are
+    not written, so they stay due. generate calls are limited to `rate`
+    per second so the model backend is not flooded. Results are written in
+    bulk every `batch_size` users. An update only applies if
+    last_quest_refresh is unchanged, so a user refreshed by the app
+    meanwhile keeps those quests.
+
+    stop() is checked before each user is queued; once it returns true
+    (e.g. the model's circuit breaker opened) no more users are started
+    and the run ends after the ones in flight.
+
+    After each bulk write the cursor position is saved in `checkpoints`;
+    a run started again the same day resumes from there. progress(report)
+    is called after every write. Returns the final report: scanned,
+    refreshed, skipped, failed, conflicts (users the app refreshed first),
+    batches, seconds, users_per_second, whether the run resumed and
+    whether it stopped early.
+    """
+    today = today or date.today()
+    users.create_index(DUE_INDEX, name=DUE_INDEX_NAME)
+    limiter = RateLimiter(rate)
+    report = {
+        'scanned': 0, 'refreshed': 0, 'skipped': 0, 'failed': 0, 'conflicts': 0, 'batches': 0,
+        'seconds': 0.0, 'users_per_second': 0.0, 'resumed': False, 'stopped': False
+    }
+    after = None
+    if checkpoints is not None:
+        saved = checkpoints.find_one({'_id': CHECKPOINT_ID})
+        if saved and saved.get('day') == str(today):
+            after = (saved.get('refreshed'), saved.get('user'))
+            report['resumed'] = True
+    started = time.perf_counter()
+
+    def work(user):
+        inputs = prepare(user)
+        if inputs is None:
+            return SKIPPED
+        limiter.wait()
+        return generate(inputs)
+
+    updates = []
+    position = None
+    in_flight = deque()
+
+    def flush():
+        if updates:
+            result = users.bulk_write(updates, ordered=False)
+            report['conflicts'] += len(updates) - result.matched_count
+            report['refreshed'] += result.matched_count
+            report['batches'] += 1
+            updates.clear()
+        if checkpoints is not None and position is not None:
+            checkpoints.update_one(
+                {'_id': CHECKPOINT_ID},
+                {'$set': {'day': str(today), 'refreshed': position[0], 'user': position[1]}},
+                upsert=True
+            )
+        report['seconds'] = time.perf_counter() - started
+        report['users_per_second'] = report['scanned'] / report['seconds'] if report['seconds'] else 0.0
+        if progress is not None:
+            progress(report)
+
+    def collect():
+        # Results are taken in cursor order so the checkpoint never passes an unfinished user
+        nonlocal position
+        user, future = in_flight.popleft()
+        try:
+            quests = future.result()
+        except Exception as e:
+            print(f"Quest refresh for {user['_id']} failed: {e}")
+            report['failed'] += 1
+        else:
+            if quests is SKIPPED:
+                report['skipped'] += 1
+            elif quests is None:
+                report['failed'] += 1
+            else:
+                updates.append(UpdateOne(
+                    {'_id': user['_id'], 'last_quest_refresh': user.get('last_quest_refresh')},
+                    {'$set': quest_refresh_fields(quests, today)}
+                ))
+        report['scanned'] += 1
+        position = (user.get('last_quest_refresh'), user['_id'])
+        if report['scanned'] % batch_size == 0:
+            flush()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quest-refresh') as executor:
+        for user in stale_users(users, today, after=after, projection=REFRESH_PROJECTION, batch_size=batch_size):
+            if stop is not None and stop():
+                report['stopped'] = True
+                break
+            in_flight.append((user, executor.submit(work, user)))
+            if len(in_flight) >= 2 * workers:
+                collect()
+        while in_flight:
+            collect()
+        flush()
+    return report
+
+
+if __name__ == "__main__":
+    # Run nightly, e.g. from cron: MONGODB_URI=... GEMINI_API_KEY=... python quest_refresh.py
+    if len(sys.argv) > 2 or sys.argv[1:] not in ([], ['--restart']):
+        print("Usage: MONGODB_URI=... python quest_refresh.py [--restart]")
+        sys.exit(1)
+    # Only the stores and model; importing app would also start its gamification journal
+    from services import ai_quests, db, gemini, quest_refresh_inputs, users
+
+    if sys.argv[1:] == ['--restart']:
+        db['job_checkpoints'].delete_one({'_id': CHECKPOINT_ID})
+
+    def show(report):
+        print(f"\r{report['scanned']} scanned, {report['refreshed']} refreshed, {report['skipped']} skipped, "
+              f"{report['failed']} failed, {report['users_per_second']:.1f} users/s", end='', flush=True)
+
+    report = refresh_stale_quests(
+        users,
+        quest_refresh_inputs,
+        lambda inputs: ai_quests(*inputs),
+        checkpoints=db['job_checkpoints'],
+        workers=int(os.getenv('QUEST_REFRESH_WORKERS', '4')),
+        rate=float(os.getenv('QUEST_REFRESH_RATE', '2')),
+        batch_size=int(os.getenv('QUEST_REFRESH_BATCH', '100')),
+        progress=show,
+        # Stop rather than fail every remaining user while Gemini is down
+        stop=lambda: gemini.stats()['state'] == 'open'
+    )
+    print()
+    if report['stopped']:
+        print("Stopped early: the Gemini circuit breaker is open. Run again once the model is reachable")
+    print(f"{'Resumed' if report['resumed'] else 'Ran'} quest refresh: {report['refreshed']} users refreshed, "
+          f"{report['skipped']} without transactions, {report['failed']} failed, {report['conflicts']} "
+          f"refreshed by the app meanwhile, in {report['seconds']:.1f}s ({report['users_per_second']:.1f} users/s)")
+    sys.exit(1 if report['failed'] or report['stopped'] else 0)
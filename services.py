@@ -0,0 +1,291 @@
+# Connections, stores and insight generation shared by the web app and batch jobs.
+# Importing this module only sets up clients and caches: it starts no threads and
+# loads no gamification state, so `python quest_refresh.py` can run it next to the
+# web server without touching the server's journal or characters
+import json
+import os
+import time
+from datetime import date
+
+import certifi
+import google.generativeai as genai
+from pymongo import MongoClient
+
+from insight_cache import InsightCache, insight_key
+from insight_prompt import PromptBuilder, monthly_periods, recurring_merchants
+from model_guard import CircuitBreaker, CircuitOpenError, GuardedModel
+from transaction_frame import TransactionFrame
+from transaction_rollups import TransactionRollups
+from transaction_store import TransactionStore
+
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+model = genai.GenerativeModel(os.getenv('GEMINI_MODEL', 'gemini-pro'))
+# Every Gemini call gets a deadline, and after GEMINI_BREAKER_FAILURES failed or
+# slow calls in a row the breaker sends requests straight to the fallback
+# insights for GEMINI_BREAKER_RESET seconds before trying the model again
+gemini = GuardedModel(
+    model,
+    timeout=float(os.getenv('GEMINI_TIMEOUT', '10')),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', '5')),
+        reset_seconds=float(os.getenv('GEMINI_BREAKER_RESET', '30')),
+        slow_call_seconds=float(os.getenv('GEMINI_SLOW_CALL', '5'))
+    ),
+    max_concurrent=int(os.getenv('GEMINI_MAX_CONCURRENT', '8'))
+)
+# Generated insights keyed by a hash of the summarized inputs, so an unchanged
+# financial picture is answered without another model call. INSIGHT_CACHE_PATH=''
+# keeps the cache in memory only
+insight_cache = InsightCache(
+    path=os.getenv('INSIGHT_CACHE_PATH', 'insight_cache.db') or None,
+    ttl=float(os.getenv('INSIGHT_CACHE_TTL', str(24 * 3600))),
+    max_rows=int(os.getenv('INSIGHT_CACHE_SIZE', '10000'))
+)
+# Bump when the prompt changes so insights cached from the old prompt are not reused
+INSIGHT_PROMPT_VERSION = 2
+# The insight prompt is held to INSIGHT_PROMPT_TOKENS (estimated) whatever the history
+# length; trends and recurring merchants are read from the last INSIGHT_HISTORY_MONTHS
+prompt_builder = PromptBuilder(budget=int(os.getenv('INSIGHT_PROMPT_TOKENS', '400')))
+INSIGHT_HISTORY_MONTHS = int(os.getenv('INSIGHT_HISTORY_MONTHS', '6'))
+
+# MongoDB Atlas connection
+client = MongoClient(os.getenv('MONGODB_URI'), 
+                    tls=True,
+                    tlsAllowInvalidCertificates=False,
+                    tlsCAFile=certifi.where())
+db = client['finance_app']
+users = db['users']  # Store user authentication data
+user_data = db['userData']  # Store user financial data
+
+# One document per transaction, deduplicated on insert; run `python transaction_store.py migrate`
+# to move transactions still embedded in userData documents, then `python transaction_store.py
+# dedupe` to fingerprint them. Per-day/month totals are kept up to date on every write;
+# `python transaction_rollups.py` rebuilds them
+transaction_rollups = TransactionRollups(db['transaction_rollups'])
+transaction_store = TransactionStore(db['transactions'], rollups=transaction_rollups)
+
+
+def build_transaction_summary(transactions, totals=None, history=None):
+    """Summarize transactions into the totals, trends and recent list the insight prompt uses.
+
+    `totals` is a precomputed summary (TransactionRollups.summary) and
+    `history` the (months, recurring merchants) pair from insight_history;
+    when they are given, `transactions` only needs the most recent few,
+    oldest first. Otherwise both are computed from `transactions`.
+    """
+    if totals is None:
+        totals = TransactionFrame.from_transactions(transactions).summary()
+    if history is None:
+        history = (
+            monthly_periods(transactions, until=date.today().strftime('%Y-%m')),
+            recurring_merchants(transactions)
+        )
+    transaction_summary = {
+        'total_spent': totals['total_expenses'],
+        'total_income': totals['total_income'],
+        'category_spending': dict(totals['category_spending']),
+        'months': history[0],
+        'recurring': history[1],
+        'transactions': []
+    }
+    
+    # Only the latest few transactions go into the prompt
+    for transaction in transactions[-5:]:
+        transaction_summary['transactions'].append({
+            'date': transaction['date'],
+            'amount': float(transaction['amount']),
+            'category': transaction.get('category', ['Uncategorized'])[0],
+            'name': transaction.get('name', '')
+        })
+    return transaction_summary
+
+def insight_history(user_id):
+    """Monthly rollups and recurring merchants over the last INSIGHT_HISTORY_MONTHS complete
+    months, for build_transaction_summary"""
+    this_month = date.today().replace(day=1)
+    months_back = this_month.year * 12 + this_month.month - 1 - INSIGHT_HISTORY_MONTHS
+    start = date(months_back // 12, months_back % 12 + 1, 1)
+    months = transaction_rollups.periods(user_id, 'month', start=start, end=this_month)
+    recurring = recurring_merchants(transaction_store.find(
+        user_id, since=start, until=this_month, projection={'_id': 0, 'date': 1, 'amount': 1, 'name': 1}
+    ))
+    return months, recurring
+
+def has_spending_data(transaction_summary):
+    return bool(transaction_summary['transactions']) and (
+        transaction_summary['total_spent'] != 0 or transaction_summary['total_income'] != 0
+    )
+
+def default_insights(savings_goal):
+    """Starter quests for users with no transactions to analyze yet"""
+    return {
+        "time_estimate": "Unable to calculate time estimate. Please add some transactions first.",
+        "quests": [
+            {
+                "title": "Add Your Transactions",
+                "progress": 0,
+                "description": "Start by adding your daily transactions to get personalized savings goals"
+            },
+            {
+                "title": "Set a Savings Goal",
+                "progress": 0,
+                "description": f"You've set a goal to save ${savings_goal}. Let's work towards it!"
+            },
+            {
+                "title": "Track Your Spending",
+                "progress": 0,
+                "description": "Record your expenses for better financial insights"
+            }
+        ]
+    }
+
+def generate_ai_insights(transaction_summary, savings_goal):
+    """Ask Gemini for insights; returns None if the model fails, times out, is
+    short-circuited by the breaker, or its answer is unusable"""
+    # A compact, fixed-size feature summary rather than the raw history
+    prompt, _ = prompt_builder.build(transaction_summary, savings_goal)  # Token estimates go to /metrics
+    
+    # Identical features produce the same prompt; reuse the answer generated for it
+    cache_key = insight_key({'version': INSIGHT_PROMPT_VERSION, 'prompt': prompt})
+    cached = insight_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Get AI-generated insights
+    started = time.perf_counter()
+    try:
+        response = gemini.generate_content(prompt)
+        insights = json.loads(response.text)
+    except CircuitOpenError:
+        # The model is known to be down; don't log once per request
+        return None
+    except Exception as e:
+        print(f"Error generating AI insights: {str(e)}")
+        return None
+    if not isinstance(insights, dict) or not isinstance(insights.get('quests'), list):
+        print("Error generating AI insights: response has no quests list")
+        return None
+    insight_cache.put(cache_key, insights, latency=time.perf_counter() - started)
+    return insights
+
+def analyze_transactions(transactions, savings_goal, totals=None, history=None):
+    """Analyze transactions and generate personalized daily quests using Gemini.
+
+    Takes the same arguments as build_transaction_summary. Falls back to
+    generate_fallback_insights when the model is unavailable.
+    """
+    # Convert transactions to a format suitable for Gemini
+    transaction_summary = {
+        'total_spent': 0,
+        'total_income': 0,
+        'category_spending': {},
+        'transactions': []
+    }
+    try:
+        transaction_summary = build_transaction_summary(transactions, totals, history)
+        
+        # If we have no transactions or spending data, return early with default values
+        if not has_spending_data(transaction_summary):
+            return default_insights(savings_goal)
+        
+        # Fallback to traditional analysis if the AI response is missing or invalid
+        return generate_ai_insights(transaction_summary, savings_goal) or generate_fallback_insights(
+            transaction_summary, savings_goal
+        )
+    except Exception as e:
+        print(f"Error in analyze_transactions: {str(e)}")
+        return generate_fallback_insights(transaction_summary, savings_goal)
+
+def ai_quests(transactions, savings_goal, totals=None, history=None):
+    """analyze_transactions without the rule-based fallback, for the nightly refresh: the
+    model's quests (or the starter ones without spending data), or None if the model is
+    unavailable so the user is left for a later run"""
+    transaction_summary = build_transaction_summary(transactions, totals, history)
+    if not has_spending_data(transaction_summary):
+        return default_insights(savings_goal)['quests']
+    insights = generate_ai_insights(transaction_summary, savings_goal)
+    return insights['quests'] if insights else None
+
+def generate_fallback_insights(transaction_summary, savings_goal):
+    """Generate insights using traditional analysis when AI is unavailable"""
+    monthly_expenses = transaction_summary['total_spent']
+    monthly_income = transaction_summary['total_income']
+    
+    # Calculate potential savings (20% from income and 20% from expense reduction)
+    income_savings = monthly_income * 0.20
+    expense_savings = monthly_expenses * 0.20
+    total_potential_savings = income_savings + expense_savings
+    
+    # Split savings between goal and emergency fund
+    goal_savings = total_potential_savings * 0.5
+    emergency_savings = total_potential_savings * 0.5
+    
+    # Calculate time to reach goal
+    if goal_savings > 0:
+        months_to_goal = savings_goal / goal_savings
+        years = int(months_to_goal / 12)
+        remaining_months = int(months_to_goal % 12)
+        
+        time_parts = []
+        if years > 0:
+            time_parts.append(f"{years} year{'s' if years > 1 else ''}")
+        if remaining_months > 0:
+            time_parts.append(f"{remaining_months} month{'s' if remaining_months > 1 else ''}")
+        
+        time_str = " and ".join(time_parts)
+        time_estimate = (
+            f"Based on your current income of ${monthly_income:.2f}/month and expenses of ${monthly_expenses:.2f}/month, "
+            f"saving 20% of income (${income_savings:.2f}/month) and reducing expenses by 20% (${expense_savings:.2f}/month) "
+            f"would take {time_str} to reach your goal of ${savings_goal:.2f}. "
+            f"You'll also build an emergency fund of ${emergency_savings:.2f}/month."
+        )
+    else:
+        time_estimate = "Unable to calculate time estimate. Please add your regular income and expenses."
+    
+    # Sort categories by spending
+    sorted_categories = sorted(transaction_summary['category_spending'].items(), key=lambda x: x[1], reverse=True)
+    
+    # Create quests based on top spending categories
+    quests = []
+    
+    # Add income-based quest
+    daily_income_savings = income_savings / 30
+    quests.append({
+        "title": "Income Savings",
+        "progress": 0,
+        "description": f"Save ${daily_income_savings:.2f} from today's income (20% of income)"
+    })
+    
+    # Add expense reduction quests
+    for category, amount in sorted_categories[:2]:
+        daily_category_savings = (amount * 0.2) / 30
+        quests.append({
+            "title": f"Save on {category}",
+            "progress": 0,
+            "description": f"Target saving ${daily_category_savings:.2f} today on {category}"
+        })
+    
+    # Add generic quest if needed
+    while len(quests) < 3:
+        quests.append({
+            "title": "Track Your Spending",
+            "progress": 0,
+            "description": "Record all your expenses today for better insights"
+        })
+    
+    return {
+        "time_estimate": time_estimate,
+        "quests": quests[:3]
+    }
+
+def quest_refresh_inputs(user):
+    """The arguments for analyze_transactions or ai_quests when refreshing a user's quests, or None
+    if the user has no transactions yet; `user` needs _id and savings_goal"""
+    user_id = str(user['_id'])
+    if not transaction_store.has_transactions(user_id):
+        return None
+    
+    # Get the rollup totals, prompt history and latest transactions
+    recent_transactions = list(transaction_store.find(user_id, limit=5))[::-1]
+    return (recent_transactions, user.get('savings_goal', 1000), transaction_rollups.summary(user_id),
+            insight_history(user_id))
@@ -0,0 +1,86 @@
+import weakref
+
+import pytest
+
+from gamification import Character, CharacterClass, CharacterLevel, GamificationSystem, Mission, MissionType
+
+
+def _record(user_id, **overrides):
+    record = Character(user_id, f"Piggy {user_id}", CharacterClass.INVESTOR).to_dict()
+    record['coins'] = 40
+    record['level'] = 3
+    record['active_missions'] = [Mission("Save $10", "Save $10 today", MissionType.WEEKLY, 20, 10).to_dict()]
+    record.update(overrides)
+    return record
+
+
+def test_from_dicts_round_trips_and_comes_back_clean():
+    records = [_record("u1"), _record("u2", current_background="sunset")]
+
+    characters = Character.from_dicts(records)
+
+    assert [c.to_dict() for c in characters] == records
+    first = characters[0]
+    assert first.character_class is CharacterClass.INVESTOR
+    assert first.level is CharacterLevel.INTERMEDIATE
+    assert first.active_missions[0].mission_type is MissionType.WEEKLY
+    assert not first.is_dirty
+    assert weakref.ref(first)() is first
+
+    # Mission edits still reach the owning character after a bulk load
+    first.active_missions[0].is_completed = True
+    assert first.is_dirty
+
+
+def test_from_dicts_rejects_unknown_enum_values():
+    with pytest.raises(ValueError, match="Invalid character class"):
+        Character.from_dicts([_record("u1", character_class="Gambler")])
+    with pytest.raises(ValueError, match="Invalid mission type"):
+        Mission.from_dict(dict(_record("u1")['active_missions'][0], mission_type="Yearly"))
+
+
+def test_bulk_loaded_characters_are_tracked():
+    gamification = GamificationSystem()
+    gamification._load_characters({'characters': {"u1": _record("u1"), "u2": _record("u2")}})
+
+    assert gamification.dirty_characters() == set()
+    gamification.get_character("u2").coins += 1
+    assert gamification.dirty_characters() == {"u2"}
+
+    # Slotted characters do not grow ad-hoc attributes
+    with pytest.raises(AttributeError):
+        gamification.get_character("u1").nickname = "Oink"
+
+
+@pytest.mark.parametrize("backend", ["journal", "sqlite", "sharded"])
+def test_missions_survive_an_eager_reload_from_each_store(tmp_path, backend):
+    from gamification_journal import CharacterJournal
+    from gamification_shards import ShardedStateStore
+    from gamification_sqlite import SQLiteStateStore
+    stores = {
+        'journal': lambda: CharacterJournal(str(tmp_path / "state.json")),
+        'sqlite': lambda: SQLiteStateStore(str(tmp_path / "state.db")),
+        'sharded': lambda: ShardedStateStore(str(tmp_path / "shards"), shard_count=4),
+    }
+    gamification = GamificationSystem(store=stores[backend]())
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.assign_missions("u1")
+    gamification.save_state("unused.json", "u1")
+
+    reloaded = GamificationSystem(store=stores[backend]())
+    reloaded.load_state("unused.json")
+    assert len(reloaded.get_character("u1").active_missions) == 3
+    reloaded.get_character("u1").coins += 1
+    reloaded.save_state("unused.json", "u1")
+    assert len(stores[backend]().load_all()["u1"]['active_missions']) == 3
+
+
+def test_legacy_mission_map_still_replaces_record_missions():
+    gamification = GamificationSystem()
+    mission = _record("u1")['active_missions'][0]
+    gamification._load_characters({
+        'characters': {"u1": _record("u1", active_missions=[]), "u2": _record("u2")},
+        'active_missions': {"u1": [mission]}
+    })
+    assert [m.title for m in gamification.get_character("u1").active_missions] == ["Save $10"]
+    assert gamification.get_character("u2").active_missions == []
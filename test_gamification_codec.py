@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_codec import (
+    CodecError, binary_to_json, decode_record, encode_record, iter_characters, iter_snapshot,
+    json_to_binary, write_snapshot,
+)
+from gamification_journal import CharacterJournal
+
+
+def sample_system():
+    gamification = GamificationSystem()
+    for i, character_class in enumerate(CharacterClass):
+        character = gamification.create_character(f"u{i}", f"Name{i}", character_class)
+        character.coins = 10 * i
+        gamification.assign_missions(f"u{i}")
+    gamification.get_character("u0").active_missions[0].is_completed = True
+    gamification.get_character("u1").current_background = "sunset"
+    return gamification
+
+
+def test_record_round_trip_is_exact():
+    for user_id, char_data in iter_characters(sample_system()):
+        record = encode_record(user_id, char_data)
+        assert record[4] == 0  # packed, not the JSON fallback
+        assert decode_record(record[4:]) == (user_id, char_data)
+
+
+def test_records_from_before_backgrounds_decode_without_one():
+    char_data = sample_system().get_character("u0").to_dict()
+    payload = encode_record("u0", char_data)[4:]
+    # Older records end after the missions, without the trailing JSON background ("null" plus its length)
+    assert decode_record(payload[:-8]) == ("u0", char_data)
+
+
+def test_free_form_missions_fall_back_to_json():
+    char_data = dict(sample_system().get_character("u1").to_dict())
+    char_data['active_missions'] = [{'id': 'x', 'title': 'Quest', 'mission_type': {'name': 'Daily Quest'}}]
+    record = encode_record("u1", char_data)
+    assert record[4] == 1
+    assert decode_record(record[4:]) == ("u1", char_data)
+
+
+def test_snapshot_streams_and_converts_both_ways(tmp_path):
+    gamification = sample_system()
+    json_path = str(tmp_path / "state.json")
+    gamification.save_state(json_path)
+
+    binary_path = str(tmp_path / "state.bin")
+    assert json_to_binary(json_path, binary_path) == len(gamification.characters)
+    back_path = str(tmp_path / "back.json")
+    binary_to_json(binary_path, back_path)
+    with open(json_path) as f, open(back_path) as g:
+        assert json.load(f) == json.load(g)
+
+    write_snapshot(binary_path, iter_characters(gamification))
+    assert dict(iter_snapshot(binary_path)) == dict(iter_characters(gamification))
+
+
+def test_journal_compacts_into_binary_snapshot(tmp_path):
+    snapshot = str(tmp_path / "state.bin")
+    journal = CharacterJournal(snapshot, snapshot_format='binary')
+    gamification = GamificationSystem(store=journal)
+    for i in range(3):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    gamification.save_state(snapshot)
+    journal.compact()
+
+    gamification.get_character("u1").coins = 9
+    gamification.create_character("u3", "Name3", CharacterClass.EARNER)
+    gamification.save_state(snapshot)
+    journal.compact()
+
+    characters = dict(iter_snapshot(snapshot))
+    assert sorted(characters) == ["u0", "u1", "u2", "u3"]
+    assert characters["u1"]["coins"] == 9
+    assert journal.load_all() == characters
+
+
+def test_journal_does_not_compact_over_a_damaged_binary_snapshot(tmp_path):
+    snapshot = str(tmp_path / "state.bin")
+    journal = CharacterJournal(snapshot, snapshot_format='binary')
+    gamification = GamificationSystem(store=journal)
+    for i in range(5):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    gamification.save_state(snapshot)
+    journal.compact()
+    with open(snapshot, "r+b") as f:
+        f.truncate(os.path.getsize(snapshot) - 3)  # Cut into the last record
+    damaged = open(snapshot, "rb").read()
+
+    gamification.get_character("u0").coins = 7
+    gamification.save_state(snapshot, "u0")
+    with pytest.raises(CodecError):
+        journal.compact()
+    assert open(snapshot, "rb").read() == damaged
+    assert os.path.exists(journal.compacting_path) and not os.path.exists(snapshot + ".tmp")
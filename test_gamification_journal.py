@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_journal import CharacterJournal
+
+
+def test_journal_replays_snapshot_and_log(tmp_path):
+    snapshot = str(tmp_path / "state.json")
+    gamification = GamificationSystem(store=CharacterJournal(snapshot))
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.create_character("u2", "Two", CharacterClass.EARNER)
+    gamification.save_state(snapshot)
+    gamification.store.compact()
+
+    gamification.get_character("u1").coins = 42
+    gamification.save_state(snapshot, "u1")
+    gamification.store.close()
+
+    # Only the changed character went to the log
+    with open(snapshot + ".log") as f:
+        assert len(f.readlines()) == 1
+
+    reloaded = GamificationSystem(store=CharacterJournal(snapshot))
+    reloaded.load_state(snapshot)
+    assert reloaded.get_character("u1").coins == 42
+    assert reloaded.get_character("u2").name == "Two"
+
+
+def test_compact_folds_log_into_snapshot(tmp_path):
+    snapshot = str(tmp_path / "state.json")
+    journal = CharacterJournal(snapshot)
+    gamification = GamificationSystem(store=journal)
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    for coins in range(5):
+        gamification.get_character("u1").coins = coins
+        gamification.save_state(snapshot, "u1")
+
+    journal.compact()
+    assert not os.path.exists(journal.log_path)
+    assert journal.replay()['characters']['u1']['coins'] == 4
+
+    # Appends after compaction land in a fresh log
+    gamification.get_character("u1").coins = 99
+    gamification.save_state(snapshot, "u1")
+    journal.close()
+    assert journal.replay()['characters']['u1']['coins'] == 99
+
+
+def test_torn_final_record_is_skipped(tmp_path):
+    snapshot = str(tmp_path / "state.json")
+    journal = CharacterJournal(snapshot)
+    gamification = GamificationSystem(store=journal)
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.save_state(snapshot, "u1")
+    journal.close()
+    with open(journal.log_path, "a") as f:
+        f.write('{"user_id": "u2", "charac')
+
+    assert list(journal.replay()['characters']) == ["u1"]
+
+
+def test_compaction_leaves_an_unreadable_snapshot_alone(tmp_path):
+    snapshot = str(tmp_path / "state.json")
+    journal = CharacterJournal(snapshot)
+    gamification = GamificationSystem(store=journal)
+    for i in range(5):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    gamification.save_state(snapshot)
+    journal.compact()
+    with open(snapshot, "a") as f:
+        f.write("x")
+    damaged = open(snapshot).read()
+
+    gamification.get_character("u0").coins = 7
+    gamification.save_state(snapshot, "u0")
+    with pytest.raises(ValueError):
+        journal.compact()
+    # Neither the snapshot nor the rotated log is thrown away
+    assert open(snapshot).read() == damaged
+    assert os.path.exists(journal.compacting_path)
@@ -0,0 +1,76 @@
+import gc
+
+import pytest
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_journal import CharacterJournal
+from gamification_sqlite import SQLiteStateStore
+
+
+def populate(path, count):
+    gamification = GamificationSystem(store=SQLiteStateStore(path))
+    for i in range(count):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    gamification.save_state("unused.json")
+
+
+def test_load_state_is_lazy_and_faults_in_on_access(tmp_path):
+    path = str(tmp_path / "state.db")
+    populate(path, 20)
+
+    gamification = GamificationSystem(store=SQLiteStateStore(path), cache_size=5)
+    gamification.load_state("unused.json")
+    assert len(gamification.characters) == 0
+
+    assert gamification.get_character("u3").name == "Name3"
+    assert gamification.get_character("missing") is None
+    assert list(gamification.characters) == ["u3"]
+
+
+def test_residency_is_bounded_and_evictions_write_back(tmp_path):
+    path = str(tmp_path / "state.db")
+    populate(path, 20)
+    store = SQLiteStateStore(path)
+    gamification = GamificationSystem(store=store, cache_size=3)
+
+    gamification.get_character("u0").coins = 77
+    for i in range(1, 10):
+        gamification.get_character(f"u{i}")
+    assert len(gamification.characters) == 3
+    assert "u0" not in gamification.characters
+    assert store.load("u0")["coins"] == 77
+
+    # Recently used characters stay resident
+    gamification.get_character("u7")
+    gamification.get_character("u10")
+    assert "u7" in gamification.characters
+
+
+def test_evicted_character_still_in_use_is_not_duplicated(tmp_path):
+    path = str(tmp_path / "state.db")
+    populate(path, 5)
+    gamification = GamificationSystem(store=SQLiteStateStore(path), cache_size=1)
+
+    held = gamification.get_character("u0")
+    gamification.get_character("u1")
+    assert "u0" not in gamification.characters
+    held.coins = 5
+    assert gamification.get_character("u0") is held
+
+    gamification.save_state("unused.json")
+    del held
+    gc.collect()
+    assert SQLiteStateStore(path).load("u0")["coins"] == 5
+
+
+def test_create_character_checks_the_store(tmp_path):
+    path = str(tmp_path / "state.db")
+    populate(path, 2)
+    gamification = GamificationSystem(store=SQLiteStateStore(path), cache_size=10)
+    with pytest.raises(ValueError):
+        gamification.create_character("u1", "Again", CharacterClass.SAVER)
+
+
+def test_lazy_mode_requires_per_user_load(tmp_path):
+    with pytest.raises(ValueError):
+        GamificationSystem(store=CharacterJournal(str(tmp_path / "state.json")), cache_size=10)
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_mongo import MongoCharacterStore
+
+
+@pytest.fixture
+def store(db):
+    return MongoCharacterStore(db['characters'])
+
+
+def make_character(store, user_id, coins=0):
+    gamification = GamificationSystem(store=store, shared=True)
+    gamification.create_character(user_id, "Piggy", CharacterClass.SAVER)
+    gamification.update_character(user_id, lambda c: setattr(c, 'coins', coins))
+    return gamification
+
+
+def test_concurrent_purchases_cannot_overdraw(store):
+    make_character(store, "u1", coins=100)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(lambda i: store.purchase("u1", f"item{i}", 30)[0], range(8)))
+
+    assert outcomes.count('purchased') == 3
+    assert outcomes.count('insufficient') == 5
+    record = store.load("u1")
+    assert record['coins'] == 10
+    assert len(record['inventory']) == 3
+    assert store.purchase("u1", record['inventory'][0], 1) == ('owned', 10)
+    assert store.purchase("nobody", "item0", 1) == ('missing', None)
+
+
+def test_mission_reward_is_paid_once(store):
+    make_character(store, "u1")
+    assert store.push_missions("u1", [{'id': 'q1', 'description': 'Save $5', 'reward_coins': 5, 'is_completed': False}])
+    assert not store.push_missions("u1", [{'id': 'q2'}])
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        outcomes = list(pool.map(lambda _: store.complete_mission("u1", 'q1')[0], range(4)))
+
+    assert outcomes.count('ok') == 1
+    assert outcomes.count('already_completed') == 3
+    assert store.load("u1")['coins'] == 5
+    assert store.complete_mission("u1", 'q9')[0] == 'missing'
+
+
+def test_atomic_updates_invalidate_cached_copies(store):
+    make_character(store, "u1", coins=50)
+    other = GamificationSystem(store=store, shared=True, refresh_interval=0)
+    other.get_character("u1")
+
+    store.purchase("u1", "hat", 20)
+
+    # The other process's stale full write is rejected and retried on the fresh copy
+    other.update_character("u1", lambda c: setattr(c, 'streak', 3))
+    record = store.load("u1")
+    assert record['coins'] == 30
+    assert record['inventory'] == ["hat"]
+    assert record['streak'] == 3
+
+
+def test_missions_survive_an_eager_reload(store):
+    make_character(store, "u1")
+    store.push_missions("u1", [{'id': 'q1', 'description': 'Save $5', 'reward_coins': 5, 'is_completed': False}])
+
+    # Eager startup load, as with GAMIFICATION_CACHE_SIZE unset
+    reloaded = GamificationSystem(store=store)
+    reloaded.load_state("unused.json")
+    assert [m['id'] for m in reloaded.get_character("u1").active_missions] == ['q1']
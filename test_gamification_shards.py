@@ -0,0 +1,74 @@
+import os
+
+from gamification import GamificationSystem, CharacterClass, Mission, MissionType
+from gamification_shards import ShardedStateStore
+
+
+def make_system(tmp_path, shard_count=8):
+    store = ShardedStateStore(str(tmp_path / "shards"), shard_count=shard_count)
+    return GamificationSystem(store=store), store
+
+
+def test_only_changed_characters_are_serialized(tmp_path):
+    gamification, _ = make_system(tmp_path)
+    for i in range(5):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    assert len(gamification.dirty_characters()) == 5
+    gamification.save_state("unused.json")
+    assert gamification.dirty_characters() == set()
+
+    gamification.get_character("u3").coins += 10
+    assert gamification.dirty_characters() == {"u3"}
+
+
+def test_in_place_list_and_mission_changes_mark_dirty(tmp_path):
+    gamification, _ = make_system(tmp_path)
+    character = gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.assign_missions("u1")
+    gamification.save_state("unused.json")
+
+    character.inventory.append("forest_bg")
+    assert gamification.dirty_characters() == {"u1"}
+    gamification.save_state("unused.json")
+
+    character.active_missions[0].is_completed = True
+    assert gamification.dirty_characters() == {"u1"}
+    gamification.save_state("unused.json")
+
+    character.active_missions = [Mission("New", "Quest", MissionType.DAILY, 5, 5)]
+    gamification.save_state("unused.json")
+    character.active_missions[0].reward_coins = 7
+    assert gamification.dirty_characters() == {"u1"}
+
+
+def test_untouched_shards_and_entries_are_left_alone(tmp_path):
+    gamification, store = make_system(tmp_path, shard_count=4)
+    for i in range(40):
+        gamification.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    gamification.save_state("unused.json")
+
+    before = {}
+    for name in os.listdir(store.directory):
+        with open(os.path.join(store.directory, name), "rb") as f:
+            before[name] = f.read()
+
+    gamification.get_character("u7").coins = 500
+    gamification.save_state("unused.json")
+
+    changed_shard = os.path.basename(store.shard_path("u7"))
+    for name, content in before.items():
+        with open(os.path.join(store.directory, name), "rb") as f:
+            after = f.read()
+        if name != changed_shard:
+            assert after == content
+        else:
+            old_lines = [l for l in content.splitlines() if not l.startswith(b'"u7"')]
+            new_lines = [l for l in after.splitlines() if not l.startswith(b'"u7"')]
+            assert old_lines == new_lines
+
+    reloaded = GamificationSystem(store=ShardedStateStore(store.directory, shard_count=4))
+    reloaded.load_state("unused.json")
+    assert len(reloaded.characters) == 40
+    assert reloaded.get_character("u7").coins == 500
+    assert store.load("u7")["coins"] == 500
+    assert reloaded.dirty_characters() == set()
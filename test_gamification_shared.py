@@ -0,0 +1,105 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_sqlite import SQLiteStateStore
+
+
+def make_worker(path, refresh_interval=60):
+    return GamificationSystem(store=SQLiteStateStore(path), shared=True, refresh_interval=refresh_interval)
+
+
+def add_coins(amount):
+    def mutate(character):
+        character.coins += amount
+    return mutate
+
+
+def test_stale_update_is_rejected_and_retried(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = make_worker(path)
+    second = make_worker(path)
+    first.create_character("u1", "One", CharacterClass.SAVER)
+
+    # Both workers now hold a cached copy
+    assert second.get_character("u1").coins == 0
+    first.update_character("u1", add_coins(5))
+
+    attempts = []
+
+    def mutate(character):
+        attempts.append(character.coins)
+        character.coins += 3
+
+    second.update_character("u1", mutate)
+    assert attempts == [0, 5]
+    assert second.stale_writes == 1
+    assert SQLiteStateStore(path).load("u1")["coins"] == 8
+
+
+def test_refresh_drops_characters_changed_elsewhere(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = make_worker(path)
+    second = make_worker(path, refresh_interval=0)
+    first.create_character("u1", "One", CharacterClass.SAVER)
+    assert second.get_character("u1").coins == 0
+
+    first.update_character("u1", add_coins(4))
+    assert second.get_character("u1").coins == 4
+
+
+def test_concurrent_create_is_rejected(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = make_worker(path)
+    second = make_worker(path)
+    assert second.get_character("u1") is None
+    first.create_character("u1", "One", CharacterClass.SAVER)
+    with pytest.raises(ValueError):
+        second.create_character("u1", "Other", CharacterClass.SAVER)
+    assert second.get_character("u1").name == "One"
+
+
+def _increment_many(path, count):
+    worker = make_worker(path)
+    for _ in range(count):
+        worker.update_character("u1", add_coins(1), retries=100)
+
+
+def test_no_lost_updates_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    creator = make_worker(path)
+    creator.create_character("u1", "One", CharacterClass.SAVER)
+    # A SQLite connection must not be carried across fork: a child closing its
+    # inherited copy drops the file locks its own connection holds
+    creator.store.close()
+
+    processes = [multiprocessing.Process(target=_increment_many, args=(path, 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    assert SQLiteStateStore(path).load("u1")["coins"] == 100
+
+
+def test_store_write_does_not_hold_the_cache_lock(tmp_path):
+    path = str(tmp_path / "state.db")
+    worker = make_worker(path)
+    worker.create_character("u1", "One", CharacterClass.SAVER)
+    worker.create_character("u2", "Two", CharacterClass.SAVER)
+    save_versioned = worker.store.save_versioned
+    reads = []
+
+    def slow_save(changes):
+        # Another request reading a different user is not blocked behind this write
+        reader = threading.Thread(target=lambda: reads.append(worker.get_character("u2").name))
+        reader.start()
+        reader.join(timeout=5)
+        return save_versioned(changes)
+
+    worker.store.save_versioned = slow_save
+    worker.update_character("u1", add_coins(2))
+    assert reads == ["Two"]
+    assert SQLiteStateStore(path).load("u1")["coins"] == 2
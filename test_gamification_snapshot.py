@@ -0,0 +1,70 @@
+import json
+
+from gamification import GamificationSystem, CharacterClass, Mission, MissionType
+from gamification_codec import iter_snapshot
+
+
+def make_system(count=3):
+    gamification = GamificationSystem()
+    for i in range(count):
+        gamification.create_character(f"u{i}", f"Piggy {i}", CharacterClass.SAVER)
+    return gamification
+
+
+def test_snapshot_is_written_in_the_state_file_layout(tmp_path):
+    path = str(tmp_path / "state.json")
+    gamification = make_system()
+    gamification.enable_snapshots(path)
+    gamification.get_character("u1").coins = 12
+    gamification.save_state(path, "u1")
+    gamification.flush()
+
+    with open(path) as f:
+        assert json.load(f)["characters"]["u1"]["coins"] == 12
+    assert not (tmp_path / "state.json.tmp").exists()
+
+    restored = GamificationSystem()
+    restored.load_state(path)
+    assert sorted(restored.characters) == ["u0", "u1", "u2"]
+
+    stats = gamification.snapshots.stats()
+    assert stats["snapshots"] == 1
+    assert stats["last_records"] == 3
+    assert stats["pending"] is False
+    assert stats["last_stall_ms"] <= stats["last_duration_ms"]
+    gamification.snapshots.close()
+
+
+def test_view_is_point_in_time_and_reuses_unchanged_records(tmp_path):
+    gamification = make_system()
+    gamification._snapshot_stale = set(gamification.characters)
+    character = gamification.get_character("u0")
+    character.active_missions = [{'id': 'q1', 'is_completed': False}]
+
+    first = gamification.capture_view()
+    character.coins = 99
+    character.active_missions[0]['is_completed'] = True
+    gamification.save_state(str(tmp_path / "state.json"), "u0")
+    second = gamification.capture_view()
+
+    assert first["u0"]["coins"] == 0
+    assert first["u0"]["active_missions"][0]["is_completed"] is False
+    assert second["u0"]["coins"] == 99
+    assert second["u0"]["active_missions"][0]["is_completed"] is True
+    # Untouched characters keep the record object from the previous capture
+    assert second["u1"] is first["u1"]
+
+
+def test_binary_snapshot(tmp_path):
+    path = str(tmp_path / "state.bin")
+    gamification = make_system(2)
+    gamification.enable_snapshots(path, snapshot_format='binary')
+    gamification.get_character("u0").active_missions.append(
+        Mission("Save $10", "Save $10 today", MissionType.DAILY, 20, 10)
+    )
+    gamification.save_state(path, "u0")
+    gamification.snapshots.close()
+
+    records = dict(iter_snapshot(path))
+    assert records["u0"]["active_missions"][0]["title"] == "Save $10"
+    assert set(records) == {"u0", "u1"}
@@ -0,0 +1,73 @@
+import json
+import threading
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_sqlite import SQLiteStateStore, migrate_json_state
+
+
+def test_round_trip_with_missions(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    gamification = GamificationSystem(store=store)
+    character = gamification.create_character("u1", "One", CharacterClass.INVESTOR)
+    gamification.assign_missions("u1")
+    character.coins = 25
+    character.current_background = "sunset"
+    gamification.save_state("unused.json")
+
+    assert store.count() == 1
+    char_data = store.load("u1")
+    assert char_data["coins"] == 25
+    assert char_data["character_class"] == "Investor"
+    assert [m["title"] for m in char_data["active_missions"]] == [
+        m.title for m in character.active_missions
+    ]
+    assert store.load("missing") is None
+
+    reloaded = GamificationSystem(store=SQLiteStateStore(store.path))
+    reloaded.load_state("unused.json")
+    assert reloaded.get_character("u1").name == "One"
+    assert reloaded.get_character("u1").current_background == "sunset"
+
+
+def test_free_form_mission_dicts_survive(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    mission = {
+        'id': 'abc', 'title': 'Save on Food', 'description': 'Save $2.00 today',
+        'progress': 0, 'is_completed': False, 'mission_type': {'name': 'Daily Quest'},
+        'reward_exp': 5, 'reward_coins': 5,
+    }
+    store.save({"u1": {"user_id": "u1", "name": "One", "active_missions": [mission]}})
+    assert store.load("u1")["active_missions"] == [mission]
+
+    # Rewriting the character replaces its missions rather than appending
+    store.save({"u1": {"user_id": "u1", "name": "One", "active_missions": []}})
+    assert store.load("u1")["active_missions"] == []
+
+
+def test_readers_are_not_blocked_by_open_write(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    store.save({"u1": {"user_id": "u1", "name": "One", "coins": 1}})
+
+    writer = store._connection()
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE characters SET coins = 2 WHERE user_id = 'u1'")
+
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(store.load("u1")["coins"]))
+    reader.start()
+    reader.join(timeout=5)
+    writer.execute("COMMIT")
+    assert seen == [1]
+
+
+def test_migrate_json_state(tmp_path):
+    json_path = tmp_path / "gamification_state.json"
+    source = GamificationSystem()
+    for i in range(5):
+        source.create_character(f"u{i}", f"Name{i}", CharacterClass.SAVER)
+    source.save_state(str(json_path))
+
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    assert migrate_json_state(str(json_path), store, batch_size=2) == 5
+    with open(json_path) as f:
+        assert store.load_all() == json.load(f)['characters']
@@ -0,0 +1,60 @@
+import time
+
+from gamification import GamificationSystem, CharacterClass
+from gamification_journal import CharacterJournal
+
+
+def make_system(tmp_path, **kwargs):
+    snapshot = str(tmp_path / "state.json")
+    journal = CharacterJournal(snapshot)
+    gamification = GamificationSystem(store=journal)
+    gamification.enable_write_behind(**kwargs)
+    return gamification, journal, snapshot
+
+
+def test_save_returns_before_write_and_flush_persists(tmp_path):
+    gamification, journal, snapshot = make_system(tmp_path, flush_interval_ms=60000, max_pending=1000)
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.save_state(snapshot, "u1")
+    assert journal.load_all() == {}
+
+    gamification.flush()
+    assert journal.load_all()["u1"]["name"] == "One"
+    stats = gamification.write_behind.stats()
+    assert stats["flushes"] == 1
+    assert stats["pending"] == 0
+    gamification.write_behind.close()
+
+
+def test_burst_is_coalesced_by_max_pending(tmp_path):
+    gamification, journal, snapshot = make_system(tmp_path, flush_interval_ms=60000, max_pending=10)
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    for coins in range(30):
+        gamification.get_character("u1").coins = coins
+        gamification.save_state(snapshot, "u1")
+
+    deadline = time.monotonic() + 5
+    while gamification.write_behind.stats()["pending"] >= 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gamification.write_behind.close()
+
+    stats = gamification.write_behind.stats()
+    assert stats["save_requests"] == 30
+    assert stats["flushes"] <= 4
+    assert stats["coalescing_ratio"] >= 7
+    assert journal.load_all()["u1"]["coins"] == 29
+
+
+def test_interval_bounds_durability_lag(tmp_path):
+    gamification, journal, snapshot = make_system(tmp_path, flush_interval_ms=20, max_pending=1000)
+    gamification.create_character("u1", "One", CharacterClass.SAVER)
+    gamification.save_state(snapshot, "u1")
+
+    deadline = time.monotonic() + 5
+    while gamification.write_behind.stats()["flushes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = gamification.write_behind.stats()
+    assert stats["flushes"] == 1
+    assert stats["last_lag_ms"] >= 20
+    assert "u1" in journal.load_all()
+    gamification.write_behind.close()
@@ -0,0 +1,61 @@
+import time
+
+from insight_cache import InsightCache, insight_key
+
+INSIGHT = {'time_estimate': "3 months", 'quests': [{'title': "Cook at home", 'progress': 0, 'description': "..."}]}
+
+
+def test_key_ignores_summation_noise_and_key_order():
+    a = {'income': 0.1 + 0.2, 'categories': {'Food': 10.0, 'Travel': 5.0}, 'goal': 1000}
+    b = {'goal': 1000, 'categories': {'Travel': 5.0, 'Food': 10.0}, 'income': 0.3}
+    assert insight_key(a) == insight_key(b)
+    assert insight_key(a) != insight_key(dict(b, goal=1500))
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "insights.db")
+    cache = InsightCache(path, memory_size=1)
+    cache.put("k1", INSIGHT, latency=2.5)
+    cache.put("k2", INSIGHT, latency=1.0)
+
+    assert cache.get("k2") == INSIGHT  # Memory
+    assert cache.get("k1") == INSIGHT  # Evicted from memory, still on disk
+    assert cache.get("k3") is None
+
+    # Another process sharing the file sees the entries
+    other = InsightCache(path)
+    assert other.get("k1") == INSIGHT
+
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 1, 1)
+    assert stats['hit_rate'] == 2 / 3
+    assert stats['latency_saved'] == 3.5
+
+
+def test_entries_expire(tmp_path):
+    cache = InsightCache(str(tmp_path / "insights.db"), ttl=0.05)
+    cache.put("k1", INSIGHT)
+    assert cache.get("k1") == INSIGHT
+    time.sleep(0.1)
+    assert cache.get("k1") is None
+    assert cache.purge() == 1
+
+
+def test_disk_tier_keeps_most_recently_used_rows(tmp_path):
+    path = str(tmp_path / "insights.db")
+    cache = InsightCache(path, memory_size=1, max_rows=3)
+    for i in range(5):
+        cache.put(f"k{i}", {'n': i})
+        time.sleep(0.001)
+    cache.get("k0")  # Touch the oldest so it survives
+    assert cache.purge() == 2
+
+    fresh = InsightCache(path)
+    assert [fresh.get(f"k{i}") is not None for i in range(5)] == [True, False, False, True, True]
+
+
+def test_memory_only():
+    cache = InsightCache(path=None)
+    cache.put("k1", INSIGHT)
+    assert cache.get("k1") == INSIGHT
+    assert cache.purge() == 0
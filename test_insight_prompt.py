@@ -0,0 +1,83 @@
+from insight_prompt import (PromptBuilder, estimate_tokens, monthly_periods, recurring_merchants,
+                            trend_deltas)
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def history(months, categories_per_month=3):
+    transactions = []
+    for m in range(1, months + 1):
+        transactions.append({'date': f"2024-{m:02d}-01", 'name': "ACME PAYROLL", 'amount': 3000.0, 'category': ['Transfer']})
+        transactions.append({'date': f"2024-{m:02d}-03", 'name': f"NETFLIX.COM {m}", 'amount': -15.99, 'category': ['Service']})
+        transactions.append({'date': f"2024-{m:02d}-09", 'name': "Corner Grocer", 'amount': -100.0 * m, 'category': ['Food']})
+        for c in range(categories_per_month):
+            transactions.append({'date': f"2024-{m:02d}-20", 'name': f"Shop {LETTERS[m]}{LETTERS[c % 26]}", 'amount': -5.0,
+                                 'category': [f"Category {m * categories_per_month + c}"]})
+    return transactions
+
+
+def summary_of(transactions):
+    periods = monthly_periods(transactions)
+    categories = {}
+    for period in periods.values():
+        for category, spent in period['categories'].items():
+            categories[category] = categories.get(category, 0.0) + spent
+    return {
+        'total_income': sum(p['income'] for p in periods.values()),
+        'total_spent': sum(p['expense'] for p in periods.values()),
+        'category_spending': categories,
+        'months': periods,
+        'recurring': recurring_merchants(transactions),
+        'transactions': []
+    }
+
+
+def test_monthly_periods_and_recurring_merchants():
+    transactions = history(4)
+    periods = monthly_periods(transactions, until="2024-04")
+    assert list(periods) == ["2024-01", "2024-02", "2024-03"]
+    assert periods["2024-02"]['income'] == 3000.0
+    assert periods["2024-02"]['categories']['Food'] == 200.0
+
+    recurring = recurring_merchants(transactions)
+    # Store numbers are ignored; one-off shops and income are not recurring charges
+    assert [(m['name'], m['months']) for m in recurring] == [("Corner Grocer", 4), ("NETFLIX.COM 1", 4)]
+    assert recurring[0]['monthly'] == 250.0
+
+
+def test_trend_deltas_compare_latest_month_with_the_ones_before():
+    periods = monthly_periods(history(4))
+    trends = trend_deltas(periods, ['Food', 'Travel'])
+    assert trends['month'] == "2024-04"
+    assert trends['categories'] == {'Food': 100}  # 400 against an average of 200
+    assert trend_deltas({"2024-01": periods["2024-01"]}, ['Food']) is None
+
+
+def test_prompt_size_does_not_grow_with_history():
+    builder = PromptBuilder(budget=1000)
+    short_prompt, short_tokens = builder.build(summary_of(history(3)), 1000)
+    long_prompt, long_tokens = builder.build(summary_of(history(12, categories_per_month=40)), 1000)
+
+    assert "Corner Grocer" in long_prompt and "Other:" in long_prompt
+    assert long_prompt.count("\n- ") == 5 + 1 + 2  # Top categories, Other, both recurring merchants
+    assert abs(long_tokens - short_tokens) < 30
+    assert long_tokens == estimate_tokens(long_prompt)
+    stats = builder.stats()
+    assert (stats['calls'], stats['max_tokens'], stats['trimmed']) == (2, max(short_tokens, long_tokens), 0)
+
+
+def test_budget_is_enforced_by_dropping_features():
+    summary = summary_of(history(12, categories_per_month=40))
+    full_prompt, full_tokens = PromptBuilder(budget=1000).build(summary, 1000)
+
+    builder = PromptBuilder(budget=full_tokens - 40)
+    prompt, tokens = builder.build(summary, 1000)
+    assert tokens <= builder.budget
+    assert "Recurring Charges" not in prompt
+    assert builder.stats()['trimmed'] == 1
+
+    # Below what the instructions alone need the prompt is as small as it gets, and counted over budget
+    tiny = PromptBuilder(budget=10)
+    prompt, tokens = tiny.build(summary, 1000)
+    assert prompt.count("\n- ") == 2 and "%" not in prompt
+    assert tiny.stats()['over_budget'] == 1
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+
+import pytest
+
+from model_guard import CircuitBreaker, CircuitOpenError, GuardedModel, ModelTimeoutError
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stands in for a Gemini GenerativeModel; latency() and fail() decide how each call behaves"""
+
+    def __init__(self, latency=lambda: 0.0, fail=lambda: False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency())
+        if self.fail():
+            raise RuntimeError("backend unavailable")
+        return FakeResponse('{"quests": []}')
+
+
+def hang_until(event):
+    """latency() for calls that hang until the test sets event"""
+    def latency():
+        event.wait(5)
+        return 0.0
+    return latency
+
+
+def test_call_is_abandoned_at_the_deadline():
+    released = threading.Event()
+    guarded = GuardedModel(FakeModel(latency=hang_until(released)), timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(ModelTimeoutError):
+        guarded.generate_content("prompt")
+    released.set()
+    assert time.monotonic() - started < guarded.timeout * 2
+    assert guarded.stats()['timeouts'] == 1
+
+
+def test_breaker_opens_rejects_and_recovers():
+    failing = [True]
+    model = FakeModel(fail=lambda: failing[0])
+    guarded = GuardedModel(model, breaker=CircuitBreaker(failure_threshold=3, reset_seconds=0.1))
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            guarded.generate_content("prompt")
+    with pytest.raises(CircuitOpenError):
+        guarded.generate_content("prompt")
+    assert model.calls == 3
+    assert guarded.stats()['state'] == 'open'
+
+    time.sleep(0.15)
+    assert guarded.stats()['state'] == 'half_open'
+    failing[0] = False
+    assert guarded.generate_content("prompt").text
+    stats = guarded.stats()
+    assert (stats['state'], stats['opened'], stats['rejected']) == ('closed', 1, 1)
+
+
+def test_failed_trial_reopens_and_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05, slow_call_seconds=0.01)
+    guarded = GuardedModel(FakeModel(latency=lambda: 0.03), breaker=breaker)
+
+    guarded.generate_content("prompt")
+    guarded.generate_content("prompt")
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.stats()['slow_calls'] == 2
+
+    time.sleep(0.06)
+    guarded.generate_content("prompt")  # The trial call is slow too
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.stats()['opened'] == 2
+
+
+def test_failed_submit_ends_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    guarded = GuardedModel(FakeModel(fail=lambda: True), breaker=breaker)
+    with pytest.raises(RuntimeError):
+        guarded.generate_content("prompt")
+
+    time.sleep(0.06)
+    guarded._executor.shutdown()
+    with pytest.raises(RuntimeError):
+        guarded.generate_content("prompt")  # The trial cannot be submitted
+    assert breaker.stats()['state'] == 'open'
+    time.sleep(0.06)
+    assert breaker.allow() == 'half_open'  # A new trial is let through
+
+
+def test_late_success_does_not_close_an_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    assert breaker.allow() == 'closed'  # A slow call starts
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.stats()['state'] == 'open'
+
+    breaker.record_success()  # The slow call finally returns
+    assert breaker.stats()['state'] == 'open'
+    time.sleep(0.06)
+    assert breaker.allow() == 'half_open'
+    breaker.record_success()  # Another call from before the breaker opened
+    assert breaker.stats()['state'] == 'half_open' and not breaker.allow()
+    breaker.record_success(trial=True)
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_hung_calls_cannot_take_every_thread():
+    released = threading.Event()
+    model = FakeModel(latency=hang_until(released))
+    guarded = GuardedModel(model, timeout=0.01, max_concurrent=1, breaker=CircuitBreaker(failure_threshold=100))
+    with pytest.raises(ModelTimeoutError):
+        guarded.generate_content("prompt")
+    # The hung call still holds the only slot, so the next one fails without reaching the model
+    with pytest.raises(CircuitOpenError):
+        guarded.generate_content("prompt")
+    released.set()
+    assert model.calls == 1
+    assert guarded.stats()['failures'] == 2
+
+
+def test_hung_calls_are_abandoned_at_the_deadline():
+    # About 10% of calls hang until the end of the test; callers must never wait much past the deadline
+    rng = random.Random(3)
+    hangs = [rng.random() < 0.1 for _ in range(50)]
+    released = threading.Event()
+    calls = iter(hangs)
+    hang = hang_until(released)
+    model = FakeModel(latency=lambda: hang() if next(calls) else 0.0)
+    guarded = GuardedModel(model, timeout=0.2, max_concurrent=64, breaker=CircuitBreaker(failure_threshold=1000))
+
+    latencies = []
+    for _ in hangs:
+        started = time.monotonic()
+        try:
+            guarded.generate_content("prompt")
+        except ModelTimeoutError:
+            pass
+        latencies.append(time.monotonic() - started)
+    released.set()
+
+    assert max(latencies) < guarded.timeout * 2
+    stats = guarded.stats()
+    assert model.calls == len(hangs)
+    assert stats['timeouts'] == sum(hangs) > 0
+    assert stats['successes'] == len(hangs) - sum(hangs)
+
+
+def test_outage_is_short_circuited():
+    model = FakeModel(latency=lambda: 0.05, fail=lambda: True)
+    guarded = GuardedModel(model, breaker=CircuitBreaker(failure_threshold=5, reset_seconds=60))
+
+    for _ in range(100):
+        with pytest.raises((RuntimeError, CircuitOpenError)):
+            guarded.generate_content("prompt")
+
+    # Only the calls before the breaker opened reached the backend; the rest were refused up front
+    assert model.calls == 5
+    stats = guarded.stats()
+    assert (stats['failures'], stats['rejected'], stats['opened']) == (5, 95, 1)
@@ -0,0 +1,56 @@
+import threading
+
+from quest_jobs import QuestJobs
+
+
+def test_one_pending_job_per_user():
+    release = threading.Event()
+    calls = []
+
+    def run(user_id, value):
+        calls.append((user_id, value))
+        release.wait(5)
+        return value * 2
+
+    jobs = QuestJobs(run, workers=2)
+    assert jobs.submit("u1", 1)
+    assert not jobs.submit("u1", 2)
+    assert jobs.submit("u2", 3)
+    assert jobs.status("u1") == ('pending', None)
+
+    release.set()
+    jobs.shutdown()
+    assert sorted(calls) == [("u1", 1), ("u2", 3)]
+    assert jobs.status("u1") == ('done', 2)
+    assert jobs.status("nobody") == (None, None)
+    stats = jobs.stats()
+    assert (stats['submitted'], stats['deduplicated'], stats['completed'], stats['pending']) == (2, 1, 2, 0)
+
+
+def test_failures_are_recorded_and_the_user_can_retry():
+    outcomes = iter([RuntimeError("model down"), "ok"])
+
+    def run(user_id):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    jobs = QuestJobs(run, workers=1)
+    jobs.submit("u1")
+    jobs.shutdown()
+    assert jobs.status("u1") == ('failed', "model down")
+
+    jobs = QuestJobs(run, workers=1)
+    jobs.submit("u1")
+    jobs.shutdown()
+    assert jobs.status("u1") == ('done', "ok")
+
+
+def test_results_are_bounded():
+    jobs = QuestJobs(lambda user_id: user_id, workers=1, keep_results=2)
+    for user_id in ("a", "b", "c"):
+        jobs.submit(user_id)
+    jobs.shutdown()
+    assert jobs.status("a") == (None, None)
+    assert jobs.status("c") == ('done', "c")
@@ -0,0 +1,116 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from quest_refresh import CHECKPOINT_ID, RateLimiter, refresh_stale_quests
+
+TODAY = date(2024, 3, 10)
+
+
+def seed(users, count):
+    # A third never refreshed, a third refreshed yesterday or earlier, a third already today
+    users.insert_many([
+        {'email': f"u{i}@example.com", 'savings_goal': 100 + i,
+         **({} if i % 3 == 0 else {'last_quest_refresh': str(TODAY if i % 3 == 2 else date(2024, 3, i % 9 + 1))})}
+        for i in range(count)
+    ])
+
+
+def prepare(user):
+    return None if user['savings_goal'] % 5 == 0 else user['savings_goal']
+
+
+def generate(goal):
+    return [{'title': f"Save {goal}", 'progress': 0, 'description': "..."}]
+
+
+def test_rate_limiter_spaces_calls_across_threads():
+    limiter = RateLimiter(50)
+    started = time.monotonic()
+    threads = [threading.Thread(target=limiter.wait) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - started >= 9 / 50 - 0.01
+
+    unlimited = RateLimiter(None)
+    started = time.monotonic()
+    for _ in range(1000):
+        unlimited.wait()
+    assert time.monotonic() - started < 0.1
+
+
+def test_refreshes_only_stale_users(db):
+    seed(db['users'], 60)
+    report = refresh_stale_quests(db['users'], prepare, generate, today=TODAY, workers=3, batch_size=7)
+
+    due = [i for i in range(60) if i % 3 != 2]
+    with_data = [i for i in due if (100 + i) % 5 != 0]
+    assert (report['scanned'], report['refreshed'], report['skipped']) == (len(due), len(with_data), len(due) - len(with_data))
+    assert report['users_per_second'] > 0
+    for user in db['users'].find({'savings_goal': {'$in': [100 + i for i in with_data]}}):
+        assert user['last_quest_refresh'] == str(TODAY)
+        assert user['current_quests'][0]['title'] == f"Save {user['savings_goal']}"
+
+    # Nothing left to do today
+    again = refresh_stale_quests(db['users'], prepare, generate, today=TODAY)
+    assert again['refreshed'] == 0
+
+
+def test_users_refreshed_by_the_app_meanwhile_keep_their_quests(db):
+    db['users'].insert_one({'savings_goal': 101})
+
+    def refreshed_elsewhere(goal):
+        db['users'].update_one({}, {'$set': {'last_quest_refresh': str(TODAY), 'current_quests': ["app"]}})
+        return generate(goal)
+
+    report = refresh_stale_quests(db['users'], prepare, refreshed_elsewhere, today=TODAY)
+    assert (report['refreshed'], report['conflicts']) == (0, 1)
+    assert db['users'].find_one()['current_quests'] == ["app"]
+
+
+def test_resumes_from_checkpoint_after_a_crash(db):
+    seed(db['users'], 60)
+    calls = []
+
+    def crash_after_25(goal):
+        if len(calls) == 25:
+            raise KeyboardInterrupt
+        calls.append(goal)
+        return generate(goal)
+
+    with pytest.raises(KeyboardInterrupt):
+        refresh_stale_quests(db['users'], prepare, crash_after_25, checkpoints=db['job_checkpoints'],
+                             today=TODAY, workers=1, batch_size=5)
+    checkpoint = db['job_checkpoints'].find_one({'_id': CHECKPOINT_ID})
+    assert checkpoint['day'] == str(TODAY)
+
+    resumed_calls = []
+    report = refresh_stale_quests(db['users'], prepare, lambda goal: resumed_calls.append(goal) or generate(goal),
+                                  checkpoints=db['job_checkpoints'], today=TODAY, workers=2, batch_size=5)
+    assert report['resumed']
+    # Users written before the crash are not sent to the model again
+    assert len(resumed_calls) < 25
+    due = [i for i in range(60) if i % 3 != 2 and (100 + i) % 5 != 0]
+    assert db['users'].count_documents({'last_quest_refresh': str(TODAY)}) == len(due) + 20
+
+
+def test_users_the_model_failed_for_stay_due_and_stop_ends_the_run(db):
+    seed(db['users'], 30)
+    outage = []
+
+    def model_down(goal):
+        outage.append(goal)
+        return None
+
+    report = refresh_stale_quests(db['users'], prepare, model_down, today=TODAY, workers=1,
+                                  stop=lambda: len(outage) >= 3)
+    assert report['stopped']
+    # Users already queued when stop() turned true still finish
+    assert 3 <= report['failed'] <= 4 and report['refreshed'] == 0
+    assert db['users'].count_documents({'last_quest_refresh': str(TODAY)}) == 10  # Only those already fresh
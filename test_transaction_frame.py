@@ -0,0 +1,41 @@
+from datetime import date, datetime
+
+import pytest
+
+from transaction_frame import TransactionFrame
+
+TRANSACTIONS = [
+    {'date': "2024-01-03", 'name': "Cafe", 'amount': -4.5, 'category': ["Food", "Coffee"]},
+    {'date': "2024-01-05", 'name': "Salary", 'amount': "1000", 'category': ["Transfer"]},
+    {'date': datetime(2024, 1, 9), 'name': "Train", 'amount': -30.0, 'category': ["Travel"]},
+    {'date': date(2024, 1, 9), 'name': "Cash", 'amount': -7, 'category': []},
+    {'date': "2024-01-20T12:30:00", 'name': "Grocer", 'amount': -20.25},
+]
+
+
+def test_summary_matches_per_row_totals():
+    frame = TransactionFrame.from_transactions(TRANSACTIONS)
+
+    assert len(frame) == 5
+    assert frame.categories == ["Food", "Transfer", "Travel", "Uncategorized"]
+    summary = frame.summary()
+    assert summary['count'] == 5
+    assert summary['total_income'] == 1000.0
+    assert summary['total_expenses'] == pytest.approx(61.75)
+    # Transfer only had income, so it has no spending entry
+    assert summary['category_spending'] == pytest.approx({"Food": 4.5, "Travel": 30.0, "Uncategorized": 27.25})
+
+
+def test_date_window_is_half_open():
+    frame = TransactionFrame.from_transactions(TRANSACTIONS)
+
+    window = frame.summary(start="2024-01-05", end=date(2024, 1, 20))
+    assert window['count'] == 3
+    assert window['total_income'] == 1000.0
+    assert window['category_spending'] == {"Travel": 30.0, "Uncategorized": 7.0}
+    assert len(frame.between(start="2024-01-10")) == 1
+
+
+def test_empty_frame():
+    summary = TransactionFrame.from_transactions([]).summary()
+    assert summary == {'total_income': 0.0, 'total_expenses': 0.0, 'category_spending': {}, 'count': 0}
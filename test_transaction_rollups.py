@@ -0,0 +1,61 @@
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from transaction_rollups import TransactionRollups
+from transaction_store import TransactionStore
+
+
+@pytest.fixture
+def stores(db):
+    rollups = TransactionRollups(db['transaction_rollups'])
+    return TransactionStore(db['transactions'], rollups=rollups), rollups
+
+
+def transaction(day, amount, category, transaction_id):
+    return {'date': day, 'name': "Shop", 'amount': amount, 'category': [category], 'transaction_id': transaction_id}
+
+
+def test_rollups_follow_inserts_and_edits(stores):
+    store, rollups = stores
+    store.insert_many("u1", [
+        transaction("2024-01-03", -10.0, "Food", "a"),
+        transaction("2024-01-20", -5.5, "Food", "b"),
+        transaction("2024-02-01", 900.0, "Transfer", "c"),
+    ])
+    store.insert("u1", transaction("2024-02-02", -40.0, "Travel", "d"))
+
+    summary, expected = rollups.summary("u1"), store.summary("u1")
+    for field in ('total_income', 'total_expenses', 'count'):
+        assert summary[field] == pytest.approx(expected[field])
+    assert summary['category_spending'] == pytest.approx(expected['category_spending'])
+    months = rollups.periods("u1")
+    assert list(months) == ["2024-01", "2024-02"]
+    assert months["2024-01"]['categories'] == {"Food": 15.5}
+    assert months["2024-02"]['income'] == 900.0
+
+    # Moving a transaction to another month and category moves its totals too
+    store.update("u1", "b", {'date': "2024-02-10", 'category': ["Travel"]})
+    months = rollups.periods("u1")
+    assert months["2024-01"]['categories'] == {"Food": 10.0}
+    assert months["2024-02"]['categories'] == {"Travel": 45.5}
+    assert rollups.summary("u1", start="2024-02-01", end="2024-02-05")['total_expenses'] == 40.0
+    assert store.update("u1", "missing", {'amount': 1}) is None
+
+
+def test_rebuild_reports_and_repairs_drift(stores):
+    store, rollups = stores
+    store.insert_many("u1", [transaction("2024-01-03", -10.0, "Food", "a")])
+    # A write that bypassed the rollups, and a corrupted rollup row
+    store.collection.insert_one(dict(transaction("2024-01-04", -3.0, "Food", "x"), user_id="u1",
+                                     date=store.collection.find_one()['date']))
+    rollups.collection.update_one({'user_id': "u1", 'granularity': 'day'}, {'$inc': {'expense': 100}})
+
+    report = rollups.rebuild(store.collection, verify_only=True)
+    assert report['users'] == 1
+    assert len(report['mismatches']) == 2
+
+    rollups.rebuild(store.collection)
+    assert rollups.rebuild(store.collection, verify_only=True)['mismatches'] == []
+    assert rollups.summary("u1")['total_expenses'] == 13.0
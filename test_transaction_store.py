@@ -0,0 +1,209 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from transaction_store import (
+    TransactionStore, deduplicate_transactions, migrate_embedded_transactions, summarize_transactions, to_document,
+    validate_manual_transaction,
+)
+
+
+def make_transactions(count):
+    return [
+        {'date': f"2024-01-{1 + i % 28:02d}", 'name': f"Shop {i}", 'amount': -float(i), 'category': ['Food'],
+         'transaction_id': f"t{i}", 'pending': False}
+        for i in range(count)
+    ]
+
+
+def test_keyset_pages_cover_history_newest_first(db):
+    store = TransactionStore(db['transactions'])
+    store.insert_many("u1", make_transactions(60))
+    store.insert_many("u2", make_transactions(5))
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.page("u1", limit=25, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 60
+    assert len({t['transaction_id'] for t in seen}) == 60
+    assert [t['date'] for t in seen] == sorted((t['date'] for t in seen), reverse=True)
+    assert seen[0]['date'] == "2024-01-28"
+    assert 'user_id' not in seen[0] and '_id' not in seen[0]
+
+    stored = db['transactions'].find_one({'user_id': "u1"})
+    assert isinstance(stored['date'], datetime)
+
+
+def test_bad_cursor_is_a_value_error(db):
+    store = TransactionStore(db['transactions'])
+    with pytest.raises(ValueError):
+        store.page("u1", cursor="not-a-cursor")
+
+
+def test_migration_moves_embedded_array_and_can_be_rerun(db):
+    store = TransactionStore(db['transactions'])
+    db['userData'].insert_one({'user_id': "u1", 'savings_goal': 500, 'transactions': make_transactions(30)})
+
+    assert migrate_embedded_transactions(db['userData'], store, batch_size=7) == (1, 30)
+    assert migrate_embedded_transactions(db['userData'], store) == (0, 0)
+
+    assert store.count("u1") == 30
+    document = db['userData'].find_one({'user_id': "u1"})
+    assert 'transactions' not in document
+    assert document['savings_goal'] == 500
+    assert sum(t['amount'] for t in store.find("u1", since="2024-01-20")) == sum(
+        -float(i) for i in range(30) if 1 + i % 28 >= 20
+    )
+
+
+def test_rerun_after_interrupted_migration_does_not_copy_transactions_without_ids_twice(db):
+    store = TransactionStore(db['transactions'])
+    transactions = make_transactions(10) + [{'date': "2024-01-05", 'name': "Cash", 'amount': -5.0}] * 2
+    for transaction in transactions[:3]:
+        del transaction['transaction_id']
+    db['userData'].insert_one({'user_id': "u1", 'transactions': transactions})
+    migrate_embedded_transactions(db['userData'], store)
+
+    # As if the run died before removing the embedded array
+    db['userData'].update_one({'user_id': "u1"}, {'$set': {'transactions': transactions}})
+    assert migrate_embedded_transactions(db['userData'], store) == (1, 12)
+    assert store.count("u1") == 12
+
+
+def test_validation_reports_every_problem():
+    transaction, errors = validate_manual_transaction({'date': "2024-02-30", 'name': " ", 'amount': "abc"})
+    assert transaction is None
+    assert errors == ["date must be YYYY-MM-DD", "name is required", "amount must be a number"]
+
+    transaction, errors = validate_manual_transaction(
+        {'date': "2024-02-03", 'name': " Coffee ", 'amount': "-3.5", 'category': "Food"}
+    )
+    assert errors == []
+    assert transaction['name'] == "Coffee"
+    assert transaction['amount'] == -3.5
+    assert transaction['category'] == ["Food"]
+    assert transaction['manual'] is True
+
+
+def test_batch_insert_is_one_write(db):
+    store = TransactionStore(db['transactions'])
+    batch = [validate_manual_transaction(
+        {'date': "2024-03-01", 'name': f"Item {i}", 'amount': -1, 'category': ["Food"]}
+    )[0] for i in range(300)]
+
+    assert store.insert_many("u1", batch) == 300
+    assert store.insert_many("u1", []) == 0
+    assert store.count("u1") == 300
+
+
+def test_aggregated_summary_matches_python_loop(db):
+    store = TransactionStore(db['transactions'])
+    transactions = make_transactions(40) + [
+        {'date': "2024-01-05", 'name': "Salary", 'amount': 1000.0, 'category': ['Transfer'], 'transaction_id': "pay"},
+        {'date': "2024-01-06", 'name': "Cash", 'amount': -7.0, 'category': [], 'transaction_id': "cash"},
+    ]
+    store.insert_many("u1", transactions)
+    store.insert_many("u2", make_transactions(3))
+
+    summary = store.summary("u1")
+    expected = summarize_transactions(transactions)
+    assert summary['count'] == expected['count'] == 42
+    assert summary['total_income'] == pytest.approx(expected['total_income'])
+    assert summary['total_expenses'] == pytest.approx(expected['total_expenses'])
+    assert summary['category_spending'] == pytest.approx(expected['category_spending'])
+    assert summary['category_spending']['Uncategorized'] == 7.0
+
+    window = store.summary("u1", start="2024-01-05", end="2024-01-07")
+    assert window['count'] == len([t for t in transactions if "2024-01-05" <= t['date'] < "2024-01-07"])
+    assert window['total_income'] == 1000.0
+
+
+def test_find_filters_by_window_and_category(db):
+    store = TransactionStore(db['transactions'])
+    transactions = make_transactions(28)
+    transactions[3]['category'] = ['Travel', 'Taxi']
+    store.insert_many("u1", transactions)
+
+    window = list(store.find("u1", since="2024-01-10", until="2024-01-20"))
+    assert [t['date'] for t in window] == [f"2024-01-{day:02d}" for day in range(19, 9, -1)]
+    assert [t['transaction_id'] for t in store.find("u1", category="Taxi")] == ["t3"]
+
+
+def test_repeated_batches_and_overlapping_sources_store_once(db):
+    from transaction_rollups import TransactionRollups
+    rollups = TransactionRollups(db['transaction_rollups'])
+    store = TransactionStore(db['transactions'], rollups=rollups)
+    assert store.deduplicating
+    coffee = {'date': "2024-01-03", 'name': "STARBUCKS #1234", 'amount': -4.5, 'category': ['Food']}
+    statement = [dict(coffee, transaction_id="s1"), dict(coffee, transaction_id="s2"),
+                 {'date': "2024-01-04", 'name': "Rent", 'amount': -900.0, 'transaction_id': "s3"}]
+
+    assert store.insert_many("u1", statement) == 3
+    # The same statement again, and a Plaid sync with its own ids for the same purchases
+    assert store.insert_many("u1", statement) == 0
+    assert store.insert_many("u1", [dict(coffee, name="Starbucks", transaction_id="p1")]) == 0
+    assert store.count("u1") == 3
+    assert rollups.summary("u1")['total_expenses'] == 909.0
+
+    # Entering one of the coffees by hand is a duplicate; a confirmed third coffee is kept
+    assert store.insert("u1", dict(coffee, transaction_id="m1", manual=True)) is None
+    assert store.insert("u1", dict(coffee, transaction_id="m2", manual=True), repeat=True) is not None
+    assert store.count("u1") == 4
+    assert store.stats()['duplicates'] == 5
+
+
+def test_manual_entry_and_sync_of_one_purchase_store_once_in_either_order(db):
+    store = TransactionStore(db['transactions'])
+    lunch = {'date': "2024-01-05", 'name': "Corner Deli", 'amount': -12.0, 'category': ['Food']}
+
+    # Synced first, then entered by hand
+    assert store.insert_many("u1", [dict(lunch, transaction_id="p1")]) == 1
+    assert store.insert("u1", dict(lunch, transaction_id="m1", manual=True)) is None
+    # Entered by hand first (twice: two lunches), then synced
+    assert store.insert("u2", dict(lunch, transaction_id="m2", manual=True)) is not None
+    assert store.insert("u2", dict(lunch, transaction_id="m3", manual=True)) is not None
+    assert store.insert_many("u2", [dict(lunch, transaction_id="p2"), dict(lunch, transaction_id="p3")]) == 0
+    assert (store.count("u1"), store.count("u2")) == (1, 2)
+
+
+def test_posted_transactions_settle_pending_ones(db):
+    from transaction_rollups import TransactionRollups
+    rollups = TransactionRollups(db['transaction_rollups'])
+    store = TransactionStore(db['transactions'], rollups=rollups)
+    store.insert_many("u1", [
+        {'date': "2024-01-03", 'name': "Diner", 'amount': -20.0, 'transaction_id': "pend1", 'pending': True},
+        {'date': "2024-01-03", 'name': "Books", 'amount': -12.0, 'transaction_id': "pend2", 'pending': True},
+    ])
+
+    # Plaid posts the diner bill with a tip under a new id that points at the pending one
+    store.insert_many("u1", [{'date': "2024-01-04", 'name': "Diner", 'amount': -24.0, 'transaction_id': "post1",
+                              'pending': False, 'pending_transaction_id': "pend1"}])
+    # A statement import carries the settled books purchase with no link back
+    store.insert_many("u1", [{'date': "2024-01-03", 'name': "BOOKS", 'amount': -12.0, 'transaction_id': "csv1"}])
+
+    stored = {t['transaction_id']: t for t in store.find("u1")}
+    assert set(stored) == {"post1", "pend2"}
+    assert stored['pend2']['pending'] is False
+    assert rollups.summary("u1")['total_expenses'] == 36.0
+    assert store.stats()['settled'] == 2
+
+
+def test_dedupe_prepares_an_old_collection(db):
+    collection = db['transactions']
+    collection.create_index([('user_id', 1), ('transaction_id', 1)])
+    documents = make_transactions(5) + make_transactions(2)
+    collection.insert_many([to_document("u1", t) for t in documents])
+
+    assert not TransactionStore(collection).deduplicating
+    assert deduplicate_transactions(collection, batch_size=2) == (2, 5)
+    store = TransactionStore(collection)
+    assert store.deduplicating
+    assert store.count("u1") == 5
+    assert store.insert_many("u1", make_transactions(5)) == 0
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import bson
+
+from user_data_store import UserDataStore
+
+
+@pytest.fixture
+def collection(db):
+    return db['userData']
+
+
+def test_queries_return_only_their_fields(collection):
+    store = UserDataStore(collection)
+    store.create("u1")
+    store.store_link_data("u1", "access-1", {'checking': 120.5})
+    # Documents that predate the transactions collection still embed their history
+    collection.update_one({'user_id': "u1"}, {'$set': {'transactions': [{'amount': -1.0}] * 500}})
+
+    assert store.get_link_status("u1") == {'access_token': "access-1"}
+    assert store.get_access_token_owner("access-1") == "u1"
+    assert store.get_access_token_owner("other") is None
+    assert set(store.get_savings_state("u1")) == {'savings_goal', 'current_savings', 'emergency_fund', 'balances'}
+    assert 'transactions' not in store.get_quest_state("u1")
+    assert store.exists("u1") and not store.exists("u2")
+    assert store.get_quest_state("u2") is None
+
+
+def test_writes_and_byte_counters(collection):
+    store = UserDataStore(collection)
+    store.create("u1")
+    store.set_savings_goal("u1", 2500)
+    assert store.add_savings("u1", 10, 5)
+    assert not store.add_savings("missing", 10, 5)
+
+    state = store.get_savings_state("u1")
+    assert (state['savings_goal'], state['current_savings'], state['emergency_fund']) == (2500, 10, 5)
+
+    stats = store.stats()
+    assert stats['savings_state']['round_trips'] == 1
+    assert stats['savings_state']['bytes'] == len(bson.encode(state))
+    assert stats['link_status']['lookups'] == 0
+    assert stats['savings_state']['avg_bytes'] == stats['savings_state']['bytes']
+
+
+def test_request_memo_answers_repeat_reads_until_a_write(collection):
+    memo = {}
+    store = UserDataStore(collection, request_memo=lambda: memo)
+    store.create("u1")
+
+    first = store.get_link_status("u1")
+    assert store.get_link_status("u1") is first
+    store.set_access_token("u1", "access-2")
+    assert store.get_link_status("u1") == {'access_token': "access-2"}
+
+    stats = store.stats()['link_status']
+    assert (stats['lookups'], stats['request_hits'], stats['round_trips']) == (3, 1, 2)
+
+    # Outside a request there is nothing to memoize in
+    memo = None
+    store.get_link_status("u1")
+    assert store.stats()['link_status']['round_trips'] == 3
+
+
+def test_ttl_cache_is_shared_invalidated_and_expires(collection):
+    store = UserDataStore(collection, ttl=30)
+    store.create("u1")
+
+    assert store.get_savings_state("u1")['savings_goal'] == 1000
+    cached = store.get_savings_state("u1")
+    cached['savings_goal'] = 1  # Each hit is a fresh copy
+    assert store.get_savings_state("u1")['savings_goal'] == 1000
+    assert store.stats()['savings_state']['cache_hits'] == 2
+
+    store.add_savings("u1", 3, 2)
+    assert store.get_savings_state("u1")['current_savings'] == 3
+    assert store.stats()['savings_state']['round_trips'] == 2
+
+    # A write that bypasses the store is only seen once the entry expires
+    store.ttl = 0.05
+    store.invalidate("u1")
+    store.get_savings_state("u1")
+    collection.update_one({'user_id': "u1"}, {'$set': {'savings_goal': 50}})
+    assert store.get_savings_state("u1")['savings_goal'] == 1000
+    time.sleep(0.1)
+    assert store.get_savings_state("u1")['savings_goal'] == 50
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+CSV_COLUMNS = ['date', 'name', 'amount', 'category', 'transaction_id', 'pending', 'manual']
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Leading characters spreadsheets treat as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_transactions(transactions, export_format='csv', chunk_rows=500):
+    """Yield a transaction export as text chunks of about `chunk_rows` rows each.
+
+    `transactions` is consumed lazily (e.g. straight from a Mongo cursor),
+    so memory use depends on the chunk size, not on the number of rows.
+    """
+    if export_format == 'csv':
+        return export_csv(transactions, chunk_rows)
+    if export_format == 'ndjson':
+        return export_ndjson(transactions, chunk_rows)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+def export_csv(transactions, chunk_rows=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for count, transaction in enumerate(transactions, 1):
+        writer.writerow([
+            transaction.get('date', ''),
+            safe_cell(transaction.get('name', '')),
+            transaction.get('amount', ''),
+            safe_cell('; '.join(transaction.get('category') or [])),
+            transaction.get('transaction_id', ''),
+            transaction.get('pending', False),
+            transaction.get('manual', False),
+        ])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(transactions, chunk_rows=500):
+    lines = []
+    for transaction in transactions:
+        lines.append(json.dumps(transaction, default=json_default))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def safe_cell(value):
+    """Keep free text such as merchant names from being run as a spreadsheet formula"""
+    value = str(value)
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
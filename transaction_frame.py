@@ -0,0 +1,86 @@
+from datetime import date, datetime
+
+import numpy as np
+
+
+class TransactionFrame:
+    """A user's transactions as columns, for analytics over many rows.
+
+    amount is a float64 array, day holds date.toordinal() day numbers as
+    int32, and category_code indexes into `categories`, the dictionary of
+    first categories. The per-row parsing of amounts, dates and categories
+    happens once, in from_transactions(); every reduction after that is a
+    NumPy operation over whole columns.
+    """
+
+    __slots__ = ('amount', 'day', 'category_code', 'categories')
+
+    def __init__(self, amount, day, category_code, categories):
+        self.amount = amount
+        self.day = day
+        self.category_code = category_code
+        self.categories = categories
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """Build a frame from transaction dicts (or store documents) in one pass"""
+        amounts = []
+        days = []
+        codes = []
+        category_codes = {}
+        # Histories repeat the same few hundred dates, so parse each one once
+        ordinals = {}
+        for transaction in transactions:
+            amounts.append(transaction['amount'])
+            value = transaction['date']
+            ordinal = ordinals.get(value)
+            if ordinal is None:
+                ordinal = ordinals[value] = day_ordinal(value)
+            days.append(ordinal)
+            category = (transaction.get('category') or ['Uncategorized'])[0]
+            code = category_codes.get(category)
+            if code is None:
+                code = category_codes[category] = len(category_codes)
+            codes.append(code)
+        return cls(
+            np.array(amounts, dtype=np.float64),
+            np.array(days, dtype=np.int32),
+            np.array(codes, dtype=np.int32),
+            list(category_codes)
+        )
+
+    def __len__(self):
+        return len(self.amount)
+
+    def between(self, start=None, end=None):
+        """Return the frame of transactions dated in [start, end)"""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.day >= day_ordinal(start)
+        if end is not None:
+            mask &= self.day < day_ordinal(end)
+        return TransactionFrame(self.amount[mask], self.day[mask], self.category_code[mask], self.categories)
+
+    def summary(self, start=None, end=None):
+        """Same totals as transaction_store.summarize_transactions, from whole-column reductions"""
+        frame = self.between(start, end) if start is not None or end is not None else self
+        income = frame.amount > 0
+        expenses = np.where(income, 0.0, -frame.amount)
+        by_category = np.bincount(frame.category_code, weights=expenses, minlength=len(self.categories))
+        # Categories only count once they have an expense, as in the per-row loop
+        spent_in = np.bincount(frame.category_code[~income], minlength=len(self.categories))
+        return {
+            'total_income': float(frame.amount[income].sum()),
+            'total_expenses': float(expenses.sum()),
+            'category_spending': {
+                self.categories[code]: float(by_category[code]) for code in np.flatnonzero(spent_in)
+            },
+            'count': len(frame)
+        }
+
+
+def day_ordinal(value):
+    """Ordinal of the day of a date, datetime or ISO date string"""
+    if isinstance(value, (date, datetime)):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
@@ -0,0 +1,254 @@
+import codecs
+import csv
+import html
+import io
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime
+
+IMPORT_FORMATS = ('csv', 'ofx')
+MAX_REPORTED_ERRORS = 20
+
+# Header names banks use for each field, compared lower-cased with spaces for underscores
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'posted date', 'posting date', 'post date', 'trans date'),
+    'name': ('name', 'description', 'payee', 'merchant', 'merchant name', 'details', 'memo'),
+    'amount': ('amount', 'transaction amount'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'money out'),
+    'credit': ('credit', 'deposit', 'deposits', 'money in'),
+    'category': ('category',),
+    'transaction_id': ('transaction id', 'id', 'fitid', 'reference'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y%m%d', '%d.%m.%Y')
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def import_statement(stream, import_format, insert_batch, batch_size=1000, progress=None):
+    """Parse a binary statement stream and store it in fixed-size batches.
+
+    The file is read incrementally; only the current batch of parsed
+    transactions is held in memory. insert_batch(transactions) must store
+    a list and return how many it stored. progress(report) is called after
+    every batch. Returns the final report: rows, inserted, rejected,
+    errors (the first few), batches, bytes_read, seconds and rows_per_second.
+    """
+    reader = CountingReader(stream)
+    report = {
+        'rows': 0, 'inserted': 0, 'rejected': 0, 'errors': [], 'batches': 0,
+        'bytes_read': 0, 'seconds': 0.0, 'rows_per_second': 0.0
+    }
+    started = time.perf_counter()
+
+    def flush(batch):
+        if batch:
+            report['inserted'] += insert_batch(batch)
+            report['batches'] += 1
+        report['bytes_read'] = reader.bytes_read
+        report['seconds'] = time.perf_counter() - started
+        report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+        if progress is not None:
+            progress(report)
+
+    batch = []
+    for transaction, error in parse_statement(reader, import_format):
+        report['rows'] += 1
+        if error:
+            report['rejected'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append(error)
+            continue
+        batch.append(transaction)
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+    return report
+
+
+def parse_statement(stream, import_format):
+    """Yield (transaction, None) or (None, error message) for each row of a binary statement stream"""
+    if import_format == 'csv':
+        return parse_csv(io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', errors='replace', newline=''))
+    if import_format == 'ofx':
+        return parse_ofx(stream)
+    raise ValueError(f"Unknown statement format: {import_format}")
+
+
+def parse_csv(text_stream):
+    """Parse a CSV statement row by row; raises ValueError if the header lacks date, name or amount columns"""
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _csv_column_indexes(header)
+    if 'date' not in columns or 'name' not in columns or not (
+            'amount' in columns or 'debit' in columns or 'credit' in columns):
+        raise ValueError("CSV statement needs date, description and amount (or debit/credit) columns")
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            fields = {field: row[index].strip() if index < len(row) else '' for field, index in columns.items()}
+            if fields.get('amount'):
+                amount = parse_amount(fields['amount'])
+            elif fields.get('debit') or fields.get('credit'):
+                # Separate columns: money out is an expense, so negative
+                amount = parse_amount(fields.get('credit') or '0') - abs(parse_amount(fields.get('debit') or '0'))
+            else:
+                raise ValueError("amount is required")
+            yield statement_transaction(
+                parse_date(fields['date']),
+                fields['name'],
+                amount,
+                category=fields.get('category'),
+                transaction_id=fields.get('transaction_id')
+            ), None
+        except ValueError as e:
+            yield None, f"line {reader.line_num}: {e}"
+
+
+def parse_ofx(stream, chunk_size=64 * 1024):
+    """Parse the STMTTRN records of an OFX/QFX statement (SGML or XML) chunk by chunk"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    current = None
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += decoder.decode(chunk, final=not chunk)
+        if chunk:
+            # Hold back the last tag; its value may continue in the next chunk
+            cut = buffer.rfind('<')
+            if cut <= 0:
+                continue
+            text, buffer = buffer[:cut], buffer[cut:]
+        else:
+            text, buffer = buffer, ''
+        for closing, tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if current is not None:
+                    yield _ofx_transaction(current)
+                current = None if closing else {}
+            elif current is not None and not closing:
+                current[tag] = html.unescape(value.strip())
+        if not chunk:
+            break
+    if current is not None:
+        yield _ofx_transaction(current)
+
+
+def statement_transaction(transaction_date, name, amount, category=None, transaction_id=None):
+    """Build a transaction in the shape PlaidClient.get_transactions returns"""
+    if not name:
+        raise ValueError("description is required")
+    return {
+        'date': transaction_date,
+        'amount': amount,
+        'name': name,
+        'category': [category] if category else ['Uncategorized'],
+        'transaction_id': transaction_id or f"import-{uuid.uuid4().hex}",
+        'merchant_name': '',
+        'payment_channel': '',
+        'pending': False,
+        'imported': True
+    }
+
+
+def parse_date(value):
+    """Parse a statement date into YYYY-MM-DD"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def parse_amount(value):
+    """Parse '1,234.50', '$-4.50', '(4.50)' and the like into a float"""
+    text = value.replace(',', '').replace('$', '').replace('£', '').replace('€', '').strip()
+    negative = text.startswith('(') and text.endswith(')')
+    try:
+        amount = float(text.strip('()'))
+    except ValueError:
+        raise ValueError(f"amount {value!r} is not a number") from None
+    if amount != amount or amount in (float('inf'), float('-inf')):
+        raise ValueError(f"amount {value!r} is not a number")
+    return -amount if negative else amount
+
+
+def _csv_column_indexes(header):
+    names = [cell.strip().lower().replace('_', ' ') for cell in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    return columns
+
+
+def _ofx_transaction(record):
+    try:
+        posted = record.get('DTPOSTED', '')
+        return statement_transaction(
+            parse_date(posted[:8]),
+            record.get('NAME') or record.get('PAYEE') or record.get('MEMO', ''),
+            parse_amount(record.get('TRNAMT', '')),
+            transaction_id=f"ofx-{record['FITID']}" if record.get('FITID') else None
+        ), None
+    except ValueError as e:
+        return None, f"transaction {record.get('FITID', '?')}: {e}"
+
+
+class CountingReader(io.RawIOBase):
+    """Wraps a binary stream and counts the bytes read through it, for progress reports"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._raw.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: MONGODB_URI=... python transaction_import.py <user_id> <statement file> [csv|ofx]")
+        sys.exit(1)
+    from pymongo import MongoClient
+    import certifi
+
+    from transaction_rollups import TransactionRollups
+    from transaction_store import TransactionStore
+
+    user_id, path = sys.argv[1], sys.argv[2]
+    import_format = sys.argv[3] if len(sys.argv) == 4 else os.path.splitext(path)[1].lstrip('.').lower()
+    if import_format == 'qfx':
+        import_format = 'ofx'
+    client = MongoClient(os.getenv('MONGODB_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['finance_app']
+    store = TransactionStore(db['transactions'], rollups=TransactionRollups(db['transaction_rollups']))
+    total = os.path.getsize(path)
+
+    def show(report):
+        print(f"\r{report['bytes_read'] * 100 // max(total, 1):3d}%  {report['inserted']} inserted, "
+              f"{report['rejected']} rejected, {report['rows_per_second']:.0f} rows/s", end='', flush=True)
+
+    with open(path, 'rb') as statement:
+        report = import_statement(statement, import_format, lambda batch: store.insert_many(user_id, batch),
+                                  progress=show)
+    print()
+    for error in report['errors']:
+        print(f"Rejected {error}")
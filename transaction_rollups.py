@@ -0,0 +1,175 @@
+import os
+import sys
+
+import certifi
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+from transaction_store import to_datetime
+
+GRANULARITIES = {'day': '%Y-%m-%d', 'month': '%Y-%m'}
+# Rollups are floats summed in different orders, so compare them with a tolerance
+TOLERANCE = 0.005
+
+
+class TransactionRollups:
+    """Per-user income and expense totals by day and by month, per category.
+
+    One document per (user_id, granularity, period, category) holds income,
+    expense and count. TransactionStore calls apply() whenever it inserts or
+    edits transactions, so the summaries below read a few rows per period
+    instead of the raw history. The raw insert and the rollup update are
+    separate writes; rebuild() recomputes rollups from the transactions
+    collection and reports any drift.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        collection.create_index(
+            [('user_id', ASCENDING), ('granularity', ASCENDING), ('period', ASCENDING), ('category', ASCENDING)],
+            unique=True
+        )
+
+    def apply(self, user_id, transactions, sign=1):
+        """Add transactions to the rollups, or take them back out with sign=-1"""
+        deltas = {}
+        for transaction in transactions:
+            for key, (income, expense) in _contributions(transaction):
+                delta = deltas.setdefault(key, [0.0, 0.0, 0])
+                delta[0] += sign * income
+                delta[1] += sign * expense
+                delta[2] += sign
+        if not deltas:
+            return
+        self.collection.bulk_write([
+            UpdateOne(
+                {'user_id': user_id, 'granularity': granularity, 'period': period, 'category': category},
+                {'$inc': {'income': income, 'expense': expense, 'count': count}},
+                upsert=True
+            )
+            for (granularity, period, category), (income, expense, count) in deltas.items()
+        ], ordered=False)
+        if sign < 0:
+            self.collection.delete_many({'user_id': user_id, 'count': {'$lte': 0}})
+
+    def periods(self, user_id, granularity='month', start=None, end=None):
+        """Return {period: {'income', 'expense', 'count', 'categories': {category: expense}}} in period order.
+
+        start and end bound the periods as [start, end) and may be dates or
+        ISO strings; they are cut down to the granularity's period key.
+        """
+        query = {'user_id': user_id, 'granularity': granularity}
+        if start is not None or end is not None:
+            query['period'] = {}
+            if start is not None:
+                query['period']['$gte'] = to_datetime(start).strftime(GRANULARITIES[granularity])
+            if end is not None:
+                query['period']['$lt'] = to_datetime(end).strftime(GRANULARITIES[granularity])
+        periods = {}
+        for row in self.collection.find(query, {'_id': 0, 'user_id': 0, 'granularity': 0}).sort('period', ASCENDING):
+            period = periods.setdefault(row['period'], {'income': 0.0, 'expense': 0.0, 'count': 0, 'categories': {}})
+            period['income'] += row['income']
+            period['expense'] += row['expense']
+            period['count'] += row['count']
+            if row['expense']:
+                period['categories'][row['category']] = row['expense']
+        return periods
+
+    def summary(self, user_id, start=None, end=None):
+        """Same totals as TransactionStore.summary, read from the rollups.
+
+        Whole history reads month rows; a date window reads day rows.
+        """
+        granularity = 'day' if start is not None or end is not None else 'month'
+        summary = {'total_income': 0.0, 'total_expenses': 0.0, 'category_spending': {}, 'count': 0}
+        for period in self.periods(user_id, granularity, start, end).values():
+            summary['total_income'] += period['income']
+            summary['total_expenses'] += period['expense']
+            summary['count'] += period['count']
+            for category, expense in period['categories'].items():
+                summary['category_spending'][category] = summary['category_spending'].get(category, 0.0) + expense
+        return summary
+
+    def rebuild(self, transactions_collection, user_id=None, verify_only=False):
+        """Recompute rollups from raw transactions, one user at a time.
+
+        Returns {'users': ..., 'rows': ..., 'mismatches': [...]} where each
+        mismatch is (user_id, granularity, period, category, stored, expected).
+        With verify_only the stored rollups are compared but left as they are.
+        """
+        user_ids = [user_id] if user_id is not None else transactions_collection.distinct('user_id')
+        report = {'users': 0, 'rows': 0, 'mismatches': []}
+        for current in user_ids:
+            expected = self._recompute(transactions_collection, current)
+            stored = {
+                (row['granularity'], row['period'], row['category']): (row['income'], row['expense'], row['count'])
+                for row in self.collection.find({'user_id': current})
+            }
+            for key in sorted(set(expected) | set(stored)):
+                want = expected.get(key, (0.0, 0.0, 0))
+                have = stored.get(key, (0.0, 0.0, 0))
+                if have[2] != want[2] or any(abs(a - b) > TOLERANCE for a, b in zip(have[:2], want[:2])):
+                    report['mismatches'].append((current, *key, have, want))
+            if not verify_only:
+                self.collection.delete_many({'user_id': current})
+                if expected:
+                    self.collection.insert_many([
+                        {'user_id': current, 'granularity': granularity, 'period': period, 'category': category,
+                         'income': income, 'expense': expense, 'count': count}
+                        for (granularity, period, category), (income, expense, count) in expected.items()
+                    ])
+            report['users'] += 1
+            report['rows'] += len(expected)
+        return report
+
+    def _recompute(self, transactions_collection, user_id):
+        # Day totals come from the server; month totals are folded from them here
+        pipeline = [
+            {'$match': {'user_id': user_id}},
+            {'$group': {
+                '_id': {
+                    'day': {'$dateToString': {'format': GRANULARITIES['day'], 'date': '$date'}},
+                    'category': {'$ifNull': [{'$arrayElemAt': ['$category', 0]}, 'Uncategorized']},
+                },
+                'income': {'$sum': {'$cond': [{'$gt': ['$amount', 0]}, '$amount', 0]}},
+                'expense': {'$sum': {'$cond': [{'$gt': ['$amount', 0]}, 0, {'$abs': '$amount'}]}},
+                'count': {'$sum': 1},
+            }},
+        ]
+        expected = {}
+        for row in transactions_collection.aggregate(pipeline):
+            day, category = row['_id']['day'], row['_id']['category']
+            for key in (('day', day, category), ('month', day[:7], category)):
+                totals = expected.setdefault(key, [0.0, 0.0, 0])
+                totals[0] += row['income']
+                totals[1] += row['expense']
+                totals[2] += row['count']
+        return {key: tuple(totals) for key, totals in expected.items()}
+
+
+def _contributions(transaction):
+    when = to_datetime(transaction['date'])
+    amount = float(transaction['amount'])
+    category = (transaction.get('category') or ['Uncategorized'])[0]
+    split = (amount, 0.0) if amount > 0 else (0.0, abs(amount))
+    for granularity, period_format in GRANULARITIES.items():
+        yield (granularity, when.strftime(period_format), category), split
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    verify_only = '--verify-only' in args
+    args = [arg for arg in args if arg != '--verify-only']
+    if len(args) > 1:
+        print("Usage: MONGODB_URI=... python transaction_rollups.py [--verify-only] [user_id]")
+        sys.exit(1)
+    client = MongoClient(os.getenv('MONGODB_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['finance_app']
+    report = TransactionRollups(db['transaction_rollups']).rebuild(
+        db['transactions'], user_id=args[0] if args else None, verify_only=verify_only
+    )
+    for mismatch in report['mismatches'][:20]:
+        print(f"Mismatch {mismatch[:4]}: stored {mismatch[4]}, expected {mismatch[5]}")
+    action = "Verified" if verify_only else "Rebuilt"
+    print(f"{action} {report['rows']} rollup rows for {report['users']} users, "
+          f"{len(report['mismatches'])} mismatches")
+    sys.exit(1 if verify_only and report['mismatches'] else 0)
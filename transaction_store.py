@@ -0,0 +1,524 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from datetime import date, datetime
+
+import certifi
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteOne, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+NON_LETTERS = re.compile(r'[^a-z]+')
+
+
+class TransactionStore:
+    """Transactions in their own collection, one document per transaction.
+
+    Documents carry the owning user_id and a native datetime `date`, and are
+    indexed on (user_id, date desc, _id desc) so a user's history can be read
+    newest first in pages without loading or sorting the rest of it. Reads
+    hand back the same dict shape the embedded userData array used, with
+    `date` as an ISO string, so existing analysis code keeps working.
+
+    With `rollups` (a TransactionRollups), every insert and edit also
+    updates the per-day and per-month totals.
+
+    Duplicates are refused by two unique indexes: one on (user_id,
+    transaction_id) and one on (user_id, fingerprint), where the
+    fingerprint is the day, amount and normalised name plus an occurrence
+    number (see fingerprint()). A Plaid sync, a statement import and a
+    manual entry of the same purchase therefore land once, and checking a
+    batch costs one index probe per transaction however long the history
+    is. Posted transactions replace the pending ones they settle.
+    """
+
+    def __init__(self, collection, rollups=None):
+        self.collection = collection
+        self.rollups = rollups
+        self._stats = {'inserted': 0, 'duplicates': 0, 'settled': 0}
+        self._stats_lock = threading.Lock()
+        # _id breaks ties between transactions on the same date for keyset paging
+        collection.create_index([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)])
+        self.deduplicating = self.create_unique_indexes()
+
+    def create_unique_indexes(self):
+        """Create the dedup indexes; returns False if existing data has to be deduplicated first"""
+        try:
+            self.collection.create_index(
+                [('user_id', ASCENDING), ('transaction_id', ASCENDING)], unique=True, name='user_transaction_id_unique'
+            )
+            # Documents stored before fingerprints existed have none until `dedupe` backfills them
+            self.collection.create_index(
+                [('user_id', ASCENDING), ('fingerprint', ASCENDING)], unique=True, name='user_fingerprint_unique',
+                partialFilterExpression={'fingerprint': {'$exists': True}}
+            )
+            return True
+        except OperationFailure as e:
+            print(f"Transaction dedup indexes are missing ({e}); run `python transaction_store.py dedupe`")
+            return False
+
+    def insert(self, user_id, transaction, repeat=False):
+        """Store one manual transaction and return its document id, or None if it is already stored.
+
+        The entry is numbered among the manual entries of the same purchase
+        only, so a purchase a Plaid sync or statement import already stored
+        is refused whichever came first. Pass repeat=True once the user has
+        confirmed it is another identical purchase: it is then numbered
+        after every stored occurrence and kept.
+        """
+        document = to_document(user_id, transaction)
+        base = fingerprint(document)
+        same_purchase = {'user_id': user_id, 'fingerprint': {'$regex': f'^{base}:'}}
+        if not repeat:
+            same_purchase['manual'] = True
+        occurrence = self.collection.count_documents(same_purchase)
+        for occurrence in range(occurrence, occurrence + 3):
+            document['fingerprint'] = f"{base}:{occurrence}"
+            document.pop('_id', None)
+            try:
+                inserted_id = self.collection.insert_one(document).inserted_id
+                break
+            except DuplicateKeyError as e:
+                if 'transaction_id' in (e.details or {}).get('keyPattern', {}):
+                    self._count(duplicates=1)
+                    return None
+                if not repeat and self.collection.find_one(
+                    {'user_id': user_id, 'fingerprint': document['fingerprint'], 'manual': {'$ne': True}}, {'_id': 1}
+                ):
+                    # The synced or imported copy of this purchase
+                    self._count(duplicates=1)
+                    return None
+                # Two identical entries racing each other can pick the same number; take the next one
+        else:
+            self._count(duplicates=1)
+            return None
+        self._count(inserted=1)
+        if self.rollups is not None:
+            self.rollups.apply(user_id, [document])
+        return inserted_id
+
+    def insert_many(self, user_id, transactions):
+        """Store a batch of transactions in one round trip; returns the number inserted.
+
+        Transactions already stored (same transaction_id, or same
+        fingerprint) are skipped. Identical transactions within the batch
+        are numbered in batch order, so importing the same statement or
+        syncing the same Plaid window twice stores nothing new the second
+        time. Posted transactions settle their pending versions.
+        """
+        documents = []
+        occurrences = {}
+        for transaction in transactions:
+            document = to_document(user_id, transaction)
+            base = fingerprint(document)
+            occurrence = occurrences.get(base, 0)
+            occurrences[base] = occurrence + 1
+            document['fingerprint'] = f"{base}:{occurrence}"
+            documents.append(document)
+        if not documents:
+            return 0
+        self._settle_pending(user_id, documents)
+        try:
+            self.collection.insert_many(documents, ordered=False)
+            inserted = documents
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            refused = {error['index'] for error in errors}
+            inserted = [document for index, document in enumerate(documents) if index not in refused]
+            duplicates = [documents[index] for index in refused]
+            self._count(duplicates=len(duplicates))
+            self._settle_by_fingerprint(user_id, duplicates)
+        self._count(inserted=len(inserted))
+        if self.rollups is not None:
+            self.rollups.apply(user_id, inserted)
+        return len(inserted)
+
+    def stats(self):
+        """Counts of transactions inserted, refused as duplicates, and pending ones settled"""
+        with self._stats_lock:
+            return dict(self._stats, deduplicating=self.deduplicating)
+
+    def _settle_pending(self, user_id, documents):
+        # Plaid links a posted transaction to the pending one it replaces; drop that one first
+        pending_ids = [
+            document['pending_transaction_id'] for document in documents
+            if document.get('pending_transaction_id') and not document.get('pending')
+        ]
+        if not pending_ids:
+            return
+        pending = list(self.collection.find(
+            {'user_id': user_id, 'transaction_id': {'$in': pending_ids}, 'pending': True}
+        ))
+        if not pending:
+            return
+        self.collection.delete_many({'_id': {'$in': [document['_id'] for document in pending]}})
+        if self.rollups is not None:
+            self.rollups.apply(user_id, pending, sign=-1)
+        self._count(settled=len(pending))
+
+    def _settle_by_fingerprint(self, user_id, duplicates):
+        # A posted copy of a stored pending transaction (same day, amount and name) marks it posted
+        requests = [
+            UpdateOne(
+                {'user_id': user_id, 'fingerprint': document['fingerprint'], 'pending': True},
+                {'$set': {'pending': False}}
+            )
+            for document in duplicates if not document.get('pending')
+        ]
+        if requests:
+            self._count(settled=self.collection.bulk_write(requests, ordered=False).modified_count)
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for counter, amount in increments.items():
+                self._stats[counter] += amount
+
+    def update(self, user_id, transaction_id, changes):
+        """Change fields of one transaction, moving its rollup contribution along.
+
+        Returns the updated transaction, or None if there is no such transaction.
+        """
+        changes = dict(changes)
+        if 'date' in changes:
+            changes['date'] = to_datetime(changes['date'])
+        if 'amount' in changes:
+            changes['amount'] = float(changes['amount'])
+        before = self.collection.find_one({'user_id': user_id, 'transaction_id': transaction_id})
+        if before is None:
+            return None
+        after = dict(before, **changes)
+        base = fingerprint(after)
+        if not before.get('fingerprint', '').startswith(f"{base}:"):
+            # Number it after any identical transactions already stored, as insert() does
+            occurrence = self.collection.count_documents({'user_id': user_id, 'fingerprint': {'$regex': f'^{base}:'}})
+            changes['fingerprint'] = after['fingerprint'] = f"{base}:{occurrence}"
+        self.collection.update_one({'_id': before['_id']}, {'$set': changes})
+        if self.rollups is not None:
+            self.rollups.apply(user_id, [before], sign=-1)
+            self.rollups.apply(user_id, [after])
+        return to_transaction(after)
+
+    def has_transactions(self, user_id):
+        """Whether the user has at least one stored transaction"""
+        return self.collection.find_one({'user_id': user_id}, {'_id': 1}) is not None
+
+    def count(self, user_id):
+        """Return the number of transactions stored for a user"""
+        return self.collection.count_documents({'user_id': user_id})
+
+    def find(self, user_id, since=None, projection=None, limit=0, until=None, category=None):
+        """Yield a user's transactions newest first.
+
+        since and until bound the dates as [since, until); category keeps
+        only transactions that list it. Documents are fetched in cursor
+        batches as the generator is consumed.
+        """
+        query = {'user_id': user_id}
+        if since is not None or until is not None:
+            query['date'] = {}
+            if since is not None:
+                query['date']['$gte'] = to_datetime(since)
+            if until is not None:
+                query['date']['$lt'] = to_datetime(until)
+        if category is not None:
+            query['category'] = category
+        cursor = self.collection.find(query, projection, limit=limit).sort([('date', DESCENDING), ('_id', DESCENDING)])
+        for document in cursor:
+            yield to_transaction(document)
+
+    def summary(self, user_id, start=None, end=None):
+        """Return income, expense and per-category spending totals computed inside MongoDB.
+
+        Only transactions dated in [start, end) are counted when either bound
+        is given. The result matches summarize_transactions() over the same
+        transactions, but only the grouped totals cross the wire.
+        """
+        match = {'user_id': user_id}
+        if start is not None or end is not None:
+            match['date'] = {}
+            if start is not None:
+                match['date']['$gte'] = to_datetime(start)
+            if end is not None:
+                match['date']['$lt'] = to_datetime(end)
+        pipeline = [
+            {'$match': match},
+            # Group on (sign, first category) first so only a handful of rows reach the final stage
+            {'$group': {
+                '_id': {
+                    'income': {'$gt': ['$amount', 0]},
+                    'category': {'$ifNull': [{'$arrayElemAt': ['$category', 0]}, 'Uncategorized']},
+                },
+                'total': {'$sum': '$amount'},
+                'count': {'$sum': 1},
+            }},
+        ]
+        summary = {'total_income': 0.0, 'total_expenses': 0.0, 'category_spending': {}, 'count': 0}
+        for row in self.collection.aggregate(pipeline):
+            summary['count'] += row['count']
+            if row['_id']['income']:
+                summary['total_income'] += row['total']
+            else:
+                spent = abs(row['total'])
+                summary['total_expenses'] += spent
+                category = row['_id']['category']
+                summary['category_spending'][category] = summary['category_spending'].get(category, 0.0) + spent
+        return summary
+
+    def page(self, user_id, limit=50, cursor=None):
+        """Return (transactions, next cursor) for one page of a user's history, newest first.
+
+        Pass the returned cursor back to get the following page; it is None
+        on the last page. Each page is a single index range scan however far
+        back it is.
+        """
+        query = {'user_id': user_id}
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            query['$or'] = [
+                {'date': {'$lt': last_date}},
+                {'date': last_date, '_id': {'$lt': last_id}},
+            ]
+        documents = list(
+            self.collection.find(query)
+            .sort([('date', DESCENDING), ('_id', DESCENDING)])
+            .limit(limit + 1)
+        )
+        next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+        return [to_transaction(document) for document in documents[:limit]], next_cursor
+
+
+def summarize_transactions(transactions):
+    """Income, expense and per-category spending totals of an iterable of transactions, in Python"""
+    summary = {'total_income': 0.0, 'total_expenses': 0.0, 'category_spending': {}, 'count': 0}
+    for transaction in transactions:
+        summary['count'] += 1
+        amount = float(transaction['amount'])
+        if amount > 0:
+            summary['total_income'] += amount
+        else:
+            summary['total_expenses'] += abs(amount)
+            category = (transaction.get('category') or ['Uncategorized'])[0]
+            summary['category_spending'][category] = summary['category_spending'].get(category, 0.0) + abs(amount)
+    return summary
+
+
+def fingerprint(transaction):
+    """Hash of a transaction's day, amount in cents and normalised name.
+
+    Stored with an occurrence number appended (`<hash>:<n>`) so that the
+    n-th identical purchase on a day is the same transaction whichever
+    source it came from. Names are lower-cased with everything but letters
+    dropped, so "STARBUCKS #1234" and "Starbucks" match.
+    """
+    day = to_datetime(transaction['date']).date().isoformat()
+    cents = round(float(transaction['amount']) * 100)
+    name = ' '.join(NON_LETTERS.sub(' ', str(transaction.get('name', '')).lower()).split())
+    return hashlib.blake2b(f"{day}|{cents}|{name}".encode(), digest_size=12).hexdigest()
+
+
+def validate_manual_transaction(data):
+    """Check a manually entered transaction from a request body.
+
+    Returns (transaction, errors): the transaction ready to store, or None
+    with a list of messages describing every problem found.
+    """
+    if not isinstance(data, dict):
+        return None, ["Transaction must be an object"]
+
+    errors = []
+    try:
+        transaction_date = date.fromisoformat(str(data['date']))
+    except KeyError:
+        errors.append("date is required")
+    except ValueError:
+        errors.append("date must be YYYY-MM-DD")
+
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        errors.append("name is required")
+
+    amount = data.get('amount')
+    try:
+        amount = float(amount)
+        if amount != amount or amount in (float('inf'), float('-inf')):
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append("amount must be a number")
+
+    category = data.get('category', ['Uncategorized'])
+    if isinstance(category, str):
+        category = [category]
+    if not isinstance(category, list) or not category or not all(isinstance(c, str) for c in category):
+        errors.append("category must be a non-empty list of strings")
+
+    if errors:
+        return None, errors
+    return {
+        'date': transaction_date.isoformat(),
+        'name': name.strip(),
+        'amount': amount,
+        'category': category,
+        'transaction_id': str(ObjectId()),  # Generate a unique ID
+        'pending': False,
+        'manual': True  # Flag to indicate this is a manually added transaction
+    }, []
+
+
+def to_datetime(value):
+    """Convert a date, datetime or ISO date string into the datetime stored in `date`"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+def to_document(user_id, transaction):
+    """Build the stored document for a transaction dict"""
+    document = dict(transaction)
+    document.pop('_id', None)
+    document['user_id'] = user_id
+    document['date'] = to_datetime(transaction['date'])
+    document['amount'] = float(transaction['amount'])
+    return document
+
+
+def to_transaction(document):
+    """Turn a stored document back into the transaction dict the app works with"""
+    transaction = dict(document)
+    transaction.pop('_id', None)
+    transaction.pop('user_id', None)
+    value = transaction.get('date')
+    if isinstance(value, datetime):
+        # Plaid and manual transactions are day-granular; keep their YYYY-MM-DD form
+        transaction['date'] = value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    return transaction
+
+
+def encode_cursor(document):
+    return f"{document['date'].isoformat()}_{document['_id']}"
+
+
+def decode_cursor(cursor):
+    """Split a page cursor back into (date, ObjectId); raises ValueError if it is malformed"""
+    last_date, _, last_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(last_date), ObjectId(last_id)
+    except InvalidId as e:
+        raise ValueError(f"Invalid page cursor: {cursor}") from e
+
+
+def deduplicate_transactions(collection, batch_size=1000):
+    """Prepare a collection written before dedup existed for the unique indexes.
+
+    Removes repeated (user_id, transaction_id) documents, keeping the first,
+    and backfills fingerprints, numbering identical transactions per day in
+    stored order. Walks the collection one user and day at a time, so memory
+    stays small. Returns (duplicates removed, fingerprints set). The rollups
+    still count the removed duplicates; run `python transaction_rollups.py`
+    afterwards.
+    """
+    for index in collection.list_indexes():
+        # The plain (user_id, transaction_id) index has to go before the unique one can be built
+        if dict(index['key']) == {'user_id': 1, 'transaction_id': 1} and not index.get('unique'):
+            collection.drop_index(index['name'])
+
+    removed = 0
+    fingerprinted = 0
+    requests = []
+    current_user = None
+    current_day = None
+    seen_ids = set()
+    occurrences = {}
+    cursor = collection.find(
+        {}, {'user_id': 1, 'transaction_id': 1, 'date': 1, 'amount': 1, 'name': 1, 'fingerprint': 1}
+    ).sort([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)])
+    for document in cursor:
+        if document['user_id'] != current_user:
+            current_user = document['user_id']
+            seen_ids = set()
+            current_day = None
+        day = document['date'].date() if isinstance(document['date'], datetime) else document['date']
+        if day != current_day:
+            current_day = day
+            occurrences = {}
+
+        transaction_id = document.get('transaction_id')
+        if transaction_id in seen_ids:
+            requests.append(DeleteOne({'_id': document['_id']}))
+            removed += 1
+        else:
+            seen_ids.add(transaction_id)
+            base = fingerprint(document)
+            occurrence = occurrences.get(base, 0)
+            occurrences[base] = occurrence + 1
+            if document.get('fingerprint') != f"{base}:{occurrence}":
+                requests.append(UpdateOne({'_id': document['_id']}, {'$set': {'fingerprint': f"{base}:{occurrence}"}}))
+                fingerprinted += 1
+        if len(requests) >= batch_size:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return removed, fingerprinted
+
+
+def migrate_embedded_transactions(user_data, store, batch_size=1000):
+    """Move transactions embedded in userData documents into the transactions collection.
+
+    Transactions are upserted on (user_id, transaction_id), so a run that is
+    interrupted can simply be repeated; the embedded array is only removed
+    once its transactions are all stored. Manual transactions saved without
+    an ID get one derived from their fingerprint and occurrence in the
+    array, so a repeated run finds them again rather than copying them twice. Neither fingerprints nor rollups
+    are written here; run `python transaction_store.py dedupe` and then
+    `python transaction_rollups.py` afterwards. Returns (users migrated,
+    transactions copied).
+    """
+    users_migrated = 0
+    copied = 0
+    for document in user_data.find({'transactions.0': {'$exists': True}}, {'user_id': 1, 'transactions': 1}):
+        user_id = document['user_id']
+        transactions = document['transactions']
+        occurrences = {}
+        for start in range(0, len(transactions), batch_size):
+            requests = []
+            for transaction in transactions[start:start + batch_size]:
+                stored = to_document(user_id, transaction)
+                if not stored.get('transaction_id'):
+                    base = fingerprint(stored)
+                    occurrence = occurrences.get(base, 0)
+                    occurrences[base] = occurrence + 1
+                    stored['transaction_id'] = f"migrated-{base}:{occurrence}"
+                requests.append(UpdateOne(
+                    {'user_id': user_id, 'transaction_id': stored['transaction_id']},
+                    {'$set': stored},
+                    upsert=True
+                ))
+            store.collection.bulk_write(requests, ordered=False)
+        user_data.update_one({'_id': document['_id']}, {'$unset': {'transactions': ''}})
+        users_migrated += 1
+        copied += len(transactions)
+    return users_migrated, copied
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ('migrate', 'dedupe'):
+        print("Usage: MONGODB_URI=... python transaction_store.py migrate|dedupe")
+        sys.exit(1)
+    client = MongoClient(os.getenv('MONGODB_URI'), tls=True, tlsCAFile=certifi.where())
+    db = client['finance_app']
+    if sys.argv[1] == 'migrate':
+        users_migrated, copied = migrate_embedded_transactions(db['userData'], TransactionStore(db['transactions']))
+        print(f"Moved {copied} transactions for {users_migrated} users into the transactions collection")
+    else:
+        removed, fingerprinted = deduplicate_transactions(db['transactions'])
+        indexed = TransactionStore(db['transactions']).deduplicating
+        print(f"Removed {removed} duplicate transactions and fingerprinted {fingerprinted}; "
+              f"unique indexes {'in place' if indexed else 'NOT created'}. "
+              f"Run `python transaction_rollups.py` to rebuild the rollups")
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+# Fields each named query reads; anything else in the userData document
+# (balances, transactions not yet migrated, ...) stays on the server
+PROJECTIONS = {
+    'exists': {'_id': 1},
+    'link_status': {'_id': 0, 'access_token': 1, 'bank_name': 1},
+    'access_token_owner': {'_id': 0, 'user_id': 1},
+    'savings_state': {'_id': 0, 'savings_goal': 1, 'current_savings': 1, 'emergency_fund': 1, 'balances': 1},
+    'quest_state': {
+        '_id': 0, 'savings_goal': 1, 'current_savings': 1, 'emergency_fund': 1,
+        'completed_quests': 1, 'current_quests': 1,
+    },
+}
+
+# Queries looked up by user_id; a write to a user's document invalidates all of them
+USER_QUERIES = ('exists', 'link_status', 'savings_state', 'quest_state')
+COUNTERS = ('lookups', 'request_hits', 'cache_hits', 'round_trips', 'found', 'bytes')
+MISSING = object()
+
+NEW_USER_DATA = {
+    'savings_goal': 1000,
+    'current_savings': 0,
+    'emergency_fund': 0,
+    'balances': {},
+    'completed_quests': [],
+    'current_quests': []
+}
+
+
+class UserDataStore:
+    """Named, projection-limited reads and writes of userData documents.
+
+    Each read asks MongoDB for only the fields its caller renders, as listed
+    in PROJECTIONS. Documents come back as raw BSON so the size of every
+    reply is known without re-encoding it.
+
+    Reads are cached in two tiers. `request_memo` is a callable returning a
+    dict that lives for the current request (or None outside one); repeat
+    reads within a request are answered from it. With `ttl` > 0 replies are
+    also kept process-wide for that many seconds, as raw BSON so every hit
+    decodes a fresh copy. Every write through this class drops the user's
+    entries from both tiers. Writes made by other processes are not seen
+    until the TTL runs out, so keep it short when several workers share the
+    database. stats() reports lookups, hits per tier, Mongo round trips and
+    bytes per query.
+    """
+
+    def __init__(self, collection, ttl=0, max_entries=10000, request_memo=None):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._request_memo = request_memo
+        self._raw = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+        self._cache = OrderedDict()  # (query, key) -> (expires at, raw BSON bytes or None)
+        self._cache_lock = threading.Lock()
+        # Bumped by every write so a read that raced with it does not cache what it saw
+        self._generation = 0
+        self._stats = {name: dict.fromkeys(COUNTERS, 0) for name in PROJECTIONS}
+        self._stats_lock = threading.Lock()
+        collection.create_index('user_id')
+        collection.create_index('access_token', sparse=True)
+
+    def exists(self, user_id):
+        """Whether the user has a userData document at all"""
+        return self._find_one('exists', 'user_id', user_id) is not None
+
+    def get_link_status(self, user_id):
+        """Return {'access_token', 'bank_name'} (either may be missing), or None without userData"""
+        return self._find_one('link_status', 'user_id', user_id)
+
+    def get_access_token_owner(self, access_token):
+        """Return the user_id that has linked this bank access token, or None"""
+        document = self._find_one('access_token_owner', 'access_token', access_token)
+        return document['user_id'] if document else None
+
+    def get_savings_state(self, user_id):
+        """Return savings_goal, current_savings, emergency_fund and balances, or None"""
+        return self._find_one('savings_state', 'user_id', user_id)
+
+    def get_quest_state(self, user_id):
+        """Return the savings figures and quest lists used by missions and progress, or None"""
+        return self._find_one('quest_state', 'user_id', user_id)
+
+    def create(self, user_id):
+        """Insert the starting userData document for a new account"""
+        self.collection.insert_one(dict(NEW_USER_DATA, user_id=user_id))
+        self.invalidate(user_id)
+
+    def set_access_token(self, user_id, access_token):
+        self.collection.update_one({'user_id': user_id}, {'$set': {'access_token': access_token}})
+        self.invalidate(user_id, access_token)
+
+    def store_link_data(self, user_id, access_token, balances):
+        """Record a newly linked bank and reset the user's savings state"""
+        self.collection.update_one(
+            {'user_id': user_id},
+            {
+                '$set': {
+                    'access_token': access_token,
+                    'last_updated': str(date.today()),
+                    'balances': balances,
+                    'completed_quests': [],
+                    'current_quests': [],
+                    'savings_goal': 1000,  # Default savings goal
+                    'current_savings': 0,
+                    'emergency_fund': 0
+                }
+            },
+            upsert=True
+        )
+        self.invalidate(user_id, access_token)
+
+    def set_savings_goal(self, user_id, savings_goal):
+        self.collection.update_one({'user_id': user_id}, {'$set': {'savings_goal': savings_goal}})
+        self.invalidate(user_id)
+
+    def add_savings(self, user_id, savings, emergency_fund):
+        """Add to current_savings and emergency_fund; returns False if the user has no userData"""
+        result = self.collection.update_one(
+            {'user_id': user_id},
+            {'$inc': {'current_savings': savings, 'emergency_fund': emergency_fund}}
+        )
+        self.invalidate(user_id)
+        return result.matched_count > 0
+
+    def invalidate(self, user_id, access_token=None):
+        """Forget cached reads of a user's document, and of who owns access_token if given"""
+        keys = [(name, user_id) for name in USER_QUERIES]
+        if access_token is not None:
+            keys.append(('access_token_owner', access_token))
+        memo = self._request_memo() if self._request_memo else None
+        with self._cache_lock:
+            self._generation += 1
+            for key in keys:
+                self._cache.pop(key, None)
+                if memo is not None:
+                    memo.pop(key, None)
+
+    def stats(self):
+        """Per-query lookups, cache hits, Mongo round trips and BSON bytes returned"""
+        with self._stats_lock:
+            stats = {}
+            for name, counters in self._stats.items():
+                hits = counters['request_hits'] + counters['cache_hits']
+                stats[name] = dict(
+                    counters,
+                    hit_ratio=hits / counters['lookups'] if counters['lookups'] else 0.0,
+                    avg_bytes=counters['bytes'] / counters['found'] if counters['found'] else 0.0
+                )
+            return stats
+
+    def _find_one(self, name, field, value):
+        key = (name, value)
+        memo = self._request_memo() if self._request_memo else None
+        if memo is not None and key in memo:
+            self._count(name, request_hits=1)
+            return memo[key]
+
+        raw = MISSING
+        if self.ttl > 0:
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        raw = entry[1]
+                        self._cache.move_to_end(key)
+                    else:
+                        del self._cache[key]
+                generation = self._generation
+        if raw is not MISSING:
+            self._count(name, cache_hits=1)
+        else:
+            document = self._raw.find_one({field: value}, PROJECTIONS[name])
+            raw = document.raw if document is not None else None
+            self._count(name, round_trips=1, found=int(raw is not None), bytes=len(raw) if raw is not None else 0)
+            if self.ttl > 0:
+                with self._cache_lock:
+                    if generation == self._generation:
+                        self._cache[key] = (time.monotonic() + self.ttl, raw)
+                        while len(self._cache) > self.max_entries:
+                            self._cache.popitem(last=False)
+
+        result = bson.decode(raw) if raw is not None else None
+        if memo is not None:
+            memo[key] = result
+        return result
+
+    def _count(self, name, **increments):
+        with self._stats_lock:
+            counters = self._stats[name]
+            counters['lookups'] += 1
+            for counter, amount in increments.items():
+                counters[counter] += amount
+